@@ -46,6 +46,120 @@ from module3d import Object3D
 from progress import Progress
 import log
 
+class SubdivisionStencil(object):
+    """
+    Sparse (subdivided verts x parent verts) matrix in compressed row form,
+    expressing each subdivided vertex as a weighted sum of parent vertices.
+    The stencil only depends on the topology of the parent mesh, applying it
+    to the parent coordinates yields the subdivided coordinates.
+    """
+
+    # Maximum number of intermediate entries when composing stencils
+    COMPOSE_CHUNK_SIZE = 1 << 22
+
+    def __init__(self, rows, cols, weights, shape):
+        """
+        Build the stencil from (row, col, weight) entries. Entries with the
+        same row and col are summed.
+        """
+        counts, cols, weights = _compressEntries(rows, cols, weights, shape)
+        self._setCompressed(counts, cols, weights, shape)
+
+    def _setCompressed(self, counts, cols, weights, shape):
+        self.shape = tuple(shape)
+        self.cols = cols.astype(np.int32)
+        self.weights = weights.astype(np.float32)
+        self.indptr = np.zeros(self.shape[0]+1, dtype=np.intp)
+        np.cumsum(counts, out=self.indptr[1:])
+
+    @property
+    def rows(self):
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def compose(self, other):
+        """
+        Stencil equivalent to applying the other stencil first, followed by 
+        this one (the sparse matrix product self x other). Used to express 
+        the verts of multiple subdivision levels directly in the verts of the
+        unsubdivided mesh.
+        """
+        if self.shape[1] != other.shape[0]:
+            raise ValueError("Cannot compose stencils of shapes %s and %s" % (self.shape, other.shape))
+
+        ocounts = np.diff(other.indptr)
+        rows = self.rows
+        # Number of intermediate entries per row of the result
+        rowsizes = np.bincount(rows, weights=ocounts[self.cols], minlength=self.shape[0])
+        ends = np.cumsum(rowsizes)
+
+        # Process rows in chunks to limit memory use of the intermediate entries
+        counts = []
+        cols = []
+        weights = []
+        r0 = 0
+        while r0 < self.shape[0]:
+            limit = (ends[r0-1] if r0 else 0) + self.COMPOSE_CHUNK_SIZE
+            r1 = max(r0+1, int(np.searchsorted(ends, limit, side='right')))
+            e0, e1 = self.indptr[r0], self.indptr[r1]
+            ecols = self.cols[e0:e1]
+            n = ocounts[ecols]
+            offsets = np.cumsum(n) - n
+            erows = np.repeat(np.arange(e1 - e0), n)
+            pos = np.arange(len(erows)) - offsets[erows] + other.indptr[ecols][erows]
+            c, cc, cw = _compressEntries(rows[e0:e1][erows] - r0,
+                                         other.cols[pos],
+                                         self.weights[e0:e1][erows].astype(np.float64) * other.weights[pos],
+                                         (r1 - r0, other.shape[1]))
+            counts.append(c)
+            cols.append(cc)
+            weights.append(cw)
+            r0 = r1
+
+        result = SubdivisionStencil.__new__(SubdivisionStencil)
+        result._setCompressed(np.concatenate(counts), np.concatenate(cols), 
+                              np.concatenate(weights), (self.shape[0], other.shape[1]))
+        return result
+
+    def apply(self, values):
+        """
+        Sparse product of this stencil with the per parent vertex values 
+        (eg. coordinates), a 1D or 2D array.
+        """
+        values = np.asarray(values)
+        if len(self.cols) == 0:
+            return np.zeros((self.shape[0],) + values.shape[1:], dtype=values.dtype)
+        # Gathering per component is faster than gathering rows
+        products = np.take(np.ascontiguousarray(values.T), self.cols, axis=-1)
+        products *= self.weights.astype(values.dtype)
+        counts = np.diff(self.indptr)
+        if counts.all():
+            return np.add.reduceat(products, self.indptr[:-1], axis=-1).T
+        result = np.zeros((values.shape[1:] + (self.shape[0],)), dtype=values.dtype)
+        nonempty = counts > 0
+        result[...,nonempty] = np.add.reduceat(products, self.indptr[:-1][nonempty], axis=-1)
+        return result.T
+
+def _compressEntries(rows, cols, weights, shape):
+    """
+    Sort (row, col, weight) entries by row and col, summing the weights of 
+    duplicate entries. Returns the number of entries per row, and the cols 
+    and weights of the entries.
+    """
+    nrows, ncols = shape
+    keys = np.asarray(rows, dtype=np.int64) * ncols + np.asarray(cols, dtype=np.int64)
+    order = np.argsort(keys)
+    keys = keys[order]
+    first = np.ones(len(keys), dtype=bool)
+    np.not_equal(keys[1:], keys[:-1], out=first[1:])
+    first = np.nonzero(first)[0]
+    if len(first):
+        weights = np.add.reduceat(np.asarray(weights, dtype=np.float64)[order], first)
+    else:
+        weights = np.zeros(0, dtype=np.float64)
+    keys = keys[first]
+    counts = np.bincount(keys // ncols, minlength=nrows)
+    return counts, keys % ncols, weights
+
 class SubdivisionObject(Object3D):
     def __init__(self, object, staticFaceMask=None):
         """
@@ -67,6 +181,12 @@ class SubdivisionObject(Object3D):
         self.object = object.object
         self.parent = object    # TODO avoid conflicts with clone()'s parent
         self.priority = object.priority
+        if isinstance(object, SubdivisionObject):
+            self.level = object.level + 1
+            self.seed = object.seed
+        else:
+            self.level = 1
+            self.seed = object  # The unsubdivided mesh
         if staticFaceMask is None:
             self._staticFaceMask = np.ones(object.getFaceCount(), dtype=bool)
         else:
@@ -217,20 +337,12 @@ class SubdivisionObject(Object3D):
 
         progress.step()
 
-        map_ = np.argsort(self.evert[:,0,:].flat)
-        vi = self.evert[:,0,:].flat[map_]
-        ei = np.mgrid[:len(self.evert),:2][0].flat[map_].astype(np.uint32)
-        del map_
-        ix, first = np.unique(vi, return_index=True)
-        n = first[1:] - first[:-1]
-        n = np.hstack((n, np.array([len(vi) - first[-1]])))
-        self.nedges[ix] = n.astype(np.uint8)
-        try:
-            for i in range(len(ix)):
-                self.vedge[ix[i],:n[i]] = ei[first[i]:][:n[i]]
-        except ValueError as e:
-            raise RuntimeError("Pole-count too low, try increasing max_pole: %s" % e)
-        del vi, ei, ix, n, first
+        vi, ei, slots, n = _invertMapping(self.evert[:,0,:], nverts)
+        if len(n) and n.max() > self.MAX_FACES:
+            raise RuntimeError("Pole-count too low, try increasing max_pole: %s edges at one vertex" % n.max())
+        self.nedges[...] = n
+        self.vedge[vi, slots] = ei
+        del vi, ei, slots, n
 
         progress.step()
 
@@ -280,6 +392,12 @@ class SubdivisionObject(Object3D):
 
         progress.step()
 
+        self.stencil = self._buildStencil()
+        if self.level > 1:
+            # Express the verts of this level directly in the verts of the seed
+            self.seedStencil = self.stencil.compose(self.parent.seedStencil)
+        else:
+            self.seedStencil = self.stencil
         self.update_coords()
 
         progress.step()
@@ -311,9 +429,9 @@ class SubdivisionObject(Object3D):
         # Map base verts onto themselves
         self._parent_map[:self.cbase, 0] = self.vtx_map[:]
         # Face-center verts are mapped to the 4 base verts connected to the face
-        self._parent_map[self.cbase:self.ebase, :4] = self.vtx_map[parent.fvert[self.face_map]]
+        self._parent_map[self.cbase:self.ebase, :4] = parent.fvert[self.face_map]
         # Edge-center verts are mapped to the 2 base verts that are endpoints of the edge
-        self._parent_map[self.ebase:, :2] = self.evert[:,0,:]
+        self._parent_map[self.ebase:, :2] = self.vtx_map[self.evert[:,0,:]]
 
         self._parent_map_weights = np.zeros(self._parent_map.shape[0], dtype=np.float32)
         self._parent_map_weights[:self.cbase] = 1.0
@@ -355,6 +473,40 @@ class SubdivisionObject(Object3D):
         # TODO populate in deferred form, make this a getter (and retrieve recursively)
         return self._parent_map_weights
 
+    @property
+    def weightStencil(self):
+        """
+        Stencil interpolating per vertex values of the parent (eg. vertex
+        weights) to the verts of this mesh, following _parent_map.
+        """
+        if not hasattr(self, '_weightStencil'):
+            rows, cols = np.nonzero(self._parent_map > -1)
+            self._weightStencil = SubdivisionStencil(rows, self._parent_map[rows, cols],
+                                                     self._parent_map_weights[rows], 
+                                                     (self.getVertexCount(), self.parent.getVertexCount()))
+        return self._weightStencil
+
+    def getVertexWeights(self, parentWeights):
+        """
+        Map armature weights mapped to the root parent (original mesh) to this
+        subdivided mesh, through all subdivision levels.
+        """
+        parentWeights = self.parent.getVertexWeights(parentWeights)
+
+        stencil = self.weightStencil
+        values = np.zeros(self.parent.getVertexCount(), dtype=np.float32)
+        from collections import OrderedDict
+        weights = OrderedDict()
+        for bname, (verts,wghts) in list(parentWeights.data.items()):
+            values[:] = 0
+            values[verts] = wghts
+            wts = stencil.apply(values)
+            vgroup = np.nonzero(wts)[0]
+            if len(vgroup):
+                weights[bname] = (vgroup, wts[vgroup])
+
+        return parentWeights.create(weights, self.getVertexCount())
+
     def update_uvs(self):
         parent = self.parent
 
@@ -381,9 +533,10 @@ class SubdivisionObject(Object3D):
 
         self.has_uv = parent.has_uv
 
-    def update_coords(self):
+    def _buildStencil(self):
         """
-        Recalculate positions of subdiv coordinates
+        Build the subdivision stencil, expressing each subdivided vertex as 
+        a weighted sum of parent vertices:
         
          v0  e0  v1
          
@@ -396,58 +549,94 @@ class SubdivisionObject(Object3D):
         with ei newly introduced verts at the centers of the poly edges (evert)
         """
         parent = self.parent
-
-        bvert = self.coord[:self.cbase]            # Base verts
-        cvert = self.coord[self.cbase:self.ebase]  # Poly center verts
-        evert = self.coord[self.ebase:]            # Edge verts
-
-        cvert[...] = np.sum(parent.coord[parent.fvert[self.face_map]], axis=1) / 4
-
-        pcoord = parent.coord[self.vtx_map]
-
-        iva = self.evert[:,0,0]  # References to base verts
-        ivb = self.evert[:,0,1]
+        nverts = len(self.coord)
+        rows = []
+        cols = []
+        weights = []
+
+        def add(r, c, w):
+            r, c, w = np.broadcast_arrays(r, c, w)
+            rows.append(r.reshape(-1))
+            cols.append(c.reshape(-1))
+            weights.append(w.reshape(-1).astype(np.float64))
+
+        # Center verts: average of the 4 verts of the face
+        fverts = parent.fvert[self.face_map]
+        nfaces = len(fverts)
+        add(self.cbase + np.arange(nfaces)[:,None], fverts, 1.0/4)
+
+        # Edge verts: average of the two edge verts when at edge (of the
+        # mesh), else average of the two edge verts and the two face centers
+        iva = self.vtx_map[self.evert[:,0,0]]  # References to base verts
+        ivb = self.vtx_map[self.evert[:,0,1]]
         ic1 = self.evert[:,1,0]  # References to center verts
         ic2 = self.evert[:,1,1]
-
-        va = pcoord[iva]
-        vb = pcoord[ivb]
-        mvert = va + vb
-        del iva, ivb, va, vb
-
-        vc1 = cvert[ic1]
-        vc2 = cvert[ic2]
-        vc = vc1 + vc2
-        del vc1, vc2
-
         inedge = (ic1 == ic2)
+        erows = self.ebase + np.arange(len(self.evert))
+        ewt = np.where(inedge, 1.0/2, 1.0/4)
+        add(erows, iva, ewt)
+        add(erows, ivb, ewt)
+        inner = ~inedge
+        add(erows[inner][:,None], fverts[ic1[inner]], 1.0/16)
+        add(erows[inner][:,None], fverts[ic2[inner]], 1.0/16)
+
+        # Base verts: with n the number of faces of the vertex, and
+        #   ofvert  the average of the centers of its faces
+        #   oevert  the average of the midpoints of its edges
+        #   oevert2 the sum of the midpoints of its edges at the edge of the mesh
+        #   nvedge  the number of its edges at the edge of the mesh
+        # the vertex is placed at 
+        #   (ofvert + 2 * oevert + (n - 3) * v) / n  for regular vertices,
+        #   (oevert2 + v) / (nvedge + 1)             for vertices at the edge of the mesh (less edges than faces),
+        #   (3 * oevert - ofvert) / 2                for vertices with less than 3 faces
+        # Only faces inside the static face mask count, so the border of the
+        # mask is treated as the edge of the mesh.
+        pvface = parent.vface[self.vtx_map]
+        fvalid = np.arange(pvface.shape[1])[None,:] < parent.nfaces[self.vtx_map][:,None]
+        fbrow = np.nonzero(fvalid)[0]
+        bfaces = self.face_rmap[pvface[fvalid]]
+        inmask = bfaces >= 0
+        fbrow = fbrow[inmask]
+        bfaces = bfaces[inmask]
+        nvface = np.bincount(fbrow, minlength=self.cbase).astype(np.float64)
+        nedges = self.nedges.astype(np.float64)
+
+        evalid = np.arange(self.vedge.shape[1])[None,:] < self.nedges[:,None]
+        ebrow = np.nonzero(evalid)[0]
+        bedges = self.vedge[evalid]
+        nvedge = np.bincount(ebrow, weights=inedge[bedges], minlength=self.cbase)
 
-        # Calculate edge vert coordinates: average two e verts when at edge, else average over 4
-        evert[...] = np.where(inedge[:,None], mvert / 2, (mvert + vc) / 4)
-        del ic1, ic2, vc
+        valid = nvface >= 3
+        regular = valid & (nedges == nvface)
+        atedge = valid & ~regular
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fweight = np.select([regular, atedge], [1.0 / nvface, 0.0], -1.0/2)
+            eweight = np.select([regular, atedge], [2.0 / nvface, 0.0], 3.0/2)
+            e2weight = np.where(atedge, 1.0 / (nvedge + 1), 0.0)
+            vweight = np.select([regular, atedge], [(nvface - 3) / nvface, 1.0 / (nvedge + 1)], 0.0)
 
-        nvface = parent.nfaces[self.vtx_map]
+        brows = np.arange(self.cbase)
+        add(brows, self.vtx_map, vweight)
 
-        # comment: this code could really do with some comments
-        edgewt = np.arange(self.MAX_FACES)[None,:,None] < self.nedges[:,None,None]
-        edgewt2 = edgewt * inedge[self.vedge][:,:,None]
-        edgewt = edgewt / self.nedges.astype(np.float32)[:,None,None]
-        nvedge = np.sum(edgewt2, axis=1)
-        oevert = np.sum(mvert[self.vedge] * edgewt / 2, axis=1)
-        oevert2 = np.sum(mvert[self.vedge] * edgewt2 / 2, axis=1)
-        facewt = np.arange(self.MAX_FACES)[None,:,None] < nvface[:,None,None]
-        facewt = facewt / nvface.astype(np.float32)[:,None,None]
-        ofvert = np.sum(cvert[self.face_rmap[parent.vface[self.vtx_map]]] * facewt, axis=1)
-        opvert = pcoord
+        # oevert and oevert2, averaging the midpoints of the edges
+        ewt = eweight[ebrow] / nedges[ebrow] / 2 + e2weight[ebrow] * inedge[bedges] / 2
+        add(ebrow, self.vtx_map[self.evert[bedges,0,0]], ewt)
+        add(ebrow, self.vtx_map[self.evert[bedges,0,1]], ewt)
 
-        valid = nvface >= 3
+        # ofvert, averaging the face centers
+        add(fbrow[:,None], fverts[bfaces], (fweight[fbrow] / nvface[fbrow] / 4)[:,None])
 
-        bvert[...] = np.where(valid[:,None],
-                              np.where((self.nedges == nvface)[:,None],
-                                       (ofvert + 2 * oevert + (nvface[:,None] - 3) * opvert) / nvface[:,None],
-                                       (oevert2 + opvert) / (nvedge + 1)),
-                              (3 * oevert - ofvert) / 2)
+        return SubdivisionStencil(np.concatenate(rows), np.concatenate(cols), 
+                                  np.concatenate(weights), (nverts, len(parent.coord)))
 
+    def update_coords(self):
+        """
+        Recalculate positions of subdiv coordinates by applying the (cached)
+        subdivision stencil to the coordinates of the seed mesh. For multiple
+        subdivision levels this is the composition of the stencils of all
+        levels, the intermediate levels are not updated.
+        """
+        self.coord[...] = self.seedStencil.apply(self.seed.coord)
         self.markCoords(coor=True)
 
     def update(self):
@@ -466,49 +655,66 @@ class SubdivisionObject(Object3D):
         on the subdivided mesh faces.
         """
         if remapFromUnsubdivided:
-            nBaseFaces = len(self.face_map)
-
-            # Duplicate the facemask to 4 faces per seedmesh face
-            subdiv_face_mask = np.zeros((nBaseFaces, 4), dtype=bool)
-            subdiv_face_mask[:] = mask[self.face_map][:,None]
-            subdiv_face_mask = subdiv_face_mask.reshape(4*nBaseFaces)
-
-            super(SubdivisionObject, self).changeFaceMask(subdiv_face_mask)
+            super(SubdivisionObject, self).changeFaceMask(self._subdivideFaceMask(mask))
         else:
             super(SubdivisionObject, self).changeFaceMask(mask)
 
+    def _subdivideFaceMask(self, mask):
+        """
+        Remap a face mask for the seed mesh to the faces of this mesh.
+        """
+        if self.level > 1:
+            mask = self.parent._subdivideFaceMask(mask)
+
+        nBaseFaces = len(self.face_map)
+
+        # Duplicate the facemask to 4 faces per parent face
+        subdiv_face_mask = np.zeros((nBaseFaces, 4), dtype=bool)
+        subdiv_face_mask[:] = mask[self.face_map][:,None]
+        return subdiv_face_mask.reshape(4*nBaseFaces)
+
     @property
     def staticFaceMask(self):
         return self._staticFaceMask
 
     def clone(self, scale=1.0, filterMaskedVerts=False):
+        # The static face mask applies to the first subdivision level
+        first = self
+        while first.level > 1:
+            first = first.parent
         # First clone the seed mesh
-        otherSeed = self.parent.clone(scale, filterMaskedVerts)
+        otherSeed = self.seed.clone(scale, filterMaskedVerts)
         # Then generate a subdivision for it
         if filterMaskedVerts:
             # All masked vertices, static and dynamic are filtered out from parent
             staticFaceMask = None
         else:
-            staticFaceMask = self.staticFaceMask
-        return createSubdivisionObject(otherSeed, staticFaceMask)
-
+            staticFaceMask = first.staticFaceMask
+        return createSubdivisionObject(otherSeed, staticFaceMask, self.level)
+
+
+def _invertMapping(input, n):
+    """
+    Invert a (m, k) mapping of rows to indices in range(n), using the same
+    algorithm as module3d._update_faces. Returns for each entry the index,
+    the row and the column of the row in the output (the order of 
+    occurrence of the index), and the number of rows referring to each index.
+    """
+    flat = np.asarray(input).reshape(-1)
+    map_ = np.argsort(flat, kind='stable')
+    vi = flat[map_]
+    fi = (map_ // input.shape[1]).astype(np.uint32)
+    counts = np.bincount(vi, minlength=n)
+    slots = np.arange(len(vi)) - (np.cumsum(counts) - counts)[vi]
+    return vi, fi, slots, counts
 
 def _reverse_n_to_m_map(input, output, offset=0):
-    # Using same algorithm as module3d._update_faces to construct inverse 
-    # mapping with variable number of valid columns
-    map_ = np.argsort(input.flat)
-    vi = input.flat[map_]
-    fi = np.mgrid[:input.shape[0],:input.shape[1]][0].flat[map_].astype(np.uint32)
-    del map_
-    ix, first = np.unique(vi, return_index=True)
-    n = first[1:] - first[:-1]
-    n_last = len(vi) - first[-1]
-    n = np.hstack((n, np.array([n_last])))
-    for i in range(len(ix)):
-        output[ix[i], :n[i]] = offset + fi[first[i]:][:n[i]]
-
-
-def createSubdivisionObject(object, staticFaceMask=None):
+    # Inverse mapping with variable number of valid columns
+    vi, fi, slots, _ = _invertMapping(input, len(output))
+    output[vi, slots] = offset + fi
+
+
+def createSubdivisionObject(object, staticFaceMask=None, levels=1):
     #
     # since the algorithm was written for quads we avoid triangle-meshes to be subdivided
     # and return the object given
@@ -523,6 +729,9 @@ def createSubdivisionObject(object, staticFaceMask=None):
 
     obj = SubdivisionObject(object, staticFaceMask)
     obj.create()
+    for level in range(1, levels):
+        obj = SubdivisionObject(obj)
+        obj.create()
     return obj
 
 def updateSubdivisionObject(object):
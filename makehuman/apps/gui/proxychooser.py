@@ -324,6 +324,7 @@ class ProxyChooserTaskView(gui3d.TaskView, filecache.MetadataCacher):
         self.filechooser.selectItem( self.getAlternativeFile(mhclofile) )  # In case an ascii or binary file was loaded instead
 
         self.adaptProxyToHuman(pxy, obj)
+        obj.setSubdivisionLevels(human.getSubdivisionLevels())
         obj.setSubdivided(human.isSubdivided()) # Copy subdivided state of human
 
         # Add to selection
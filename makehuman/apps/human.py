@@ -37,6 +37,7 @@ TODO
 """
 
 import numpy as np
+import weakref
 import algos3d
 import guicommon
 from core import G
@@ -55,6 +56,8 @@ from makehuman import getBasemeshVersion, getShortVersion, getVersionStr, getVer
 
 class Human(guicommon.Object, animation.AnimatedMesh):
 
+    maxIncrementalUpdates = 32      # Incremental target updates before the mesh is fully rebuilt
+
     def __init__(self, mesh):
         guicommon.Object.__init__(self, mesh)
 
@@ -81,6 +84,14 @@ class Human(guicommon.Object, animation.AnimatedMesh):
         self.targetsDetailStack = {}  # All details targets applied, with their values
         self.symmetryModeEnabled = False
 
+        self.useTargetBasis = False     # Apply the targets stack as one packed basis (see algos3d.TargetBasis)
+        self._targetBasis = None
+
+        self.incrementalTargetUpdates = False   # Only apply the targets that changed since the previous applyAllTargets
+        self._appliedTargets = None     # Targets (weight, weakref to target) that are applied to _appliedCoord
+        self._appliedCoord = None
+        self._incrementalUpdates = 0
+
         self.setDefaultValues()
 
         self.bodyZones = ['l-eye','r-eye', 'jaw', 'nose', 'mouth', 'head', 'neck', 'torso', 'hip', 'pelvis', 'r-upperarm', 'l-upperarm', 'r-lowerarm', 'l-lowerarm', 'l-hand',
@@ -471,6 +482,12 @@ class Human(guicommon.Object, animation.AnimatedMesh):
 
             self.callEvent('onChanged', events3d.HumanEvent(self, 'smooth'))
 
+    def setSubdivisionLevels(self, levels):
+        guicommon.Object.setSubdivisionLevels(self, levels)
+        for obj in self.getProxyObjects():
+            if obj:
+                obj.setSubdivisionLevels(levels)
+
     def setGender(self, gender, updateModifier = True):
         """
         Sets the gender of the model. 0 is female, 1 is male.
@@ -920,6 +937,19 @@ class Human(guicommon.Object, animation.AnimatedMesh):
         elif name in self.targetsDetailStack:
             del self.targetsDetailStack[name]
 
+    def setDetails(self, names, values):
+        """
+        Set the weights of many targets at once. Names are expected to be
+        canonical paths already (see getpath.canonicalPath), values is a
+        sequence or array of the same length.
+        """
+        stack = self.targetsDetailStack
+        for name, value in zip(names, np.asarray(values, dtype=np.float64).tolist()):
+            if value:
+                stack[name] = value
+            elif name in stack:
+                del stack[name]
+
     def getDetail(self, name):
         name = canonicalPath(name)
         return self.targetsDetailStack.get(name, 0.0)
@@ -927,9 +957,19 @@ class Human(guicommon.Object, animation.AnimatedMesh):
     def updateMacroModifiers(self):
         """Update the targetsDetailStack for this human
         determined by the macromodifier target combinations."""
+        # Dependent modifier groups only need updating once, after all macro
+        # modifiers are set
+        dependentGroups = []
         for modifier in self.modifiers:
             if modifier.isMacro():
-                modifier.setValue(modifier.getValue())
+                modifier.setValue(modifier.getValue(), skipDependencies=True)
+                for group in self.getModifiersAffectedBy(modifier):
+                    if group not in dependentGroups:
+                        dependentGroups.append(group)
+
+        for group in dependentGroups:
+            m = self.getModifiersByGroup(group)[0]
+            m.setValue(m.getValue(), skipDependencies=True)
 
     @property
     def modifiers(self):
@@ -1144,11 +1184,19 @@ class Human(guicommon.Object, animation.AnimatedMesh):
         """
         return [ fg_name for fg_name in self.meshData.getFaceGroups() if fg_name.startswith('joint-') ]
 
-    def applyAllTargets(self, update=True):
+    def applyAllTargets(self, update=True, incremental=None):
         """
         This method applies all targets, in function of age and sex
 
-        **Parameters:** None.
+        **Parameters:**
+
+        update:
+            *bool*. Whether to update the render buffers of the mesh.
+
+        incremental:
+            *bool*. Only apply the changes in target weights since the
+            previous call, instead of rebuilding the mesh from all targets
+            (see _applyTargetDeltas). Defaults to incrementalTargetUpdates.
         """
         progress = Progress()
 
@@ -1156,13 +1204,10 @@ class Human(guicommon.Object, animation.AnimatedMesh):
 
         # First call progress callback (which often processes events) before resetting mesh
         # so that mesh is not drawn in its reset state
-        algos3d.resetObj(self.meshData)  # Reset mesh is in rest pose
-
-        # Apply targets to seedmesh coordinates
-        itprog = Progress(len(self.targetsDetailStack))
-        for (targetPath, morphFactor) in self.targetsDetailStack.items():
-            algos3d.loadTranslationTarget(self.meshData, targetPath, morphFactor, None, 0, 0)
-            itprog.step()
+        # Apply targets to seedmesh coordinates (mesh is in rest pose)
+        if incremental is None:
+            incremental = self.incrementalTargetUpdates
+        self.applyTargetsToMesh(incremental)
 
         # Make sure self.getRestposeCoordinates is up-to-date directly (required for proxy fitting)
         self._updateOriginalMeshCoords(self.meshData.name, self.meshData.coord)
@@ -1208,6 +1253,96 @@ class Human(guicommon.Object, animation.AnimatedMesh):
 
         progress(1.0)
 
+    def applyTargetsToMesh(self, incremental=False, progress=True):
+        """
+        Set the seedmesh coordinates to the basemesh in rest pose with all
+        targets in the targets detail stack applied. Does not update normals,
+        proxies, or any other state depending on the seedmesh.
+        If progress is False, no progress is reported (which would process
+        events), making this method usable from other threads.
+        """
+        if incremental and self._applyTargetDeltas():
+            return
+
+        algos3d.resetObj(self.meshData)
+        appliedTargets = dict()
+        if self.useTargetBasis:
+            self._applyTargetBasis()
+            for (targetPath, morphFactor), target in zip(self.targetsDetailStack.items(), self._targetBasis.targets):
+                appliedTargets[targetPath] = (morphFactor, target)
+        else:
+            if self._targetBasis is not None:
+                self._targetBasis.release()
+                self._targetBasis = None
+            itprog = Progress(len(self.targetsDetailStack)) if progress else None
+            for (targetPath, morphFactor) in self.targetsDetailStack.items():
+                target = algos3d.loadTranslationTarget(self.meshData, targetPath, morphFactor, None, 0, 0)
+                appliedTargets[targetPath] = (morphFactor, weakref.ref(target) if target is not None else None)
+                if itprog:
+                    itprog.step()
+
+        self._storeAppliedTargets(appliedTargets)
+        self._incrementalUpdates = 0
+
+    def _storeAppliedTargets(self, appliedTargets):
+        """
+        Remember the coordinates of the seedmesh, and the weights of and (weak
+        references to) the target objects that were applied to obtain them.
+        """
+        self._appliedTargets = appliedTargets
+        self._appliedCoord = self.meshData.coord.copy()
+
+    def _applyTargetDeltas(self):
+        """
+        Update the seedmesh from the coordinates stored after the previous
+        application of targets, by applying only the difference in weight of
+        the targets that changed since. Returns False if this is not possible
+        (or not worth it) and a full rebuild is required.
+        To bound the accumulation of rounding errors, a full rebuild is also
+        required after maxIncrementalUpdates incremental updates.
+        """
+        if self._appliedTargets is None or self._incrementalUpdates >= self.maxIncrementalUpdates:
+            return False
+
+        stack = self.targetsDetailStack
+        deltas = []
+        for path in list(stack.keys()) + [p for p in self._appliedTargets if p not in stack]:
+            old, target = self._appliedTargets.get(path, (0.0, None))
+            if old and (target is None or target() is None or target() is not algos3d._targetBuffer.get(path)):
+                # Target was evicted, reloaded or replaced, so its applied
+                # contribution might not match its current data
+                return False
+            new = stack.get(path, 0.0)
+            if new != old:
+                deltas.append( (path, new - old) )
+
+        if len(deltas) > len(stack) // 2:
+            return False
+
+        self.meshData.changeCoords(self._appliedCoord)
+        appliedTargets = dict( (path, applied) for path, applied in self._appliedTargets.items() if path in stack )
+        for targetPath, delta in deltas:
+            target = algos3d.loadTranslationTarget(self.meshData, targetPath, delta, None, 0, 0)
+            if targetPath in stack:
+                appliedTargets[targetPath] = (stack[targetPath], weakref.ref(target))
+
+        self._storeAppliedTargets(appliedTargets)
+        self._incrementalUpdates += 1
+        return True
+
+    def _applyTargetBasis(self):
+        """
+        Apply the complete targets detail stack to the (reset) seedmesh as one
+        packed sparse basis. The basis is cached and only rebuilt when the set
+        of targets in the stack changes.
+        """
+        paths = list(self.targetsDetailStack.keys())
+        if self._targetBasis is None or not self._targetBasis.isValid(paths):
+            if self._targetBasis is not None:
+                self._targetBasis.release()
+            self._targetBasis = algos3d.TargetBasis(self.meshData, paths)
+        self._targetBasis.apply(self.meshData, list(self.targetsDetailStack.values()))
+
     def getPartNameForGroupName(self, groupName):
         # TODO is this still used anywhere?
         for k in self.bodyZones:
@@ -1263,7 +1398,7 @@ class Human(guicommon.Object, animation.AnimatedMesh):
                 opposite = self.getModifier(modifier.getSymmetricOpposite())
                 opposite.setValue(modifier.getValue())
 
-        self.applyAllTargets()
+        self.applyAllTargets(incremental=True)
 
         # TODO emit event?
 
@@ -46,6 +46,7 @@ import operator
 import numpy as np
 import log
 import targets
+from getpath import canonicalPath
 from functools import reduce
 
 
@@ -128,7 +129,7 @@ class ModifierAction(guicommon.Action):
             else:
                 opposite.setValue( self.modifier.getValue() )
 
-        self.human.applyAllTargets()
+        self.human.applyAllTargets(incremental=True)
         self.postAction()
         return True
 
@@ -145,7 +146,7 @@ class ModifierAction(guicommon.Action):
                 opposite = self.human.getModifier( self.modifier.getSymmetricOpposite() )
                 opposite.setValue( self.modifier.getValue() )
 
-        self.human.applyAllTargets()
+        self.human.applyAllTargets(incremental=True)
         self.postAction()
         return True
 
@@ -458,13 +459,21 @@ class ManagedTargetModifier(Modifier):
             value = max( 0.0, value)
         return value
 
+    @property
+    def targetTable(self):
+        """
+        Compiled TargetWeightTable of the targets of this modifier.
+        """
+        if getattr(self, '_targetTable', None) is None or self._targetTable.targets is not self.targets:
+            self._targetTable = TargetWeightTable(self.targets)
+        return self._targetTable
+
     def setValue(self, value, skipDependencies=False):
         value = self.clampValue(value)
         factors = self.getFactors(value)
 
-        tWeights = getTargetWeights(self.targets, factors)
-        for tpath, tWeight in tWeights.items():
-            self.human.setDetail(tpath, tWeight)
+        table = self.targetTable
+        self.human.setDetails(table.paths, table.getWeights(factors))
 
         if skipDependencies:
             return
@@ -565,6 +574,10 @@ class MacroModifier(ManagedTargetModifier):
 
         self.targets = self.findTargets(self.groupName)
 
+        # Macro targets are used by every human, keep them buffered
+        for target in self.targets:
+            algos3d.pinTarget(target[0])
+
         # log.debug('macro modifier %s.%s(%s): %s', base, name, variable, self.targets)
 
         self.macroDependencies = self.findMacroDependencies(self.groupName)
@@ -641,6 +654,64 @@ class EthnicModifier(MacroModifier):
         self.human.blockEthnicUpdates = _tmp
         return oldVals
 
+class TargetWeightTable(object):
+    """
+    Precompiled form of a targets list as returned by
+    ManagedTargetModifier.findTargets(), that evaluates the weights of all
+    targets in one vectorized product.
+    Each target is stored as a row of indices into the list of factor names,
+    padded with the index of a constant 1.0 factor, so that the weight of a
+    target is the product of the factor values its row refers to (in the same
+    order as getTargetWeights() multiplies them).
+    """
+
+    def __init__(self, targets):
+        self.targets = targets
+        self.paths = [canonicalPath(tpath) for (tpath, _) in targets]
+        self.factorNames = sorted(set(factor for (_, tfactors) in targets for factor in tfactors))
+        self._factorIndex = dict((name, i) for (i, name) in enumerate(self.factorNames))
+
+        width = max([len(tfactors) for (_, tfactors) in targets] + [1])
+        self.index = np.full((len(targets), width), len(self.factorNames), dtype=np.intp)
+        for i, (_, tfactors) in enumerate(targets):
+            self.index[i,:len(tfactors)] = [self._factorIndex[factor] for factor in tfactors]
+
+    def getFactorVector(self, factors, ignoreNotfound = False):
+        """
+        Array with the values of the factor names of this table, taken from
+        the factors dict, followed by the constant padding factor.
+        """
+        if ignoreNotfound:
+            values = [factors.get(name, 1.0) for name in self.factorNames]
+        else:
+            values = [factors[name] for name in self.factorNames]
+        return np.array(values + [1.0], dtype=np.float64)
+
+    def getWeights(self, factors, value = 1.0, ignoreNotfound = False):
+        """
+        Weights of all targets (in the order of paths) for the factor values in
+        the factors dict.
+        """
+        vector = self.getFactorVector(factors, ignoreNotfound)
+        return value * np.multiply.reduce(vector[self.index], axis=1)
+
+    def getBatchWeights(self, factors, values = 1.0, ignoreNotfound = False):
+        """
+        Weights of all targets for many factor settings at once.
+        factors is either a list of factor dicts, or an array of shape
+        (n, len(factorNames)) with its columns in the order of factorNames.
+        Returns an array of shape (n, len(paths)).
+        """
+        if isinstance(factors, np.ndarray):
+            factors = np.asarray(factors, dtype=np.float64)
+            if factors.ndim != 2 or factors.shape[1] != len(self.factorNames):
+                raise ValueError("Expected factor matrix with %d columns" % len(self.factorNames))
+            matrix = np.ones((factors.shape[0], len(self.factorNames)+1), dtype=np.float64)
+            matrix[:,:-1] = factors
+        else:
+            matrix = np.array([self.getFactorVector(f, ignoreNotfound) for f in factors], dtype=np.float64).reshape(-1, len(self.factorNames)+1)
+        return np.asarray(values, dtype=np.float64).reshape(-1, 1) * np.multiply.reduce(matrix[:,self.index], axis=2)
+
 def getTargetWeights(targets, factors, value = 1.0, ignoreNotfound = False):
     result = dict()
     if ignoreNotfound:
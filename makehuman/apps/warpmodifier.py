@@ -183,6 +183,7 @@ class WarpModifier (humanmodifier.UniversalModifier):
 
         target = self.compileWarpTarget()
         algos3d._targetBuffer[canonicalPath(self.fullName)] = target    # TODO remove direct use of the target buffer?
+        algos3d.pinTarget(self.fullName)    # Warp targets cannot be reloaded from file
         self.human.hasWarpTargets = True
 
         if debug:
@@ -345,6 +346,7 @@ def resetWarpBuffer():
                     log.debug("  DEL %s" % path)
                 human.setDetail(localPath(path), 0)
                 del algos3d._targetBuffer[path]
+                algos3d.unpinTarget(path)
         human.applyAllTargets()
         human.hasWarpTargets = False
 
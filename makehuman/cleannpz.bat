@@ -10,6 +10,16 @@ for /r %%i in (*) do (
    )
 )
 
+:: Clean up memory-mapped target archives
+
+set filetype=.mmap
+
+for /r %%i in (*) do (
+   if %%~xi==%filetype% (
+      del %%i
+   )
+)
+
 :: Clean up .bin files as well
 
 set filetype=.bin
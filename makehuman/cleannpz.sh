@@ -11,6 +11,11 @@ find . -type f -iname \*.npz -exec rm -rf {} \;
 find . -type f -iname \*.mhpxy -exec rm -rf {} \;
 
 
+# And memory-mapped target archives
+
+find . -type f -iname \*.mmap -exec rm -rf {} \;
+
+
 # And .bin files
 
 find . -type f -iname \*.bin -exec rm -rf {} \;
@@ -42,8 +42,14 @@ import makehuman
 import algos3d
 import numpy as np
 import os
+import io
+import json
+import hashlib
 import zipfile
 import fnmatch
+import multiprocessing
+
+MANIFEST = 'targets.manifest.json'
 
 def getAllFiles(rootPath, filterStrArr):
     result = [ None ]*len(filterStrArr)
@@ -60,36 +66,150 @@ def getFiles(root, filenames, filterStr):
         foundFiles.append(os.path.join(root, filename))
     return foundFiles
 
+def getArgs():
+    import argparse
+    parser = argparse.ArgumentParser(description="Compile all .target files into a binary archive for faster loading.")
+    parser.add_argument("--mmap", action="store_true", help="Also write an uncompressed, memory-mappable archive (data/targets.mmap)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes used for parsing targets (default: number of CPUs)")
+    parser.add_argument("-f", "--full", action="store_true", help="Recompile all targets, instead of only the ones that changed since the last build")
+    return vars(parser.parse_args())
+
+def compileTarget(path):
+    """
+    Parse a text target and return its compiled index and vector arrays,
+    and its custom license (as dict) or None. Runs in a worker process.
+    """
+    target = algos3d.Target(None, None)
+    target._load_text(path)
+    index, vector = target._compile()
+    license = target._license.asDict() if hasattr(target, '_license') else None
+    return path, index, vector, license
+
+def fileHash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def npyBytes(array):
+    """
+    Serialize an array to .npy format in memory.
+    """
+    buf = io.BytesIO()
+    np.save(buf, array)
+    return buf.getvalue()
+
+def readManifest(npzPath):
+    """
+    The manifest stored in a previously compiled archive, which maps target
+    names to the mtime, size and hash of the file they were compiled from.
+    Returns an empty dict if there is no (usable) previous archive.
+    """
+    try:
+        with zipfile.ZipFile(npzPath, mode='r') as zip:
+            return json.loads(zip.read(MANIFEST).decode('utf-8'))
+    except Exception:
+        return dict()
+
+def compileTargets(allTargets, npzPath='data/targets.npz', mmap=False, jobs=None, incremental=True):
+    """
+    Compile all targets into an npz archive (and optionally a memory-mapped
+    archive). Targets are parsed in parallel by a pool of jobs processes, and
+    the compiled arrays are written straight into the archive. If incremental
+    is True, targets whose file did not change since the previous build (same
+    mtime and size, or same hash) are copied from the previous archive
+    instead of being parsed again.
+    """
+    npzdir = os.path.dirname(npzPath)
+    manifest = readManifest(npzPath) if incremental else dict()
+
+    oldZip = zipfile.ZipFile(npzPath, mode='r') if manifest else None
+    oldMembers = set(oldZip.namelist()) if oldZip else set()
+
+    # Determine which targets changed since the previous build
+    entries = dict()
+    names = dict()
+    changed = []
+    for path in allTargets:
+        name = os.path.splitext(os.path.relpath(path, npzdir))[0].replace('\\', '/')
+        names[path] = name
+        stat = os.stat(path)
+        entry = {'mtime': stat.st_mtime, 'size': stat.st_size}
+        old = manifest.get(name)
+        if old and '%s.index.npy' % name in oldMembers and '%s.vector.npy' % name in oldMembers:
+            if old['mtime'] == entry['mtime'] and old['size'] == entry['size']:
+                entries[name] = old
+                continue
+            entry['hash'] = fileHash(path)
+            if old.get('hash') == entry['hash']:
+                entry['license'] = old.get('license')
+                entries[name] = entry
+                continue
+        else:
+            entry['hash'] = fileHash(path)
+        entries[name] = entry
+        changed.append(path)
+
+    print("Compiling %s of %s targets" % (len(changed), len(allTargets)))
+
+    archived = []
+    tmpPath = npzPath + '.tmp'
+    with zipfile.ZipFile(tmpPath, mode='w', compression=zipfile.ZIP_DEFLATED) as zip:
+        # License for all official MH targets
+        zip.writestr('targets/targets.license.npy', npyBytes(makehuman.getAssetLicense().toNumpyString()))
+
+        # Copy unchanged targets from previous archive
+        changedPaths = set(changed)
+        for path in allTargets:
+            name = names[path]
+            if path in changedPaths:
+                continue
+            members = ['%s.index.npy' % name, '%s.vector.npy' % name]
+            if entries[name].get('license') is not None:
+                members.append('%s.license.npy' % name)
+            for member in members:
+                zip.writestr(member, oldZip.read(member))
+            if mmap:
+                index = np.load(io.BytesIO(oldZip.read(members[0])))
+                vector = np.load(io.BytesIO(oldZip.read(members[1])))
+                archived.append( (name, index, vector, entries[name].get('license')) )
+
+        def _write(i, result):
+            path, index, vector, license = result
+            name = names[path]
+            zip.writestr('%s.index.npy' % name, npyBytes(index))
+            zip.writestr('%s.vector.npy' % name, npyBytes(vector))
+            if license is not None:
+                lic = algos3d.defaultTargetLicense().fromDict(license)
+                zip.writestr('%s.license.npy' % name, npyBytes(lic.toNumpyString()))
+            entries[name]['license'] = license
+            if mmap:
+                archived.append( (name, index, vector, license) )
+            print("[%.0f%% done] converted target %s" % (100*(float(i+1)/float(len(changed))), path))
+
+        # Compile changed targets
+        if jobs == 1 or len(changed) < 2:
+            for (i, result) in enumerate(map(compileTarget, changed)):
+                _write(i, result)
+        else:
+            with multiprocessing.Pool(jobs) as pool:
+                for (i, result) in enumerate(pool.imap_unordered(compileTarget, changed, chunksize=8)):
+                    _write(i, result)
+
+        zip.writestr(MANIFEST, json.dumps(entries, indent=1, sort_keys=True))
+
+    if oldZip:
+        oldZip.close()
+    os.replace(tmpPath, npzPath)
+
+    if mmap:
+        print("Writing memory-mapped archive")
+        archived.sort(key=lambda t: t[0])
+        algos3d.TargetArchive.write(os.path.join(npzdir, 'targets.mmap'), archived, makehuman.getAssetLicense().asDict())
+
 
 if __name__ == '__main__':
-    obj = algos3d.Target(None, None)
+    args = getArgs()
     allFiles = getAllFiles('data', ['*.target', '*.png'])
-    npzPath = 'data/targets.npz'
-    with zipfile.ZipFile(npzPath, mode='w', compression=zipfile.ZIP_DEFLATED) as zip:
-        npzdir = os.path.dirname(npzPath)
-        allTargets = allFiles[0]
-
-        # License for all official MH targets
-        lpath = 'data/targets/targets.license.npy'
-        np.save(lpath, makehuman.getAssetLicense().toNumpyString())
-        zip.write(lpath, os.path.relpath(lpath, npzdir))
-        os.remove(lpath)
-
-        for (i, path) in enumerate(allTargets):
-            try:
-                obj._load_text(path)
-                iname, vname, lname = obj._save_binary(path)
-                zip.write(iname, os.path.relpath(iname, npzdir))
-                zip.write(vname, os.path.relpath(vname, npzdir))
-                if lname:
-                    zip.write(lname, os.path.relpath(lname, npzdir))
-                    os.remove(lname)
-                os.remove(iname)
-                os.remove(vname)
-                print("[%.0f%% done] converted target %s" % (100*(float(i)/float(len(allTargets))), path))
-            except None as e:
-                raise e
-                print('error converting target %s' % path)
+    compileTargets(allFiles[0], mmap=args['mmap'], jobs=args['jobs'], incremental=not args['full'])
 
     print("Writing images list")
     with open('data/images.list', 'w', encoding="utf-8") as f:
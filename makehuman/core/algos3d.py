@@ -56,12 +56,160 @@ algorithms will be coded. For example:
 
 __docformat__ = 'restructuredtext'
 
+import io
 import os
+import re
+import warnings
+import weakref
+from collections import OrderedDict
 import numpy as np
 import log
 from getpath import getSysDataPath, canonicalPath
 
-_targetBuffer = {}
+
+class TargetBuffer(object):
+    """
+    Buffer of loaded targets, keyed on canonical target path.
+
+    The memory used by the buffered targets is accounted for, and once it
+    exceeds maxBytes the least recently used targets are evicted (they will
+    be loaded again when next requested). Pinned targets are never evicted,
+    but do count towards maxBytes. With maxBytes set to None (the default),
+    the buffer is unbounded.
+
+    The budget only bounds the memory held by the buffer itself: an evicted
+    target that is still referenced elsewhere stays in memory until that
+    reference is released.
+    """
+
+    def __init__(self, maxBytes=None):
+        self.maxBytes = maxBytes
+        self._targets = OrderedDict()
+        self._sizes = dict()
+        self._pinned = set()
+        self.nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getitem__(self, path):
+        target = self._targets[path]
+        self._targets.move_to_end(path)
+        return target
+
+    def __setitem__(self, path, target):
+        if path in self._targets:
+            del self[path]
+        self._targets[path] = target
+        self._sizes[path] = _targetSize(target)
+        self.nbytes += self._sizes[path]
+        self._evict(keep=path)
+
+    def __delitem__(self, path):
+        del self._targets[path]
+        self.nbytes -= self._sizes.pop(path)
+
+    def __contains__(self, path):
+        return path in self._targets
+
+    def __len__(self):
+        return len(self._targets)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def get(self, path, default=None):
+        return self._targets.get(path, default)
+
+    def keys(self):
+        return list(self._targets.keys())
+
+    def values(self):
+        return list(self._targets.values())
+
+    def items(self):
+        return list(self._targets.items())
+
+    def lookup(self, path):
+        """
+        Retrieve the buffered target with the specified path and mark it as
+        most recently used, or return None if it is not buffered. Lookups are
+        counted in the hit and miss statistics.
+        """
+        target = self._targets.get(path)
+        if target is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._targets.move_to_end(path)
+
+        # The arrays of the target might have been replaced since it was
+        # buffered, so refresh its size
+        size = _targetSize(target)
+        self.nbytes += size - self._sizes[path]
+        self._sizes[path] = size
+        self._evict(keep=path)
+        return target
+
+    def pin(self, path):
+        self._pinned.add(path)
+
+    def unpin(self, path):
+        self._pinned.discard(path)
+
+    def isPinned(self, path):
+        return path in self._pinned
+
+    def setMaxBytes(self, maxBytes):
+        self.maxBytes = maxBytes
+        self._evict()
+
+    def _evict(self, keep=None):
+        if self.maxBytes is None or self.nbytes <= self.maxBytes:
+            return
+        for path in list(self._targets.keys()):
+            if path == keep or path in self._pinned:
+                continue
+            del self[path]
+            self.evictions += 1
+            if self.nbytes <= self.maxBytes:
+                break
+
+    def getStats(self):
+        return {'targets': len(self._targets),
+                'pinned': len(self._pinned.intersection(self._targets)),
+                'bytes': self.nbytes,
+                'pinnedBytes': sum(self._sizes[path] for path in self._pinned.intersection(self._targets)),
+                'maxBytes': self.maxBytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions}
+
+def _targetSize(target):
+    """
+    Memory (in bytes) used by the arrays of a target. Arrays that are views
+    on a memory-mapped file do not count. Quantized vectors are charged for
+    the float64 vectors they are dequantized to on first access, so that
+    the size of a target does not change when its data is read.
+    """
+    size = 0
+    if getattr(target, '_data', None) is None and isinstance(getattr(target, '_qdata', None), np.ndarray):
+        size += target._qdata.size * np.dtype(np.float64).itemsize
+    for attr in ['verts', '_data', '_qdata', 'faces']:
+        array = getattr(target, attr, None)
+        if not isinstance(array, np.ndarray):
+            continue
+        base = array
+        while base is not None and not isinstance(base, np.memmap):
+            base = getattr(base, 'base', None)
+        if base is None:
+            size += array.nbytes
+    return size
+
+_targetBuffer = TargetBuffer()
+
+_commentLine = re.compile(r'^[ \t]*(#.*)$', re.MULTILINE)
 
 
 class Target(object):
@@ -73,6 +221,10 @@ class Target(object):
     npzfile = None
     npztime = None
     npzdir = None
+    mmapfile = None
+
+    _data = None
+    _qdata = None
 
     def __init__(self, obj, name):
         """
@@ -110,10 +262,28 @@ class Target(object):
     def __repr__(self):
         return ( "<Target %s>" % (os.path.basename(self.name)) )
 
+    @property
+    def data(self):
+        """
+        Translation vectors of this target. Targets loaded from a compiled
+        archive keep their quantized int16 vectors, and are only dequantized
+        on first access.
+        """
+        if self._data is None and self._qdata is not None:
+            self._data = np.asarray(self._qdata) * 1e-3
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self._qdata = None
+
     @property
     def license(self):
         if hasattr(self, '_license'):
             return self._license
+        elif Target.mmapfile:
+            return defaultTargetLicense().fromDict(Target.mmapfile.license)
         elif Target.npzfile is not None and 'targets/targets.license' in Target.npzfile:
             license = defaultTargetLicense()
             return license.fromNumpyString(Target.npzfile['targets/targets.license'])
@@ -124,28 +294,68 @@ class Target(object):
         self._license = license
 
     def _load_text(self, name):
-        import makehuman
-        data = []
-        license = defaultTargetLicense()
+        """
+        Load target from an ascii .target file. The data lines are converted
+        in bulk, with the comments (containing license info) extracted
+        separately. Files with malformed data lines are parsed line by line.
+        """
         with open(name, 'r', encoding='utf-8') as fd:
-            for line in fd:
-                line = line.strip()
-                if line.startswith('#'):
-                    license.updateFromComment(line)
-                    continue
-                translationData = line.split()
-                if len(translationData) != 4:
-                    continue
-                vertIndex = int(translationData[0])
-                translationVector = (float(translationData[1]), float(translationData[2]), float(translationData[3]))
-                data.append((vertIndex, translationVector))
-
-        raw = np.asarray(data, dtype=Target.dtype)
-        self.verts = raw['index']
-        self.data = raw['vector']
+            text = fd.read()
+
+        # Comments normally only occur in the header of the file
+        license = defaultTargetLicense()
+        nComments = text.count('#')
+        pos = 0
+        while nComments and pos < len(text):
+            end = text.find('\n', pos)
+            if end < 0:
+                end = len(text)
+            line = text[pos:end].strip()
+            if line and not line.startswith('#'):
+                break
+            if line:
+                license.updateFromComment(line)
+                nComments -= line.count('#')
+            pos = end + 1
+        text = text[pos:].strip()
+        if nComments:
+            for line in _commentLine.findall(text):
+                license.updateFromComment(line)
+
+        try:
+            # Rows that do not all hold the same number of values are rejected
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                values = np.loadtxt(io.StringIO(text), dtype=np.float64, comments='#', ndmin=2)
+        except ValueError:
+            values = None
+        if values is not None and values.shape[1] != 4:
+            values = None
+        if values is not None and np.all(np.trunc(values[:,0]) == values[:,0]):
+            self.verts = values[:,0].astype(np.uint32)
+            self.data = values[:,1:].astype(np.float32)
+        else:
+            raw = self._parse_text_lines(text)
+            self.verts = raw['index']
+            self.data = raw['vector']
         if license.isCustomized():
             self.setLicense(license)
 
+    def _parse_text_lines(self, text):
+        """
+        Parse the data lines of an ascii target one by one, skipping comments
+        and lines that do not contain a vertex index and a translation vector.
+        """
+        data = []
+        for line in text.splitlines():
+            translationData = line.split()
+            if len(translationData) != 4 or translationData[0].startswith('#'):
+                continue
+            vertIndex = int(translationData[0])
+            translationVector = (float(translationData[1]), float(translationData[2]), float(translationData[3]))
+            data.append((vertIndex, translationVector))
+        return np.asarray(data, dtype=Target.dtype)
+
     def _load_binary_archive(self, name):
         """
         Load target from npz archive (containing multiple targets)
@@ -165,11 +375,31 @@ class Target(object):
             log.message('compiled file missing: %s', vname)
             raise RuntimeError('compiled file missing: %s' % vname)
         self.verts = Target.npzfile[iname]
-        self.data = Target.npzfile[vname] * 1e-3
+        self._qdata = Target.npzfile[vname]
+        self._data = None
         if lname in Target.npzfile:
             import makehuman
             self._license = defaultTargetLicense().fromNumpyString(Target.npzfile[lname])
 
+    def _load_mapped_archive(self, name):
+        """
+        Load target from memory-mapped archive (containing multiple targets).
+        The loaded index and vectors are views on the mapped file.
+        """
+        name = name.replace('\\', '/')
+        bname = os.path.splitext(name)[0]
+        if os.path.isfile(name) and Target.mmapfile.mtime < os.path.getmtime(name):
+            log.message('compiled file newer than archive: %s', name)
+            raise RuntimeError('compiled file newer than archive: %s' % name)
+        if bname not in Target.mmapfile:
+            log.message('compiled file missing: %s', bname)
+            raise RuntimeError('compiled file missing: %s' % bname)
+        self.verts, self._qdata = Target.mmapfile.getArrays(bname)
+        self._data = None
+        license = Target.mmapfile.getLicense(bname)
+        if license is not None:
+            self._license = defaultTargetLicense().fromDict(license)
+
     def _load_binary_files(self, name):
         """
         Load target from individual .bin file
@@ -194,6 +424,22 @@ class Target(object):
         self.data = np.load(vname) * 1e-3
 
     def _load_binary(self, name):
+        if Target.mmapfile is None:
+            mmapname = getSysDataPath('targets.mmap')
+            if os.path.isfile(mmapname):
+                try:
+                    Target.mmapfile = TargetArchive(mmapname)
+                except Exception as e:
+                    log.warning('unable to open target archive %s (%s)', mmapname, e)
+                    Target.mmapfile = False
+            else:
+                Target.mmapfile = False
+        if Target.mmapfile:
+            # Load target from memory-mapped archive
+            name = os.path.relpath(name, Target.mmapfile.dir)
+            self._load_mapped_archive(name)
+            return
+
         if Target.npzfile is None:
             try:
                 npzname = getSysDataPath('targets.npz')     # TODO duplicate path literal
@@ -217,8 +463,7 @@ class Target(object):
             bname, ext = os.path.splitext(name)
             iname = '%s.index.npy' % bname
             vname = '%s.vector.npy' % bname
-            index = np.ascontiguousarray(self.verts, dtype=np.uint16)
-            vector = np.ascontiguousarray(np.round(self.data * 1e3), dtype=np.int16)
+            index, vector = self._compile()
             np.save(iname, index)
             np.save(vname, vector)
             if hasattr(self, '_license'):
@@ -230,6 +475,15 @@ class Target(object):
         except Exception as _:
             log.error('error saving %s', name)
 
+    def _compile(self):
+        """
+        Return index and quantized vector arrays in the format in which they
+        are stored in compiled target archives.
+        """
+        index = np.ascontiguousarray(self.verts, dtype=np.uint16)
+        vector = np.ascontiguousarray(np.round(self.data * 1e3), dtype=np.int16)
+        return index, vector
+
     def _load(self, name):
         logger = log.getLogger('mh.load')
         logger.debug('loading target %s', name)
@@ -277,9 +531,10 @@ class Target(object):
                     if not animationTrack.isBaked():
                         animationTrack.bake(animatedMesh.getBaseSkeleton())
                     poseData = animatedMesh.getPoseState()
+                    boneIdxs, weights = vertBoneMapping.compiled(4)
                     obj.coord[dstVerts] += animation.skinMesh( \
                                   self.data[srcVerts] * scale[None,:], 
-                                  vertBoneMapping.compiled(4)[dstVerts], poseData )
+                                  (boneIdxs[dstVerts], weights[dstVerts]), poseData )
                 else:
                     obj.coord[dstVerts] += self.data[srcVerts] * scale[None,:]
                 obj.markCoords(dstVerts, coor=True)
@@ -293,6 +548,111 @@ class Target(object):
 
         return False
 
+class TargetArchive(object):
+    """
+    Uncompressed archive of compiled targets, stored as one flat file that is
+    memory-mapped read-only. Opening the archive and loading targets from it
+    does not copy any target data, and processes that open the same archive
+    share its pages.
+
+    File layout (little-endian):
+
+      - header page: magic, format version
+      - data, starting at the second page: per target a uint16 vertex index
+        array followed by an int16 (n, 3) vector array (scaled by 1e3, see
+        Target._compile), each aligned to ALIGNMENT bytes
+      - table: JSON object mapping target names (archive relative paths
+        without extension) to [offset, count], plus licenses
+      - trailer: table offset (uint64), table size (uint64), magic
+    """
+
+    MAGIC = b'MHTARGET'
+    VERSION = 1
+    PAGESIZE = 4096
+    ALIGNMENT = 16
+
+    def __init__(self, path):
+        self.path = path
+        self.dir = os.path.dirname(path)
+        self.mtime = os.path.getmtime(path)
+        self._buffer = np.memmap(path, dtype=np.uint8, mode='r')
+
+        if bytes(self._buffer[:8]) != self.MAGIC or bytes(self._buffer[-8:]) != self.MAGIC:
+            raise RuntimeError('not a target archive: %s' % path)
+        version = int(self._buffer[8:12].view('<u4')[0])
+        if version != self.VERSION:
+            raise RuntimeError('unsupported target archive version %s: %s' % (version, path))
+        tableOffset, tableSize = self._buffer[-24:-8].view('<u8')
+
+        import json
+        table = json.loads(bytes(self._buffer[tableOffset:tableOffset+tableSize]).decode('utf-8'))
+        self._targets = table['targets']
+        self._licenses = table['licenses']
+        self.license = table['license']
+
+    def __contains__(self, name):
+        return name in self._targets
+
+    def keys(self):
+        return self._targets.keys()
+
+    def getArrays(self, name):
+        """
+        Vertex index and quantized vector arrays of the target with the
+        specified name, as views on the mapped file.
+        """
+        offset, count = self._targets[name]
+        index = self._buffer[offset:offset+2*count].view('<u2')
+        offset = _align(offset + 2*count, self.ALIGNMENT)
+        vector = self._buffer[offset:offset+6*count].view('<i2').reshape((count, 3))
+        return np.asarray(index), np.asarray(vector)
+
+    def getLicense(self, name):
+        """
+        Custom license of the target with the specified name, as a dict, or
+        None if the target uses the default license.
+        """
+        return self._licenses.get(name)
+
+    @classmethod
+    def write(cls, path, targets, license):
+        """
+        Write a target archive. Targets is an iterable of
+        (name, index, vector, license) tuples, with index and vector arrays as
+        returned by Target._compile(), and license a dict of a custom target
+        license or None. License is the dict of the license that applies to
+        all other targets.
+        """
+        import json
+        table = {'targets': {}, 'licenses': {}, 'license': license}
+        with open(path, 'wb') as f:
+            header = cls.MAGIC + np.array([cls.VERSION], dtype='<u4').tobytes()
+            f.write(header + b'\0' * (cls.PAGESIZE - len(header)))
+            offset = cls.PAGESIZE
+            for name, index, vector, tlicense in targets:
+                index = np.ascontiguousarray(index, dtype='<u2')
+                vector = np.ascontiguousarray(vector, dtype='<i2')
+                table['targets'][name] = [offset, len(index)]
+                if tlicense is not None:
+                    table['licenses'][name] = tlicense
+                f.write(index.tobytes())
+                offset += index.nbytes
+                padding = _align(offset, cls.ALIGNMENT) - offset
+                f.write(b'\0' * padding)
+                offset += padding
+                f.write(vector.tobytes())
+                offset += vector.nbytes
+                padding = _align(offset, cls.ALIGNMENT) - offset
+                f.write(b'\0' * padding)
+                offset += padding
+            tableData = json.dumps(table).encode('utf-8')
+            f.write(tableData)
+            f.write(np.array([offset, len(tableData)], dtype='<u8').tobytes())
+            f.write(cls.MAGIC)
+
+def _align(offset, alignment):
+    return (offset + alignment - 1) // alignment * alignment
+
 def getTarget(obj, targetPath):
     """
     This function retrieves a set of translation vectors from a morphing
@@ -326,10 +686,9 @@ def getTarget(obj, targetPath):
     """
     targetPath = canonicalPath(targetPath)
 
-    try:
-        return _targetBuffer[targetPath]
-    except KeyError:
-        pass
+    target = _targetBuffer.lookup(targetPath)
+    if target is not None:
+        return target
 
     target = Target(obj, targetPath)
     _targetBuffer[targetPath] = target
@@ -346,6 +705,35 @@ def refreshCachedTarget(targetPath):
     if targetPath in _targetBuffer:
         del _targetBuffer[targetPath]
 
+def pinTarget(targetPath):
+    """
+    Never evict the specified target from the target buffer, regardless of
+    its memory budget.
+    """
+    _targetBuffer.pin(canonicalPath(targetPath))
+
+def unpinTarget(targetPath):
+    """
+    Allow the specified target to be evicted from the target buffer again.
+    """
+    _targetBuffer.unpin(canonicalPath(targetPath))
+
+def setTargetBufferBudget(maxBytes):
+    """
+    Limit the memory used by buffered targets to maxBytes (None for
+    unlimited). Least recently used targets that are not pinned are evicted
+    when the limit is exceeded.
+    """
+    _targetBuffer.setMaxBytes(maxBytes)
+
+def getTargetBufferStats():
+    """
+    Statistics of the target buffer: number of buffered and pinned targets,
+    the memory used by them, the memory budget, and hit, miss and eviction
+    counts.
+    """
+    return _targetBuffer.getStats()
+
 def loadTranslationTarget(obj, targetPath, morphFactor, faceGroupToUpdateName=None, update=1, calcNorm=1, scale=[1.0,1.0,1.0], animatedMesh=None):
     """
     This function retrieves a set of translation vectors and applies those
@@ -400,14 +788,128 @@ def loadTranslationTarget(obj, targetPath, morphFactor, faceGroupToUpdateName=No
         *AnimatedMesh*. Posed state of the basemesh with which the target should 
         be transformed before being applied.
 
+    Returns the applied target, or None if nothing had to be done.
     """
 
     if not (morphFactor or update):
-        return
+        return None
 
     target = getTarget(obj, targetPath)
 
     target.apply(obj, morphFactor, update, calcNorm, faceGroupToUpdateName, scale, animatedMesh)
+    return target
+
+class TargetBasis(object):
+    """
+    A stack of morph targets packed into one sparse (CSR-like) basis, so that
+    the whole stack can be applied to a mesh with a single weight vector
+    instead of calling loadTranslationTarget once per target.
+
+    The entries of all targets are concatenated and ordered in levels: level
+    k holds the k-th contribution (in stack order) to every vertex. Vertices
+    are sorted on their number of contributions, so every level applies to a
+    contiguous prefix of them. Applying the levels in order reproduces the
+    float32 rounding of the per-target loop, so the resulting coordinates are
+    bit-identical to those of applying the targets one by one.
+    """
+
+    def __init__(self, obj, targetPaths):
+        """
+        Build the basis for the targets with the specified paths, in that
+        order. Targets are loaded through getTarget(), and are thus shared
+        with the target buffer. The basis copies their data and only keeps
+        weak references to the targets themselves, so that targets removed
+        from the buffer can be freed.
+        The targets are pinned in the target buffer until release() is
+        called, so that loading the last targets of a stack that does not fit
+        in the buffer budget does not evict the first ones (which would make
+        the basis invalid right away).
+        """
+        self.keys = list(targetPaths)
+        self.paths = [canonicalPath(path) for path in self.keys]
+        self._pinned = [path for path in OrderedDict.fromkeys(self.paths) if not _targetBuffer.isPinned(path)]
+        for path in self._pinned:
+            _targetBuffer.pin(path)
+        targets = [getTarget(obj, path) for path in self.paths]
+        self.targets = [weakref.ref(target) for target in targets]
+
+        counts = np.array([len(t.verts) for t in targets], dtype=np.intp)
+        nEntries = int(np.sum(counts))
+        if nEntries:
+            verts = np.concatenate([np.asarray(t.verts, dtype=np.intp) for t in targets if len(t.verts)])
+            data = np.concatenate([np.asarray(t.data, dtype=np.float64) for t in targets if len(t.verts)])
+        else:
+            verts = np.zeros(0, dtype=np.intp)
+            data = np.zeros((0, 3), dtype=np.float64)
+        entryTarget = np.repeat(np.arange(len(targets), dtype=np.intp), counts)
+
+        # Rank of each entry among the entries of the same vertex (a stable
+        # sort keeps stack order within a vertex)
+        byVert = np.argsort(verts, kind='stable')
+        sortedVerts = verts[byVert]
+        groupStart = np.flatnonzero(np.r_[True, sortedVerts[1:] != sortedVerts[:-1]])
+        groupSize = np.diff(np.r_[groupStart, nEntries])
+        rank = np.empty(nEntries, dtype=np.intp)
+        rank[byVert] = np.arange(nEntries, dtype=np.intp) - np.repeat(groupStart, groupSize)
+
+        # Affected vertices, most contributions first, and the position of
+        # each entry's vertex in that order
+        vertOrder = np.argsort(-groupSize, kind='stable')
+        self.verts = sortedVerts[groupStart][vertOrder]
+        position = np.empty(len(groupStart), dtype=np.intp)
+        position[vertOrder] = np.arange(len(groupStart), dtype=np.intp)
+        entryPosition = np.empty(nEntries, dtype=np.intp)
+        entryPosition[byVert] = np.repeat(position, groupSize)
+
+        order = np.lexsort((entryPosition, rank))
+        self.data = data[order]
+        self.entryTarget = entryTarget[order]
+        self.levels = np.r_[0, np.cumsum(np.bincount(rank, minlength=1))]
+
+    def __len__(self):
+        return len(self.paths)
+
+    def release(self):
+        """
+        Unpin the targets that were pinned for this basis, so that they can be
+        evicted from the target buffer again. Targets that were already pinned
+        when the basis was built stay pinned.
+        """
+        for path in self._pinned:
+            _targetBuffer.unpin(path)
+        self._pinned = []
+
+    def isValid(self, targetPaths=None):
+        """
+        Whether this basis still matches the target buffer (no target was
+        reloaded or replaced since it was built), and, if targetPaths is
+        specified, whether it was built for exactly these paths in this order.
+        The paths are compared as they were passed to the constructor, before
+        canonicalization.
+        """
+        if targetPaths is not None and list(targetPaths) != self.keys:
+            return False
+        for path, target in zip(self.paths, self.targets):
+            target = target()
+            if target is None or _targetBuffer.get(path) is not target:
+                return False
+        return True
+
+    def apply(self, obj, weights):
+        """
+        Add the targets of this basis, each multiplied with its corresponding
+        value in weights, to the coordinates of obj. Does not update normals or
+        render buffers.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(weights) != len(self.paths):
+            raise ValueError('Expected %s target weights, got %s' % (len(self.paths), len(weights)))
+
+        contrib = self.data * weights[self.entryTarget][:,None]
+        coord = obj.coord[self.verts]
+        for start, end in zip(self.levels[:-1], self.levels[1:]):
+            coord[:end-start] += contrib[start:end]
+        obj.changeCoords(coord, self.verts)
 
 def saveTranslationTarget(obj, targetPath, groupToSave=None, epsilon=0.001):
     """
@@ -39,6 +39,19 @@ Common base class for all exporters.
 from core import G
 import log
 
+# Number of rows (vertices, faces, ...) formatted at once when writing
+WRITE_CHUNK_SIZE = 10000
+
+def writeRows(fp, fmt, rows, chunkSize=WRITE_CHUNK_SIZE):
+    """
+    Write each row of the 2D array rows formatted with fmt to the stream fp,
+    formatting chunkSize rows at once with a single format operation instead
+    of building the whole string in memory.
+    """
+    for start in range(0, len(rows), chunkSize):
+        chunk = rows[start:start+chunkSize]
+        fp.write((fmt * len(chunk)) % tuple(chunk.reshape(-1).tolist()))
+
 
 class Exporter(object):
     """
@@ -97,6 +97,7 @@ class Object(events3d.EventHandler):
         self.__proxyMesh = None
         self.__subdivisionMesh = None
         self.__proxySubdivisionMesh = None
+        self.__subdivisionLevels = 1
 
         self.setUVMap(mesh.material.uvMap)
 
@@ -421,7 +422,7 @@ class Object(events3d.EventHandler):
 
         if self.isProxied():
             if not self.__proxySubdivisionMesh:
-                self.__proxySubdivisionMesh = cks.createSubdivisionObject(self.__proxyMesh, None)
+                self.__proxySubdivisionMesh = cks.createSubdivisionObject(self.__proxyMesh, None, self.__subdivisionLevels)
                 if self.__seedMesh.object3d:
                     self.attachMesh(self.__proxySubdivisionMesh)
             elif update:
@@ -430,7 +431,7 @@ class Object(events3d.EventHandler):
             return self.__proxySubdivisionMesh
         else:
             if not self.__subdivisionMesh:
-                self.__subdivisionMesh = cks.createSubdivisionObject(self.__seedMesh, self.staticFaceMask)
+                self.__subdivisionMesh = cks.createSubdivisionObject(self.__seedMesh, self.staticFaceMask, self.__subdivisionLevels)
                 if self.__seedMesh.object3d:
                     self.attachMesh(self.__subdivisionMesh)
             elif update:
@@ -473,6 +474,33 @@ class Object(events3d.EventHandler):
 
         return True
 
+    def getSubdivisionLevels(self):
+        """
+        The number of Catmull-Clark subdivision levels of the subdivided 
+        mesh.
+        """
+        return self.__subdivisionLevels
+
+    def setSubdivisionLevels(self, levels):
+        """
+        Set the number of Catmull-Clark subdivision levels of the subdivided
+        mesh. Changing it discards the current subdivision meshes, which are
+        rebuilt when the mesh is subdivided.
+        """
+        levels = max(1, int(levels))
+        if levels == self.__subdivisionLevels:
+            return
+        self.__subdivisionLevels = levels
+        subdivided = self.isSubdivided()
+        if subdivided:
+            self.setSubdivided(False, update=False)
+        for mesh in (self.__subdivisionMesh, self.__proxySubdivisionMesh):
+            if mesh is not None:
+                self.detachMesh(mesh)
+        self.__subdivisionMesh = self.__proxySubdivisionMesh = None
+        if subdivided:
+            self.setSubdivided(True)
+
     def updateSubdivisionMesh(self, rebuildIndexBuffer=False):
         if rebuildIndexBuffer:
             # Purge old subdivision mesh and recalculate entirely
@@ -133,14 +133,14 @@ class SymmetryAction(gui3d.Action):
             self.human.applySymmetryRight()
         else:
             self.human.applySymmetryLeft()
-        self.human.applyAllTargets()
+        self.human.applyAllTargets(incremental=True)
         mh.redraw()
         return True
 
     def undo(self):
         for (modifierName, value) in self.before:
             self.human.getModifier(modifierName).setValue(value)
-        self.human.applyAllTargets()
+        self.human.applyAllTargets(incremental=True)
         mh.redraw()
         return True
 
@@ -206,7 +206,8 @@ class Object3D(object):
         contains a subdivided mesh.
 
         Note that vertex maps only support one subdivision in a chain of mesh
-        to parent meshes.
+        to parent meshes, getVertexWeights() of subdivided meshes supports 
+        multiple subdivision levels.
         """
         if not hasattr(self, 'parent') or not self.parent:
             return None
@@ -242,7 +243,8 @@ class Object3D(object):
         contains a subdivided mesh.
 
         Note that vertex maps only support one subdivision in a chain of mesh
-        to parent meshes.
+        to parent meshes, getVertexWeights() of subdivided meshes supports 
+        multiple subdivision levels.
         """
         # TODO will require nxn matrix if subdivided (catmull-clark module)
 
@@ -352,21 +354,95 @@ class Object3D(object):
         vb = v2 - v3
         self.fnorm[ix] = np.cross(va, vb)
 
+    def _getIncidence(self):
+        """
+        The sparse vertex-face incidence of this mesh, as a tuple (indptr, 
+        verts, faces): entries indptr[v]:indptr[v+1] of the verts and faces 
+        arrays hold the faces connected to vertex v.
+        Built from vface and nfaces once per topology, and rebuilt when these 
+        are replaced.
+        """
+        if self._incidence is None or \
+           self._incidence[0] is not self.vface or \
+           self._incidence[1] is not self.nfaces:
+            nfaces = np.asarray(self.nfaces, dtype=np.intp)
+            valid = np.arange(self.vface.shape[1])[None,:] < nfaces[:,None]
+            verts = np.nonzero(valid)[0]
+            faces = self.vface[valid].astype(np.intp)
+            indptr = np.zeros(len(nfaces)+1, dtype=np.intp)
+            np.cumsum(nfaces, out=indptr[1:])
+            self._incidence = (self.vface, self.nfaces, indptr, verts, faces)
+        return self._incidence[2:]
+
+    def _gatherIncidence(self, ix = None):
+        """
+        Select the entries of the vertex-face incidence for the vertices ix 
+        (all vertices if None). Returns (rows, faces, nrows) where rows index 
+        into ix.
+        """
+        indptr, verts, faces = self._getIncidence()
+        if ix is None:
+            return verts, faces, len(indptr)-1
+        counts = indptr[ix+1] - indptr[ix]
+        offsets = np.cumsum(counts) - counts
+        rows = np.repeat(np.arange(len(ix)), counts)
+        pos = np.arange(len(rows)) - offsets[rows] + indptr[ix][rows]
+        return rows, faces[pos], len(ix)
+
+    def _sumIncidence(self, rows, faces, nrows, values):
+        """
+        Sum the per face vectors values of the incidence entries into their 
+        rows (the product of the sparse incidence matrix with the per face 
+        values).
+        The faces of a row are added one by one, in incidence (vface) order 
+        and in the precision of values, which rounds the same as summing the 
+        rows of vface.
+        """
+        # Entries of a row are consecutive (rows are sorted). Order the rows
+        # on their number of entries, so that the rows that have a k-th entry
+        # are a prefix
+        counts = np.bincount(rows, minlength=nrows)
+        offsets = np.cumsum(counts) - counts
+        byCount = np.argsort(-counts, kind='stable')
+        # Number of rows with at least k entries
+        nRows = np.cumsum(np.bincount(counts, minlength=1)[::-1])[::-1]
+        offsets = offsets[byCount]
+        values = np.asarray(values)
+
+        accum = np.zeros((nrows, values.shape[1]), dtype=values.dtype)
+        for k in range(1, len(nRows)):
+            n = nRows[k]
+            accum[:n] += values[faces[offsets[:n] + (k-1)]]
+        result = np.empty_like(accum)
+        result[byCount] = accum
+        return result
+
+    @staticmethod
+    def _vertexIndices(ix):
+        if ix is None:
+            return None
+        if isinstance(ix, tuple):
+            ix = ix[0]
+        ix = np.asarray(ix)
+        if ix.dtype == bool:
+            return np.nonzero(ix)[0]
+        return ix.reshape(-1).astype(np.intp)
+
     def calcVertexNormals(self, ix = None):
         """
         Calculate per-vertex normals from the face normals for smooth shading
         the model. Requires face normals to be calculated first.
         """
         self.markCoords(ix, norm=True)
-        if ix is None:
-            ix = np.s_[:]
+        ix = self._vertexIndices(ix)
 
-        vface = self.vface[ix]
-        norms = self.fnorm[vface]
-        norms *= np.arange(self.MAX_FACES)[None,:,None] < self.nfaces[ix][:,None,None]
-        norms = np.sum(norms, axis=1)
+        rows, faces, nrows = self._gatherIncidence(ix)
+        norms = self._sumIncidence(rows, faces, nrows, self.fnorm)
         norms /= np.sqrt(np.sum(norms ** 2, axis=-1))[:,None]
-        self.vnorm[ix] = norms
+        if ix is None:
+            self.vnorm[...] = norms
+        else:
+            self.vnorm[ix] = norms
 
     def calcVertexTangents(self, ix = None):
         """
@@ -375,19 +451,19 @@ class Object3D(object):
         if not self.has_uv:
             return
         self.markCoords(ix, norm=True)
+        ix = self._vertexIndices(ix)
+
+        rows, faces, nrows = self._gatherIncidence(ix)
         if ix is None:
             ix = np.s_[:]
-            xLen = self.getVertexCount()
             f_ix = np.s_[:]
         else:
-            xLen = len(ix)
-            f_ix = np.unique(self.vface[ix])
+            # Only calculate the directions of the faces connected to ix
+            f_ix, faces = np.unique(faces, return_inverse=True)
 
         # This implementation is based on
         # http://www.terathon.com/code/tangent.html
 
-        tan = np.zeros((xLen, 2, 3), dtype=np.float32)
-
         fvert = self.coord[self.fvert[f_ix]]
         v1 = fvert[:,0,:]
         v2 = fvert[:,1,:]
@@ -408,7 +484,7 @@ class Object3D(object):
         s1 = w2[:,0] - w1[:,0]
         s2 = w3[:,0] - w1[:,0]
         t1 = w2[:,1] - w1[:,1]
-        t2 = w3[:,1] = w1[:,1]
+        t2 = w3[:,1] - w1[:,1]
 
         # Prevent NANs because of borked up UV coordinates  # TODO perhaps remove this
         s1[np.argwhere(np.equal(s1, 0.0))] = 0.0000001
@@ -417,36 +493,30 @@ class Object3D(object):
         t2[np.argwhere(np.equal(t2, 0.0))] = 0.0000001
 
         r = np.repeat(1.0, len(s1)) / ( (s1 * t2) - (s2 * t1) )
-        sdir = np.zeros((self.getFaceCount(),3), dtype=np.float32)
-        tdir = np.zeros((self.getFaceCount(),3), dtype=np.float32)
-        sdir[f_ix] = np.column_stack( [ ( (t2 * x1) - (t1 * x2) ) * r,
-                                        ( (t2 * y1) - (t1 * y2) ) * r,
-                                        ( (t2 * z1) - (t1 * z2) ) * r  ] )
-        tdir[f_ix] = np.column_stack( [ ( (s1 * x2) - (s2 * x1) ) * r,
-                                        ( (s1 * y2) - (s2 * y1) ) * r,
-                                        ( (s1 * z2) - (s2 * z1) ) * r  ] )
-
-        tan[:,0] = np.sum(sdir[self.vface[ix]])
-        tan[:,1] = np.sum(tdir[self.vface[ix]])
+        sdir = np.column_stack( [ ( (t2 * x1) - (t1 * x2) ) * r,
+                                  ( (t2 * y1) - (t1 * y2) ) * r,
+                                  ( (t2 * z1) - (t1 * z2) ) * r  ] )
+        tdir = np.column_stack( [ ( (s1 * x2) - (s2 * x1) ) * r,
+                                  ( (s1 * y2) - (s2 * y1) ) * r,
+                                  ( (s1 * z2) - (s2 * z1) ) * r  ] )
+
+        # Sum the face directions per vertex (in double precision, as they can
+        # largely cancel out)
+        tan = self._sumIncidence(rows, faces, nrows, np.hstack([sdir, tdir]).astype(np.float64))
+        tan = tan.astype(np.float32).reshape(nrows, 2, 3)
+
+        vnorm = self.vnorm[ix]
 
         # Gramm-Schmidt orthogonalize
-        dotP = dot_v3(self.vnorm[ix], tan[:,0] )
-        # Duplicate dot product value in 3 columns because scalar * (n x 3)
-        # does not work
-        dotP = np.tile(dotP, (3,1)).transpose().reshape(len(tan),3)
-        self.vtang[ix,:3] = tan[:,0] - dotP * self.vnorm[ix]
+        dotP = dot_v3(vnorm, tan[:,0])
+        vtang = np.empty((nrows, 4), dtype=np.float32)
+        vtang[:,:3] = tan[:,0] - dotP[:,None] * vnorm
         # Normalize
-        self.vtang[ix,:3] /= np.sqrt(np.sum(self.vtang[ix,:3] ** 2, axis=-1))[:,None]
+        vtang[:,:3] /= np.sqrt(np.sum(vtang[:,:3] ** 2, axis=-1))[:,None]
 
         # Determine Handedness as w parameter
-        self.vtang[ix, 3] = 1.0
-        indx = np.argwhere(np.less(dot_v3( \
-                                     np.cross( \
-                                           self.vnorm[ix], \
-                                           tan[:,0]), \
-                                     tan[:,1]), \
-                                   0.0))
-        self.vtang[ix,3][indx] = -1.0
+        vtang[:,3] = np.where(dot_v3(np.cross(vnorm, tan[:,0]), tan[:,1]) < 0.0, -1.0, 1.0)
+        self.vtang[ix] = vtang
 
     def getObject(self):
         if self.__object:
@@ -512,6 +582,8 @@ class Object3D(object):
 
         self._inverse_vmap = None   # Cached inverse of vmap: maps original welded vert idx (coord) to one or multiple unwelded vert idxs (r_coord)
 
+        self._incidence = None      # Cached sparse vertex-face incidence, built from vface and nfaces (see _getIncidence())
+
         # Unwelded vertex buffers used by OpenGL
         if hasattr(self, 'r_coord'): del self.r_coord
         if hasattr(self, 'r_texco'): del self.r_texco
@@ -704,19 +776,27 @@ class Object3D(object):
         # use self.nfaces as counter for the inner array, it is needed afterwards
 
         nverts = len(self.coord)
-        self.nfaces = np.zeros(nverts, dtype=np.uint8) # reset the counters to zero
+        nvpf = min(self.fvert.shape[1], self.vertsPerFaceForExport)  # use minimum of attached vertices, works for less than 3 also
+
+        # flatten the (used) face vertices, and sort them by vertex number with a stable sort, so that the
+        # faces of each vertex keep the order in which they occur in self.fvert
+        fverts = self.fvert[:,:nvpf].reshape(-1)
+        order = np.argsort(fverts, kind='stable')
+        sverts = fverts[order]
+        sfaces = order // nvpf
 
-        for idx, vert in enumerate(self.fvert):                             # contains faces with vertex number
-            for i in range (0, min(len(vert), self.vertsPerFaceForExport)): # use minimum of attached vertices, works for less than 3 also
-                vn = vert[i]                                                 # vertex.number
-                if self.nfaces[vn] >= self.MAX_FACES:
-                    log.error("Failed to index faces of mesh %s, you are probably loading a mesh with mixed nb of verts per face (do not mix tris and quads). Or your mesh has too many faces attached to one vertex (the maximum is %s-poles). In the second case, either increase MAX_FACES for this mesh, or improve the mesh topology.", self.name, self.MAX_FACES)
-                    raise RuntimeError('Incompatible mesh topology.')
-                    return
-                self.vface[vn,self.nfaces[vn]] = idx        # add the index of the face to the array, row given by vn, column by counter nfaces[vn]
-                self.nfaces[vn] +=1                         # now increment the counter
+        counts = np.bincount(fverts, minlength=nverts)
+        if len(counts) and counts.max() > self.MAX_FACES:
+            log.error("Failed to index faces of mesh %s, you are probably loading a mesh with mixed nb of verts per face (do not mix tris and quads). Or your mesh has too many faces attached to one vertex (the maximum is %s-poles). In the second case, either increase MAX_FACES for this mesh, or improve the mesh topology.", self.name, self.MAX_FACES)
+            raise RuntimeError('Incompatible mesh topology.')
+        self.nfaces = counts.astype(np.uint8)
 
-        imax = i+1    # just needed later not to be recalculated.
+        # column of each face in the row of its vertex: its position within the group of that vertex
+        starts = np.cumsum(counts) - counts
+        slots = np.arange(len(sverts)) - starts[sverts]
+        self.vface[sverts, slots] = sfaces
+
+        imax = nvpf    # just needed later not to be recalculated.
 
         # in case this function is not called from catmull-clark function resize the self.vface to a minimum
         if resize is True:
@@ -728,31 +808,25 @@ class Object3D(object):
             # unfortunately catmull-clark expects maxpoles and not maxfaces, so we need 
             # also to calculate max-poles
             # 
-            # for each vertex we have to check all attached faces, these faces are already collected in self.vface
-            #       when we check all the faces we will collect the neighbors using a modulo function, the vertices are
-            #       entered clockwise ... modulo allows us to use neighbor of 1 and 3 when index is 0
-            #       if not already existent, the neighbors are added to an array and the maximum size of this array will be maxpole
+            # for each vertex we check all attached faces: the neighbors of the vertex are the vertices before
+            #       and after its first occurrence in the face (the vertices are entered clockwise, a modulo 
+            #       allows us to use neighbor of 1 and 3 when index is 0). The number of distinct neighbors of 
+            #       a vertex is its pole count, maxpole is the maximum of these.
+            #       Note that vertex 0 has never been counted as a neighbor, which is kept to not change maxpole.
             #
             maxpole = 0
-            for vn, row in enumerate(self.vface):
-                noticed = np.zeros(self.MAX_FACES * 4, dtype = int)
-                m = 0
-                for j in range (0, self.nfaces[vn]):
-                    # collect neighbors
-                    face = row[j]
-                    for ix,v2 in enumerate(self.fvert[face]):
-                        if (v2 == vn):
-                            ln = self.fvert[face][(ix-1) %imax]
-                            rn = self.fvert[face][(ix+1) %imax]
-                            if ln not in noticed:
-                                noticed[m] = ln
-                                m += 1
-                            if rn not in noticed:
-                                noticed[m] = rn
-                                m += 1
-                            break
-                if m > maxpole:
-                    maxpole = m
+            if len(sverts):
+                frows = self.fvert[sfaces]
+                ix = np.argmax(frows == sverts[:,None], axis=1)    # first occurrence of the vertex in the face
+                rowidx = np.arange(len(frows))
+                ln = frows[rowidx, (ix-1) % imax]
+                rn = frows[rowidx, (ix+1) % imax]
+
+                pairs = np.concatenate([ sverts.astype(np.int64) * nverts + ln,
+                                         sverts.astype(np.int64) * nverts + rn ])
+                pairs = np.unique(pairs[pairs % nverts != 0])
+                if len(pairs):
+                    maxpole = int(np.bincount(pairs // nverts).max())
 
             if maxpole > 2:                  # Avoid the information when function calculates internal objects not to confuse users
                 log.debug ("Calculated maximum number of poles for one vertex: %d", maxpole)
@@ -1152,9 +1226,7 @@ class Object3D(object):
         vertices.
         """
         mask = np.zeros(len(self.fvert), dtype = bool)
-        valid = np.arange(self.MAX_FACES)[None,:] < self.nfaces[verts][:,None]  # Mask that filters out unused slots for faces connected to a vert
-        vface = self.vface[verts]
-        faces = vface[valid]
+        faces = self._gatherIncidence(self._vertexIndices(verts))[1]
         mask[faces] = True
         return mask
 
@@ -1236,6 +1308,251 @@ class Object3D(object):
     def __str__(self):
         return 'object3D Mesh named: %s, nverts: %s, nfaces: %s' % (self.name, self.getVertexCount(), self.getFaceCount())
 
+class MeshView(object):
+    """
+    Lightweight read-only view on an Object3D, for exporters.
+
+    Provides the vertex, UV and face arrays of a mesh with scale and offset
+    applied, and optionally with the hidden faces and the vertices not used by
+    the remaining faces filtered out, like Object3D.clone() does. The arrays
+    are computed when first accessed, and no face groups, render buffers or
+    index buffers are created.
+
+    Read-only attributes of the mesh that do not depend on its geometry
+    (eg. material) are taken from the mesh, while attributes set on the view 
+    (eg. name) only affect the view.
+    """
+
+    # Attributes taken from the mesh
+    _meshAttributes = ('material', 'has_uv', 'hasUVs', 'vertsPerPrimitive', 
+                       'vertsPerFaceForExport', 'MAX_FACES', 'cameraMode', 
+                       'priority', 'faceGroups', 'faceGroupCount', 'getFaceGroup', 
+                       'calculateTangents')
+
+    def __init__(self, mesh, scale=1.0, filterMaskedVerts=False, offset=None, useFaceMask=True):
+        """
+        If filterMaskedVerts is True, faces hidden by the face mask of mesh
+        and the vertices no longer used are removed. If useFaceMask is False,
+        the face mask of mesh is ignored and all faces are visible in the
+        view.
+        """
+        if filterMaskedVerts and useFaceMask and \
+           getattr(mesh, 'seed', None) is not None and not np.all(mesh.face_mask):
+            # Faces hidden after subdivision still smooth the visible faces
+            # next to them, subdivide the visible part of the seed mesh instead,
+            # like clone() does
+            mesh = mesh.clone(filterMaskedVerts=True)
+        self.mesh = mesh
+        self.name = mesh.name
+        self.scale = scale
+        self.offset = offset
+        self.filterMaskedVerts = filterMaskedVerts and useFaceMask
+        self.useFaceMask = useFaceMask
+
+        self._faces = None
+        self._parent_map = None
+        self._inverse_parent_map = None
+        self._uv_map = None
+        self._coord = None
+        self._vnorm = None
+        self._fnorm = None
+        self._texco = None
+        self._fvert = None
+        self._fuvs = None
+
+    def __getattr__(self, attr):
+        # Only called for attributes not defined on the view
+        if attr in MeshView._meshAttributes:
+            return getattr(self.mesh, attr)
+        raise AttributeError("'MeshView' object has no attribute '%s'" % attr)
+
+    @property
+    def object(self):
+        return self.mesh.object
+
+    @property
+    def parent(self):
+        if self.filterMaskedVerts:
+            return self.mesh
+        return None
+
+    @property
+    def faces(self):
+        """
+        The indices of the faces of mesh contained in this view, or a slice 
+        if the view contains all faces.
+        """
+        if self._faces is None:
+            if self.filterMaskedVerts:
+                self._faces = np.nonzero(self.mesh.face_mask)[0]
+            else:
+                self._faces = np.s_[:]
+        return self._faces
+
+    @property
+    def parent_map(self):
+        """
+        Maps vertex indices of this view to the vertices of mesh.
+        """
+        if self._parent_map is None:
+            if self.filterMaskedVerts:
+                self._parent_map = np.unique(self.mesh.fvert[self.faces].reshape(-1))
+            else:
+                self._parent_map = np.arange(self.mesh.getVertexCount(), dtype=np.uint32)
+        return self._parent_map
+
+    @property
+    def inverse_parent_map(self):
+        """
+        Maps vertex indices of mesh to the vertices of this view (-1 if the
+        vertex is removed in this view).
+        """
+        if self._inverse_parent_map is None:
+            self._inverse_parent_map = - np.ones(self.mesh.getVertexCount(), dtype=np.int32)
+            self._inverse_parent_map[self.parent_map] = np.arange(len(self.parent_map), dtype=np.int32)
+        return self._inverse_parent_map
+
+    @property
+    def coord(self):
+        if self._coord is None:
+            if self.filterMaskedVerts:
+                coord = self.mesh.coord[self.parent_map]
+            else:
+                coord = self.mesh.coord
+            if self.scale != 1:
+                coord = self.scale * coord
+            if self.offset is not None:
+                coord = coord + self.offset
+            self._coord = np.asarray(coord, dtype=np.float32)
+        return self._coord
+
+    @property
+    def vnorm(self):
+        if self._vnorm is None:
+            if self.filterMaskedVerts:
+                # Normals from the faces that remain in the view only
+                rows, faces, nrows = self.mesh._gatherIncidence(self.parent_map.astype(np.intp))
+                visible = self.mesh.face_mask[faces]
+                norms = self.mesh._sumIncidence(rows[visible], faces[visible], nrows, self.mesh.fnorm)
+                norms /= np.sqrt(np.sum(norms ** 2, axis=-1))[:,None]
+                self._vnorm = norms.astype(np.float32)
+            else:
+                self._vnorm = self.mesh.vnorm
+        return self._vnorm
+
+    @property
+    def fnorm(self):
+        if self._fnorm is None:
+            self._fnorm = self.mesh.fnorm[self.faces] * (self.scale ** 2)
+        return self._fnorm
+
+    @property
+    def fvert(self):
+        if self._fvert is None:
+            if self.filterMaskedVerts:
+                self._fvert = self.inverse_parent_map[self.mesh.fvert[self.faces]].astype(np.uint32)
+            else:
+                self._fvert = self.mesh.fvert
+        return self._fvert
+
+    @property
+    def uv_map(self):
+        """
+        Maps UV indices of this view to the UVs of mesh.
+        """
+        if self._uv_map is None:
+            if self.filterMaskedVerts:
+                self._uv_map = np.unique(self.mesh.fuvs[self.faces].reshape(-1))
+            else:
+                self._uv_map = np.arange(len(self.mesh.texco), dtype=np.uint32)
+        return self._uv_map
+
+    @property
+    def texco(self):
+        if self._texco is None:
+            if self.filterMaskedVerts:
+                self._texco = self.mesh.texco[self.uv_map]
+            else:
+                self._texco = self.mesh.texco
+        return self._texco
+
+    @property
+    def fuvs(self):
+        if self._fuvs is None:
+            if self.filterMaskedVerts:
+                inverse_uv_map = - np.ones(len(self.mesh.texco), dtype=np.int32)
+                inverse_uv_map[self.uv_map] = np.arange(len(self.uv_map), dtype=np.int32)
+                self._fuvs = inverse_uv_map[self.mesh.fuvs[self.faces]].astype(np.uint32)
+            else:
+                self._fuvs = self.mesh.fuvs
+        return self._fuvs
+
+    @property
+    def group(self):
+        return self.mesh.group[self.faces]
+
+    @property
+    def face_mask(self):
+        if self.useFaceMask and not self.filterMaskedVerts:
+            return self.mesh.face_mask
+        return np.ones(len(self.fvert), dtype=bool)
+
+    def getFaceMask(self, indices = None):
+        if indices is None:
+            indices = np.s_[...]
+        return self.face_mask[indices]
+
+    def getVertexCount(self, excludeMaskedVerts=False):
+        if excludeMaskedVerts and not self.filterMaskedVerts and self.useFaceMask:
+            return self.mesh.getVertexCount(excludeMaskedVerts)
+        return len(self.parent_map)
+
+    def getFaceCount(self, excludeMaskedFaces=False):
+        if excludeMaskedFaces:
+            return np.count_nonzero(self.face_mask)
+        return len(self.fvert)
+
+    def getCoords(self, indices = None):
+        if indices is None:
+            indices = np.s_[...]
+        return self.coord[indices]
+
+    def getNormals(self, indices = None):
+        if indices is None:
+            indices = np.s_[...]
+        return self.vnorm[indices]
+
+    def calcNormals(self, *args, **kwargs):
+        """
+        Normals of a view are calculated from the normals of mesh when they 
+        are first accessed, this only discards the calculated normals.
+        """
+        self._vnorm = None
+        self._fnorm = None
+
+    def getVertexWeights(self, parentWeights):
+        """
+        Map armature weights mapped to the root parent (original mesh) to the
+        vertices of this view.
+        """
+        weights = self.mesh.getVertexWeights(parentWeights)
+        if not self.filterMaskedVerts:
+            return weights
+
+        vmap = self.inverse_parent_map
+        from collections import OrderedDict
+        vgroups = OrderedDict()
+        for bname, (verts,wghts) in list(weights.data.items()):
+            mvs = vmap[verts]
+            valid = mvs > -1
+            if np.any(valid):
+                vgroups[bname] = (mvs[valid], wghts[valid])
+
+        return weights.create(vgroups, self.getVertexCount())
+
+    def __str__(self):
+        return 'MeshView of %s, nverts: %s, nfaces: %s' % (self.mesh.name, self.getVertexCount(), self.getFaceCount())
+
 def dot_v3(v3_arr1, v3_arr2):
     """
     Numpy Ufunc'ed implementation of a series of dot products of two vector3 
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehumancommunity.org/
+
+**Github Code Home Page:**    https://github.com/makehumancommunity/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2020
+
+**Licensing:**         AGPL3
+
+    This file is part of MakeHuman Community (www.makehumancommunity.org).
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Abstract
+--------
+
+Standalone script to generate and export series of random characters (as the
+mass produce plugin does) without starting the GUI. Run from the makehuman
+directory, for example:
+
+    python mass_produce.py -n 100 -f OBJ -o exports/mass --settings massproduce.json -j 8
+
+The randomization settings can be saved from the mass produce tab in the GUI.
+Every character is randomized with its own seed derived from --seed, so a run
+with the same seed produces the same characters with any number of jobs.
+"""
+
+import sys
+sys.path = [".", "./core", "./lib", "./shared", "./apps", "./plugins"] + sys.path
+import os
+import json
+import random
+import importlib
+
+def getArgs(formats):
+    import argparse
+    parser = argparse.ArgumentParser(description="Generate and export random characters without the GUI.")
+    parser.add_argument("-n", "--number", type=int, default=5, help="Number of characters to produce (default: 5)")
+    parser.add_argument("-o", "--output", default="massproduce", help="Output directory (default: massproduce)")
+    parser.add_argument("-f", "--format", default="MHM", choices=formats, help="File format (default: MHM)")
+    parser.add_argument("-b", "--basename", default="mass", help="File name base, followed by four digits (default: mass)")
+    parser.add_argument("-s", "--settings", default=None, help="JSON file with randomization settings, as saved from the mass produce tab")
+    parser.add_argument("-m", "--model", default=None, help="MHM file to start from (default: the default human)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the random generators (default: random, printed when done)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes, 0 for the number of CPUs (default: 1)")
+    parser.add_argument("--start", type=int, default=1, help="Number of the first character (default: 1)")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    headless = importlib.import_module('9_massproduce.headless')
+    args = getArgs(sorted(headless.EXPORTERS.keys()))
+
+    seed = args.seed
+    if seed is None:
+        seed = random.SystemRandom().randrange(2**32)
+
+    if args.jobs == 1:
+        human = headless.createHuman(args.model)
+        if args.settings:
+            settings = headless.HeadlessSettings.fromFile(args.settings, human)
+        else:
+            settings = headless.HeadlessSettings(human=human)
+
+        producer = headless.MassProducer(human, settings, args.output, args.format, args.basename)
+        if not os.path.isdir(args.output):
+            os.makedirs(args.output)
+        with open(headless.getManifestPath(args.output, args.basename), 'a', encoding='utf-8') as manifest:
+            producer.produce(range(args.start, args.start + args.number), seed, manifest)
+    else:
+        settingsValues = None
+        if args.settings:
+            with open(args.settings, 'r', encoding='utf-8') as f:
+                settingsValues = json.load(f)
+        headless.produceParallel(args.number, args.output, settingsValues, args.format, args.basename,
+                                 args.model, seed, args.start, args.jobs or None)
+
+    print("All done (seed %d)." % seed)
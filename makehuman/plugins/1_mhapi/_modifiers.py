@@ -24,9 +24,7 @@ class Modifiers(NameSpace):
         self.trace()
 
     def _threadSafeApplyAllTargets(self):
-        algos3d.resetObj(self.human.meshData)
-        for (targetPath, morphFactor) in self.human.targetsDetailStack.items():
-            algos3d.loadTranslationTarget(self.human.meshData, targetPath, morphFactor, None, 0, 0)
+        self.human.applyTargetsToMesh(incremental=True, progress=False)
         self.human._updateOriginalMeshCoords(self.human.meshData.name, self.human.meshData.coord)
         self.human.updateProxyMesh()
         self.human.callEvent('onChanged', events3d.HumanEvent(self.human, 'targets'))
@@ -46,7 +44,7 @@ class Modifiers(NameSpace):
         if assumeThreading:
             self._threadSafeApplyAllTargets()
         else:
-            self.human.applyAllTargets()
+            self.human.applyAllTargets(incremental=True)
         mh.redraw()
 
     def applyTarget(self,targetName,power, assumeThreading = False):
@@ -54,7 +52,7 @@ class Modifiers(NameSpace):
         if assumeThreading:
             self._threadSafeApplyAllTargets()
         else:
-            self.human.applyAllTargets()
+            self.human.applyAllTargets(incremental=True)
         mh.redraw()
 
     def getAppliedTargets(self):
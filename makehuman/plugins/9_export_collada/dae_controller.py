@@ -38,6 +38,7 @@ Controller export
 """
 
 from .dae_node import goodBoneName
+from export import writeRows, WRITE_CHUNK_SIZE
 from progress import Progress
 
 import math
@@ -86,22 +87,31 @@ def writeSkinController(fp, human, mesh, skel, config):
         parentWeights = rawWeights
     weights = mesh.getVertexWeights(parentWeights)
 
-    vertexWeights = [list() for _ in range(nVerts)]
-    skinWeights = []
-    wn = 0
+    # Skin weights in bone order, with the vertex and bone of each weight
     boneNames = [ bone.name for bone in skel.getBones() ]
+    weightVerts = []
+    weightBones = []
+    skinWeights = []
     for bIdx, boneName in enumerate(boneNames):
-        try:
+        if boneName in weights.data:
             (verts,ws) = weights.data[boneName]
-        except:
-            (verts,ws) = ([], [])
-        wts = list(zip(verts, ws))
-        skinWeights += wts
-        for (vn,_w) in wts:
-            vertexWeights[int(vn)].append((bIdx,wn))
-            wn += 1
+            weightVerts.append(np.asarray(verts, dtype=np.int64))
+            weightBones.append(np.full(len(verts), bIdx, dtype=np.int64))
+            skinWeights.append(np.asarray(ws))
+    if skinWeights:
+        weightVerts = np.concatenate(weightVerts)
+        weightBones = np.concatenate(weightBones)
+        skinWeights = np.concatenate(skinWeights)
+    else:
+        weightVerts = weightBones = np.zeros(0, dtype=np.int64)
+        skinWeights = np.zeros(0, dtype=np.float32)
     nSkinWeights = len(skinWeights)
 
+    # (bone, weight index) pairs per vertex, in bone order
+    order = np.argsort(weightVerts, kind='stable')
+    vertexWeights = np.column_stack([weightBones[order], order])
+    vertexWeightCounts = np.bincount(weightVerts, minlength=nVerts)
+
 
     # Write rig transform matrix
     progress(0.1, 0.2)
@@ -136,7 +146,10 @@ def writeSkinController(fp, human, mesh, skel, config):
         '          <float_array count="%d" id="%s-skin-weights-array">\n' % (nSkinWeights,mesh.name) +
         '           ')
 
-    fp.write(' '.join('%s' % w[1] for w in skinWeights))
+    for start in range(0, nSkinWeights, WRITE_CHUNK_SIZE):
+        if start:
+            fp.write(' ')
+        fp.write(' '.join(map(str, skinWeights[start:start+WRITE_CHUNK_SIZE])))
 
     fp.write('\n' +
         '          </float_array>\n' +
@@ -178,7 +191,9 @@ def writeSkinController(fp, human, mesh, skel, config):
         '            ')
 
     # Write number of bones weighted per vertex
-    fp.write(' '.join(['%d' % len(wts) for wts in vertexWeights]))
+    writeRows(fp, '%d ', vertexWeightCounts[:-1,None])
+    if nVerts:
+        fp.write('%d' % vertexWeightCounts[-1])
 
     progress(0.8, 0.99)
     fp.write('\n' +
@@ -186,8 +201,7 @@ def writeSkinController(fp, human, mesh, skel, config):
         '          <v>\n' +
         '           ')
 
-    for wts in vertexWeights:
-        fp.write(''.join([' %d %d' % pair for pair in wts]))
+    writeRows(fp, ' %d %d', vertexWeights)
 
     fp.write('\n' +
         '          </v>\n' +
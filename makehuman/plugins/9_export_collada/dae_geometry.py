@@ -41,6 +41,7 @@ import math
 import numpy as np
 import log
 from progress import Progress
+from export import writeRows
 
 #----------------------------------------------------------------------
 #   library_geometry
@@ -90,7 +91,7 @@ def writeGeometry(fp, mesh, config, shapes=None):
         '          <float_array count="%d" id="%s-Position-array">\n' % (3*nVerts,mesh.name) +
         '          ')
 
-    fp.write( ''.join([("%.4f %.4f %.4f " % tuple(co)) for co in coord]) )
+    writeRows(fp, "%.4f %.4f %.4f ", coord)
 
     fp.write('\n' +
         '          </float_array>\n' +
@@ -115,7 +116,7 @@ def writeGeometry(fp, mesh, config, shapes=None):
             '          <float_array count="%d" id="%s-Normals-array">\n' % (3*nNormals,mesh.name) +
             '          ')
 
-        fp.write( ''.join([("%.4f %.4f %.4f " % tuple(no)) for no in vnorm]) )
+        writeRows(fp, "%.4f %.4f %.4f ", vnorm)
 
         fp.write('\n' +
             '          </float_array>\n' +
@@ -138,7 +139,7 @@ def writeGeometry(fp, mesh, config, shapes=None):
         '          <float_array count="%d" id="%s-UV-array">\n' % (2*nUvVerts,mesh.name) +
         '           ')
 
-    fp.write( ''.join([("%.4f %.4f " % tuple(uv)) for uv in mesh.texco]) )
+    writeRows(fp, "%.4f %.4f ", mesh.texco)
 
     fp.write('\n' +
         '          </float_array>\n' +
@@ -199,7 +200,7 @@ def writeShapeKey(fp, name, shape, mesh, config):
         '          <float_array id="%sMeshMorph_%s-positions-array" count="%d">\n' % (mesh.name, name, 3*nVerts) +
         '           ')
 
-    fp.write( ''.join([("%.4f %.4f %.4f " % tuple(co)) for co in target]) )
+    writeRows(fp, "%.4f %.4f %.4f ", target)
 
     fp.write('\n' +
         '          </float_array>\n' +
@@ -226,13 +227,13 @@ def writeShapeKey(fp, name, shape, mesh, config):
         #'          <input semantic="NORMAL" source="#%sMeshMorph_%s-normals" offset="1"/>\n' % (mesh.name, name) +
         '          <vcount>')
 
-    fp.write( ''.join(["4 " for fv in mesh.fvert]) )
+    fp.write( "4 " * nFaces )
 
     fp.write('\n' +
         '          </vcount>\n' +
         '          <p>')
 
-    fp.write( ''.join([("%d %d %d %d " % tuple(fv)) for fv in mesh.fvert]) )
+    writeRows(fp, "%d %d %d %d ", mesh.fvert)
 
     fp.write('\n' +
         '          </p>\n' +
@@ -263,24 +264,21 @@ def writePolylist(fp, mesh, config):
         fp.write(
         '          <input offset="1" semantic="TEXCOORD" source="#%s-UV"/>\n' % mesh.name)
 
-    vc = ''
-    p = ''
-
     # get number of vertices per face
     r = mesh.vertsPerFaceForExport
-    for fn,fv in enumerate(mesh.fvert):
-        fuv = mesh.fuvs[fn]
-        vc += str(r) + ' '
-        if config.useNormals:
-            p += ''.join([("%d %d %d " % (fv[n], fv[n], fuv[n])) for n in range(r)])
-        else:
-            p += ''.join([("%d %d " % (fv[n], fuv[n])) for n in range(r)])
-
+    fverts = mesh.fvert[:,:r]
+    fuvs = mesh.fuvs[:,:r]
+    if config.useNormals:
+        indices = np.dstack([fverts, fverts, fuvs])
+    else:
+        indices = np.dstack([fverts, fuvs])
 
     fp.write(
-    '          <vcount>' + vc +  '\n' +
+    '          <vcount>' + (str(r) + ' ') * nFaces + '\n' +
     '          </vcount>\n' +
-    '          <p>' + p + '\n' +
+    '          <p>')
+    writeRows(fp, ("%d " * indices.shape[2]) * r, indices)
+    fp.write('\n' +
     '          </p>\n' +
     '        </polylist>\n')
     progress.step()
@@ -290,13 +288,18 @@ def writePolylist(fp, mesh, config):
 #
 
 def checkFaces(mesh, nVerts, nUvVerts):
-    # TODO document: what does this do (apart from slowing down export)?
-    for fn,fvs in enumerate(mesh.fvert):
-        for n,vn in enumerate(fvs):
-            uv = mesh.fuvs[fn][n]
-            if vn > nVerts:
-                raise NameError("v %d > %d" % (vn, nVerts))
-            if uv > nUvVerts:
-                raise NameError("uv %d > %d" % (uv, nUvVerts))
+    """
+    Sanity check that the faces do not reference vertices or UVs beyond the
+    written arrays. Raises a NameError for the first offending reference.
+    """
+    invalid = (mesh.fvert > nVerts) | (mesh.fuvs > nUvVerts)
+    if not np.any(invalid):
+        return
+    fn, n = np.unravel_index(np.argmax(invalid), invalid.shape)
+    vn = mesh.fvert[fn, n]
+    uv = mesh.fuvs[fn, n]
+    if vn > nVerts:
+        raise NameError("v %d > %d" % (vn, nVerts))
+    raise NameError("uv %d > %d" % (uv, nUvVerts))
 
 
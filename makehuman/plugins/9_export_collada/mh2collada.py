@@ -44,6 +44,7 @@ import time
 import log
 import getpath
 import bvh
+import module3d
 
 from progress import Progress
 
@@ -74,18 +75,11 @@ def exportCollada(filepath, config):
     progress(0, 0.5, "Preparing")
 
     objects = human.getObjects(excludeZeroFaceObjs=not config.hiddenGeom)
-    # Clone meshes with desired scale and hidden faces/vertices filtered out
-    meshes = [obj.mesh.clone(config.scale, filterMaskedVerts=not config.hiddenGeom) for obj in objects]
-
-    if config.hiddenGeom:
-        import numpy as np
-        # Disable the face masking on copies of the input meshes
-        for m in meshes:
-            # Disable the face masking on the mesh
-            face_mask = np.ones(m.face_mask.shape, dtype=bool)
-            m.changeFaceMask(face_mask)
-            m.calcNormals()
-            m.updateIndexBuffer()
+    # Views on the meshes with desired scale and hidden faces/vertices filtered
+    # out, or the face masking disabled when exporting hidden geometry
+    meshes = [module3d.MeshView(obj.mesh, config.scale,
+                                filterMaskedVerts=not config.hiddenGeom,
+                                useFaceMask=not config.hiddenGeom) for obj in objects]
 
     # Scale skeleton
     skel = human.getSkeleton()
@@ -28,8 +28,11 @@ except:
     import data_types
 
 from struct import pack
+from concurrent.futures import ThreadPoolExecutor
 import array
+import os
 import zlib
+import numpy as np
 # import log
 from core import G
 
@@ -48,6 +51,38 @@ _TIME_ID = b'1970-01-01 10:00:00:000'
 _FILE_ID = b'\x28\xb3\x2a\xeb\xb6\x24\xcc\xc2\xbf\xc8\xb0\x2a\xa9\x2b\xfc\xf1'
 _FOOT_ID = b'\xfa\xbc\xab\x09\xd0\xc8\xd4\x66\xb1\x76\xfb\x83\x1c\xf7\x26\x7e'
 
+# Arrays of at least this many bytes are compressed in parallel by a thread
+# pool when the file is written (zlib releases the GIL), smaller arrays are
+# compressed inline.
+_ARRAY_POOL_MIN_SIZE = 1 << 16
+
+# Little endian numpy types of the array property types
+_ARRAY_DTYPES = {
+    data_types.ARRAY_BOOL: np.dtype('i1'),
+    data_types.ARRAY_BYTE: np.dtype('u1'),
+    data_types.ARRAY_INT32: np.dtype('<i4'),
+    data_types.ARRAY_INT64: np.dtype('<i8'),
+    data_types.ARRAY_FLOAT32: np.dtype('<f4'),
+    data_types.ARRAY_FLOAT64: np.dtype('<f8'),
+}
+
+def _encode_array(length, data):
+    """
+    Array property data: header and zlib compressed contents of the buffer.
+    """
+    data = zlib.compress(data, 1)
+    return pack('<3I', length, 1, len(data)) + data
+
+class _DeferredArray(object):
+    """
+    Array property data that is compressed when the file is written.
+    """
+    __slots__ = ("length", "data")
+
+    def __init__(self, length, data):
+        self.length = length
+        self.data = data
+
 # Awful exceptions: those "classes" of elements seem to need block sentinel even when having no children and some props.
 _ELEMS_ID_ALWAYS_BLOCK_SENTINEL = {b"AnimationStack", b"AnimationLayer"}
 
@@ -141,64 +176,101 @@ class FBXElem:
         self.props.append(data)
 
     def _add_array_helper(self, data, array_type, prop_type):
-        assert(isinstance(data, array.array))
-        assert(data.typecode == array_type)
-
-        length = len(data)
-
-        if _IS_BIG_ENDIAN:
-            data = data[:]
-            data.byteswap()
-        data = data.tobytes()
+        """
+        Add an array property from an array.array or numpy array. Large
+        arrays are compressed when the file is written, from a private copy
+        if they share memory with the data passed in.
+        """
+        if isinstance(data, np.ndarray):
+            source = data
+            data = np.ascontiguousarray(data, dtype=_ARRAY_DTYPES[array_type]).reshape(-1)
+            length = data.size
+            if data.nbytes >= _ARRAY_POOL_MIN_SIZE and np.may_share_memory(data, source):
+                data = data.copy()
+        else:
+            assert(isinstance(data, array.array))
+            assert(data.typecode == array_type)
+
+            length = len(data)
+
+            if _IS_BIG_ENDIAN:
+                data = data[:]
+                data.byteswap()
+            elif len(data) * data.itemsize >= _ARRAY_POOL_MIN_SIZE:
+                data = data[:]
+        data = memoryview(data).cast('B')
 
         # mimic behavior of fbxconverter (also common sense)
         # we could make this configurable.
         encoding = 0 if len(data) <= 128 else 1
         if encoding == 0:
-            pass
-        elif encoding == 1:
-            data = zlib.compress(data, 1)
-
-        comp_len = len(data)
-
-        data = pack('<3I', length, encoding, comp_len) + data
+            data = pack('<3I', length, encoding, len(data)) + data.tobytes()
+        elif len(data) < _ARRAY_POOL_MIN_SIZE:
+            data = _encode_array(length, data)
+        else:
+            data = _DeferredArray(length, data)
 
         self.props_type.append(prop_type)
         self.props.append(data)
 
     def add_int32_array(self, data):
-        if not isinstance(data, array.array):
+        if not isinstance(data, (array.array, np.ndarray)):
             data = array.array(data_types.ARRAY_INT32, data)
         self._add_array_helper(data, data_types.ARRAY_INT32, data_types.INT32_ARRAY)
 
     def add_int64_array(self, data):
-        if not isinstance(data, array.array):
+        if not isinstance(data, (array.array, np.ndarray)):
             data = array.array(data_types.ARRAY_INT64, data)
         self._add_array_helper(data, data_types.ARRAY_INT64, data_types.INT64_ARRAY)
 
     def add_float32_array(self, data):
-        if not isinstance(data, array.array):
+        if not isinstance(data, (array.array, np.ndarray)):
             data = array.array(data_types.ARRAY_FLOAT32, data)
         self._add_array_helper(data, data_types.ARRAY_FLOAT32, data_types.FLOAT32_ARRAY)
 
     def add_float64_array(self, data):
-        if not isinstance(data, array.array):
+        if not isinstance(data, (array.array, np.ndarray)):
             data = array.array(data_types.ARRAY_FLOAT64, data)
         self._add_array_helper(data, data_types.ARRAY_FLOAT64, data_types.FLOAT64_ARRAY)
 
     def add_bool_array(self, data):
-        if not isinstance(data, array.array):
+        if not isinstance(data, (array.array, np.ndarray)):
             data = array.array(data_types.ARRAY_BOOL, data)
         self._add_array_helper(data, data_types.ARRAY_BOOL, data_types.BOOL_ARRAY)
 
     def add_byte_array(self, data):
-        if not isinstance(data, array.array):
+        if not isinstance(data, (array.array, np.ndarray)):
             data = array.array(data_types.ARRAY_BYTE, data)
         self._add_array_helper(data, data_types.ARRAY_BYTE, data_types.BYTE_ARRAY)
 
     # -------------------------
     # internal helper functions
 
+    def _deferred_arrays(self):
+        """
+        The (element, property index) of the array properties of this element
+        and its children that still have to be compressed.
+        """
+        for i, data in enumerate(self.props):
+            if isinstance(data, _DeferredArray):
+                yield self, i
+        for elem in self.elems:
+            yield from elem._deferred_arrays()
+
+    def _resolve_arrays(self):
+        """
+        Compress the large array properties of this element and its children
+        in parallel, with a thread pool that only lives during this call.
+        Call before calculating offsets.
+        """
+        deferred = list(self._deferred_arrays())
+        if not deferred:
+            return
+        with ThreadPoolExecutor(max_workers=min(len(deferred), os.cpu_count() or 1)) as pool:
+            futures = [pool.submit(_encode_array, elem.props[i].length, elem.props[i].data) for elem, i in deferred]
+            for (elem, i), future in zip(deferred, futures):
+                elem.props[i] = future.result()
+
     def _calc_offsets(self, offset, is_last):
         """
         Call before writing, calculates fixed offsets.
@@ -364,6 +436,7 @@ def write(fn, elem_root, version=None):
         # ideally we would _not_ modify this data.
         _write_timedate_hack(elem_root)
 
+        elem_root._resolve_arrays()
         elem_root._calc_offsets_children(tell(), False)
         elem_root._write_children(write, tell, False)
 
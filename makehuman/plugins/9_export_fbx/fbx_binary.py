@@ -278,7 +278,7 @@ def fbx_data_mesh_element(objectsParent, key, id, properties, coord, fvert, vnor
 
 
     # Vertex cos.
-    t_co = array.array(data_types.ARRAY_FLOAT64, coord.reshape(-1))
+    t_co = coord.reshape(-1)
     elem_data_single_float64_array(geom, b"Vertices", t_co)
     del t_co
 
@@ -295,7 +295,7 @@ def fbx_data_mesh_element(objectsParent, key, id, properties, coord, fvert, vnor
         fvert_ = fvert.copy()
         fvert_[:,3] = ~fvert_[:,3]
 
-    t_pvi = array.array(data_types.ARRAY_INT32, fvert_.astype(np.int32).reshape(-1))
+    t_pvi = fvert_.astype(np.int32).reshape(-1)
     elem_data_single_int32_array(geom, b"PolygonVertexIndex", t_pvi)
 
 
@@ -307,7 +307,7 @@ def fbx_data_mesh_element(objectsParent, key, id, properties, coord, fvert, vnor
     # Layers
 
     # Normals
-    t_ln = array.array(data_types.ARRAY_FLOAT64, vnorm.reshape(-1))
+    t_ln = vnorm.reshape(-1)
 
     lay_nor = elem_data_single_int32(geom, b"LayerElementNormal", 0)
     elem_data_single_int32(lay_nor, b"Version", FBX_GEOMETRY_NORMAL_VERSION)
@@ -396,8 +396,8 @@ def fbx_data_mesh_element(objectsParent, key, id, properties, coord, fvert, vnor
     else:
         fuv_ = fuv
 
-    t_uv = array.array(data_types.ARRAY_FLOAT64, texco.reshape(-1))
-    t_fuv = array.array(data_types.ARRAY_INT32, fuv_.astype(np.int32).reshape(-1))
+    t_uv = texco.reshape(-1)
+    t_fuv = fuv_.astype(np.int32).reshape(-1)
     uvindex = 0
     lay_uv = elem_data_single_int32(geom, b"LayerElementUV", uvindex)
     elem_data_single_int32(lay_uv, b"Version", FBX_GEOMETRY_UV_VERSION)
@@ -41,6 +41,7 @@ import codecs
 
 from core import G
 import log
+import module3d
 
 from . import fbx_utils
 from . import fbx_header
@@ -70,17 +71,10 @@ def exportFbx(filepath, config):
 
     # Collect objects, scale meshes and filter out hidden faces/verts, scale rig
     objects = human.getObjects(excludeZeroFaceObjs=not config.hiddenGeom)
-    meshes = [obj.mesh.clone(config.scale, filterMaskedVerts=not config.hiddenGeom) for obj in objects]
-
-    if config.hiddenGeom:
-        import numpy as np
-        # Disable the face masking on copies of the input meshes
-        for m in meshes:
-            # Disable the face masking on the mesh
-            face_mask = np.ones(m.face_mask.shape, dtype=bool)
-            m.changeFaceMask(face_mask)
-            m.calcNormals()
-            m.updateIndexBuffer()
+    # Disable the face masking when exporting hidden geometry
+    meshes = [module3d.MeshView(obj.mesh, config.scale,
+                                filterMaskedVerts=not config.hiddenGeom,
+                                useFaceMask=not config.hiddenGeom) for obj in objects]
 
     skel = human.getSkeleton()
     if skel:
@@ -45,6 +45,7 @@ class ObjConfig(ExportConfig):
         self.useRelPaths = True
         self.useNormals = False
         self.hiddenGeom = False
+        self.compress = False
 
 
 class ExporterOBJ(Exporter):
@@ -60,6 +61,7 @@ class ExporterOBJ(Exporter):
         Exporter.build(self, options, taskview)
         self.useNormals = options.addWidget(gui.CheckBox("Normals", False))
         self.hiddenGeom = options.addWidget(gui.CheckBox("Helper geometry", False))
+        self.compress = options.addWidget(gui.CheckBox("Compress (gzip)", False))
 
     def export(self, human, filename):
         from progress import Progress
@@ -77,6 +79,7 @@ class ExporterOBJ(Exporter):
         cfg.feetOnGround      = self.feetOnGround.selected
         cfg.scale,cfg.unit    = self.taskview.getScale()
         cfg.hiddenGeom        = self.hiddenGeom.selected
+        cfg.compress          = self.compress.selected
 
         return cfg
 
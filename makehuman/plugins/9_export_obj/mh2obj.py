@@ -37,9 +37,9 @@ Exports proxy mesh to obj
 """
 
 import wavefront
+import module3d
 import os
 from progress import Progress
-import numpy as np
 
 #
 #    exportObj(human, filepath, config):
@@ -48,8 +48,12 @@ import numpy as np
 def exportObj(filepath, config=None):
     progress = Progress(0, None)
     human = config.human
+    if config.compress and not filepath.endswith('.gz'):
+        filepath += '.gz'
     config.setupTexFolder(filepath)
     filename = os.path.basename(filepath)
+    if filename.endswith('.gz'):
+        filename = filename[:-len('.gz')]
     name = config.goodName(os.path.splitext(filename)[0])
 
     progress(0, 0.3, "Collecting Objects")
@@ -57,17 +61,8 @@ def exportObj(filepath, config=None):
     meshes = [o.mesh for o in objects]
 
     if config.hiddenGeom:
-        # Disable the face masking on copies of the input meshes
-        meshes = [m.clone(filterMaskedVerts=False) for m in meshes]
-        for m in meshes:
-            # Would be faster if we could tell clone() to do this, but it would 
-            # make the interface more complex.
-            # We could also let the wavefront module do this, but this would 
-            # introduce unwanted "magic" behaviour into the export function.
-            face_mask = np.ones(m.face_mask.shape, dtype=bool)
-            m.changeFaceMask(face_mask)
-            m.calcNormals()
-            m.updateIndexBuffer()
+        # Disable the face masking on views of the input meshes
+        meshes = [module3d.MeshView(m, config.scale, useFaceMask=False) for m in meshes]
 
     progress(0.3, 0.99, "Writing Objects")
     wavefront.writeObjFile(filepath, meshes, True, config, filterMaskedFaces=not config.hiddenGeom)
@@ -51,9 +51,45 @@ import struct
 import numpy as np
 import math
 from progress import Progress
+import module3d
 
 # TODO perhaps add scale option
 
+# Number of triangles formatted at once when writing ASCII STL. The higher the
+# chunk size, the faster, but setting this too high can run into memory errors
+# on some machines.
+ASCII_CHUNK_SIZE = 20000
+
+# Layout of the 50 byte triangle records of binary STL files
+STL_RECORD = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attribute', '<u2')])
+
+ASCII_FACET = (
+    'facet normal %f %f %f\n' +
+    '\touter loop\n' +
+    '\t\tvertex %f %f %f\n' +
+    '\t\tvertex %f %f %f\n' +
+    '\t\tvertex %f %f %f\n' +
+    '\tendloop\n' +
+    '\tendfacet\n')
+
+def _getTriangles(mesh, config):
+    """
+    The triangles of the mesh, with quads split in the triangles (0, 1, 2) and
+    (2, 3, 0). Returns the (ntris, 3) normals and (ntris, 3, 3) vertex
+    coordinates of the triangles.
+    """
+    coord = config.scale * mesh.coord + config.offset
+    if mesh.vertsPerFaceForExport == 3:
+        tris = mesh.fvert[:,:3]
+        normals = mesh.fnorm
+    else:
+        tris = mesh.fvert[:,[0,1,2, 2,3,0]].reshape(-1, 3)
+        normals = np.repeat(mesh.fnorm, 2, axis=0)
+    return normals, coord[tris]
+
 def exportStlAscii(filepath, config, exportJoints = False):
     """
     This function exports MakeHuman mesh to stereolithography ascii format.
@@ -77,7 +113,7 @@ def exportStlAscii(filepath, config, exportJoints = False):
     name = config.goodName(os.path.splitext(filename)[0])
 
     objects = human.getObjects(True)
-    meshes = [o.mesh.clone(1,True) for o in objects]
+    meshes = [module3d.MeshView(o.mesh, 1, True) for o in objects]
 
     with open(filepath, 'w', encoding="utf-8") as fp:
         solid = name.replace(' ','_')
@@ -86,52 +122,15 @@ def exportStlAscii(filepath, config, exportJoints = False):
         progress(0.3, 0.99, "Writing Objects")
         objprog = Progress(len(meshes))
 
-        def chunked_enumerate(offs, chunk_size, list_):
-            return zip(range(offs, offs + chunk_size), list_[offs:offs + chunk_size])
-
         for mesh in meshes:
-            coord = config.scale*mesh.coord + config.offset
-            offs = 0
-            chunk_size = 2000   # The higher the chunk size, the faster, but setting this too high can run into memory errors on some machines
-            meshprog = Progress(math.ceil( float(len(mesh.fvert)) / chunk_size ))
-
-            if mesh.vertsPerFaceForExport == 3:
-                while(offs < len(mesh.fvert)):
-                    fp.write("".join( [(
-                        'facet normal %f %f %f\n' % tuple(mesh.fnorm[fn]) +
-                        '\touter loop\n' +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[0]]) +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[1]]) +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[2]]) +
-                        '\tendloop\n' +
-                        '\tendfacet\n'
-                        ) for fn,fv in chunked_enumerate(offs, chunk_size, mesh.fvert)] ))
-                    fp.flush()
-                    os.fsync(fp.fileno())
-                    offs += chunk_size
-                    meshprog.step()
-            else:
-                while(offs < len(mesh.fvert)):
-                    fp.write("".join( [(
-                        'facet normal %f %f %f\n' % tuple(mesh.fnorm[fn]) +
-                        '\touter loop\n' +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[0]]) +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[1]]) +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[2]]) +
-                        '\tendloop\n' +
-                        '\tendfacet\n' +
-                        'facet normal %f %f %f\n' % tuple(mesh.fnorm[fn]) +
-                        '\touter loop\n' +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[2]]) +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[3]]) +
-                        '\t\tvertex %f %f %f\n' % tuple(coord[fv[0]]) +
-                        '\tendloop\n' +
-                        '\tendfacet\n'
-                        ) for fn,fv in chunked_enumerate(offs, chunk_size, mesh.fvert)] ))
-                    fp.flush()
-                    os.fsync(fp.fileno())
-                    offs += chunk_size
-                    meshprog.step()
+            normals, verts = _getTriangles(mesh, config)
+            rows = np.hstack([normals, verts.reshape(-1, 9)])
+            meshprog = Progress(math.ceil( float(len(rows)) / ASCII_CHUNK_SIZE ))
+
+            for offs in range(0, len(rows), ASCII_CHUNK_SIZE):
+                chunk = rows[offs:offs + ASCII_CHUNK_SIZE]
+                fp.write((ASCII_FACET * len(chunk)) % tuple(chunk.reshape(-1).tolist()))
+                meshprog.step()
 
             meshprog.finish()
             objprog.step()
@@ -142,6 +141,10 @@ def exportStlAscii(filepath, config, exportJoints = False):
 
 def exportStlBinary(filepath, config, exportJoints = False):
     """
+    This function exports MakeHuman mesh to stereolithography binary format.
+    The triangle records of all meshes are built in one structured array and
+    written at once.
+
     filepath:
       *string*.  The filepath of the file to export the object to.
     config:
@@ -156,40 +159,20 @@ def exportStlBinary(filepath, config, exportJoints = False):
     name = config.goodName(os.path.splitext(filename)[0])
 
     objects = human.getObjects(True)
-    meshes = [o.mesh.clone(1,True) for o in objects]
+    meshes = [module3d.MeshView(o.mesh, 1, True) for o in objects]
+
+    progress(0.3, 0.99, "Writing Objects")
+    triangles = [_getTriangles(mesh, config) for mesh in meshes]
+    count = sum(len(normals) for normals, verts in triangles)
+    records = np.zeros(count, dtype=STL_RECORD)
+    offs = 0
+    for normals, verts in triangles:
+        records['normal'][offs:offs + len(normals)] = normals
+        records['vertices'][offs:offs + len(normals)] = verts
+        offs += len(normals)
 
     with open(filepath, 'wb') as fp:
         fp.write(b'\x00' * 80)
-        fp.write(struct.pack(b'<I', 0))
-        count = 0
-
-        progress(0.3, 0.99, "Writing Objects")
-        objprog = Progress(len(meshes))
-        for mesh in meshes:
-            coord = config.scale * mesh.coord + config.offset
-
-            for fn,fv in enumerate(mesh.fvert):
-                fno = mesh.fnorm[fn]
-                co = coord[fv]
-
-                fp.write(struct.pack(b'<fff', fno[0], fno[1], fno[2]))
-                fp.write(struct.pack(b'<fff', co[0][0], co[0][1], co[0][2]))
-                fp.write(struct.pack(b'<fff', co[1][0], co[1][1], co[1][2]))
-                fp.write(struct.pack(b'<fff', co[2][0], co[2][1], co[2][2]))
-                fp.write(struct.pack(b'<H', 0))
-                count += 1
-
-                if mesh.vertsPerFaceForExport != 3:
-                    fp.write(struct.pack(b'<fff', fno[0], fno[1], fno[2]))
-                    fp.write(struct.pack(b'<fff', co[2][0], co[2][1], co[2][2]))
-                    fp.write(struct.pack(b'<fff', co[3][0], co[3][1], co[3][2]))
-                    fp.write(struct.pack(b'<fff', co[0][0], co[0][1], co[0][2]))
-                    fp.write(struct.pack(b'<H', 0))
-                    count += 1
-
-            objprog.step()
-
-        fp.seek(80)
-        fp.write(struct.pack('<I', count))
+        fp.write(struct.pack(b'<I', count))
+        fp.write(records.tobytes())
     progress(1, None, "STL export finished. Exported file: %s", filepath)
-
@@ -17,16 +17,17 @@
 Abstract
 --------
 
-This plugin generates and exports series of characters
+This plugin generates and exports series of characters. The same can be done
+without the GUI using the headless module (see mass_produce.py).
 
 """
 
-from .massproduce import MassProduceTaskView
-
 category = None
 mpView = None
 
 def load(app):
+    # Imported here so that the headless module can be used without the GUI
+    from .massproduce import MassProduceTaskView
     category = app.getCategory('Community')
     downloadView = category.addTask(MassProduceTaskView(category))
 
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Headless mass production: generates and exports series of random characters
+without the GUI and the Qt event loop, using the same randomization as the
+mass produce task view (HumanState).
+
+Instead of resetting the human and re-applying all targets between every
+character, only the modifier values of the initial state are restored, after
+which the targets of the new character are applied once (incrementally where
+possible). Proxies are loaded once and reused. Every character is exported as
+soon as it is produced, and described by a line in a JSON manifest.
+
+This module is used by mass_produce.py in the makehuman directory.
+"""
+
+import os
+import glob
+import json
+import random
+import hashlib
+import multiprocessing
+
+from core import G
+import getpath
+import log
+
+from .humanstate import HumanState
+from .modifiergroups import ModifierInfo
+
+DEFAULT_SETTINGS = {
+    "macro": {
+        "randomizeAge": True, "ageMinimum": 0.45, "ageMaximum": 0.95,
+        "randomizeWeight": True, "weightMinimum": 0.1, "weightMaximum": 0.9,
+        "randomizeHeight": True, "heightMinimum": 0.2, "heightMaximum": 0.9,
+        "randomizeMuscle": True, "muscleMinimum": 0.3, "muscleMaximum": 0.8,
+        "gender": True, "genderabsolute": True,
+        "ethnicity": True, "ethnicityabsolute": True,
+        },
+    "modeling": {
+        "maxdev": 0.3,
+        },
+    # Randomizing proxies and skins requires lists of allowed assets, which
+    # are only known from a settings file saved from the GUI
+    "proxies": {
+        "hair": False, "eyelashes": False, "eyebrows": False,
+        "fullClothes": False, "upperClothes": False, "lowerClothes": False, "shoes": False,
+        },
+    "materials": {
+        "randomizeSkinMaterials": False,
+        },
+    }
+
+DEFAULT_UNCHECKED_GROUPS = ["arms", "hands", "legs", "feet"]
+
+
+class HeadlessSettings(object):
+    """
+    Randomization settings with the same interface as RandomizationSettings,
+    backed by nested dicts as returned by RandomizationSettings.getValues()
+    (and saved from the mass produce task view), instead of GUI widgets.
+    Settings that are not specified get the default values of the GUI.
+    """
+
+    def __init__(self, values=None, human=None):
+        self._values = dict()
+        for category, defaults in DEFAULT_SETTINGS.items():
+            self._values[category] = dict(defaults)
+        if human is not None:
+            for groupName in ModifierInfo(human).getModifierGroupNames():
+                self._values["modeling"][groupName] = groupName not in DEFAULT_UNCHECKED_GROUPS
+        for category, categoryValues in (values or {}).items():
+            self._values.setdefault(category, dict()).update(categoryValues)
+
+    @classmethod
+    def fromFile(cls, filename, human=None):
+        with open(filename, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), human)
+
+    def getValue(self, category, name, subName=None):
+        value = self._values[category][name]
+        if subName is not None:
+            value = value[subName]
+        return value
+
+    def getValueHash(self, category, name):
+        return dict(self._values[category][name])
+
+    def getNames(self, category):
+        return self._values.get(category, {}).keys()
+
+    def getValues(self):
+        return self._values
+
+
+class HeadlessAssets(object):
+    """
+    Implements the calls of mhapi.assets used by HumanState directly on a
+    human. Loaded proxies are kept, so that switching back to a proxy that was
+    used before does not load it again.
+    """
+
+    def __init__(self, human):
+        self.human = human
+        self._proxies = dict()
+
+    def loadProxy(self, mhclofile, proxyType):
+        import proxy
+
+        key = (getpath.canonicalPath(mhclofile), proxyType)
+        if key not in self._proxies:
+            pxy = proxy.loadProxy(self.human, mhclofile, type=proxyType)
+            mesh, obj = pxy.loadMeshAndObject(self.human)
+            if not mesh:
+                raise RuntimeError("Could not load mesh of proxy %s" % mhclofile)
+            self._proxies[key] = pxy
+        return self._proxies[key]
+
+    def _equip(self, mhclofile, proxyType, getter, setter):
+        current = getter()
+        if not mhclofile:
+            if current:
+                setter(None)
+            return
+        pxy = self.loadProxy(mhclofile, proxyType)
+        if pxy is not current:
+            setter(pxy)
+
+    @staticmethod
+    def _file(pxy):
+        return pxy.file if pxy else None
+
+    def fitProxies(self):
+        """
+        Fit all proxies to the current (rest pose) mesh of the human.
+        """
+        for pxy in self.human.getProxies(includeHumanProxy=False):
+            if pxy.object:
+                pxy.update(pxy.object.getSeedMesh(), False)
+
+    def equipEyes(self, mhclofile):
+        self._equip(mhclofile, 'Eyes', self.human.getEyesProxy, self.human.setEyesProxy)
+
+    def equipHair(self, mhclofile):
+        self._equip(mhclofile, 'Hair', self.human.getHairProxy, self.human.setHairProxy)
+
+    def getEquippedHair(self):
+        return self._file(self.human.getHairProxy())
+
+    def equipEyebrows(self, mhclofile):
+        self._equip(mhclofile, 'Eyebrows', self.human.getEyebrowsProxy, self.human.setEyebrowsProxy)
+
+    def getEquippedEyebrows(self):
+        return self._file(self.human.getEyebrowsProxy())
+
+    def equipEyelashes(self, mhclofile):
+        self._equip(mhclofile, 'Eyelashes', self.human.getEyelashesProxy, self.human.setEyelashesProxy)
+
+    def getEquippedEyelashes(self):
+        return self._file(self.human.getEyelashesProxy())
+
+    def equipClothes(self, mhclofile):
+        pxy = self.loadProxy(mhclofile, 'Clothes')
+        if pxy.getUuid() not in self.human.clothesProxies:
+            self.human.addClothesProxy(pxy)
+            pxy.update(pxy.object.getSeedMesh(), False)
+
+    def getEquippedClothes(self):
+        return [pxy.file for pxy in self.human.clothesProxies.values()]
+
+    def unequipAllClothes(self):
+        for uuid in list(self.human.clothesProxies.keys()):
+            self.human.removeClothesProxy(uuid)
+
+
+class HeadlessModifiers(object):
+    """
+    Implements the calls of mhapi.modifiers used by HumanState.
+    """
+
+    def __init__(self, human, assets):
+        self.human = human
+        self.assets = assets
+
+    def _threadSafeApplyAllTargets(self):
+        # Only the targets that changed since the previous character are
+        # applied, and no GL buffers are updated
+        self.human.applyAllTargets(update=False, incremental=True)
+        self.assets.fitProxies()
+
+
+class HeadlessAPI(object):
+    """
+    Stands in for mhapi in HumanState.
+    """
+
+    def __init__(self, human):
+        self.assets = HeadlessAssets(human)
+        self.modifiers = HeadlessModifiers(human, self.assets)
+
+
+class HeadlessApplication(object):
+    """
+    Minimal replacement for the application object (G.app), providing what
+    the human, its modifiers, proxies and the exporters use.
+    """
+
+    def __init__(self):
+        import camera
+
+        self.selectedHuman = None
+        self.loadHandlers = dict()
+        self.saveHandlers = [saveProxies]
+        self.modelCamera = camera.OrbitalCamera()
+        self.settings = dict()
+
+    def getSetting(self, name):
+        return self.settings.get(name)
+
+    def progress(self, *args, **kwargs):
+        # No progress bar, and no processing of events
+        pass
+
+    def redraw(self):
+        pass
+
+    def processEvents(self):
+        pass
+
+    def callAsync(self, func, *args, **kwargs):
+        func(*args, **kwargs)
+
+    def addObject(self, obj):
+        return obj
+
+    def removeObject(self, obj):
+        pass
+
+
+def saveProxies(human, file):
+    """
+    MHM save handler for the proxies and skin of a headless human, writing
+    the same properties as the proxy and material library plugins.
+    """
+    for name, pxy in [('eyes', human.eyesProxy), ('hair', human.hairProxy),
+                      ('eyebrows', human.eyebrowsProxy), ('eyelashes', human.eyelashesProxy)]:
+        if pxy:
+            file.write('%s %s %s\n' % (name, pxy.name, pxy.getUuid()))
+    for pxy in human.clothesProxies.values():
+        file.write('clothes %s %s\n' % (pxy.name, pxy.getUuid()))
+    if human.material.filename:
+        file.write('skinMaterial %s\n' % getpath.getJailedPath(human.material.filename, []))
+
+
+def createHuman(modelFile=None):
+    """
+    Create a human as the GUI does on startup, with the modeling modifiers,
+    base skeleton and default eyes. Sets up a HeadlessApplication as G.app
+    when there is no application yet.
+    """
+    import files3d
+    import human
+    import humanmodifier
+    import skeleton
+
+    if G.app is None:
+        G.app = HeadlessApplication()
+
+    h = human.Human(files3d.loadMesh(getpath.getSysDataPath("3dobjs/base.obj"), maxFaces = 5))
+    G.app.selectedHuman = h
+
+    h.setBaseSkeleton(skeleton.load(getpath.getSysDataPath('rigs/default.mhskel'), h.meshData))
+    for modifiersFile in ['modifiers/modeling_modifiers.json', 'modifiers/measurement_modifiers.json']:
+        path = getpath.getSysDataPath(modifiersFile)
+        if os.path.isfile(path):
+            humanmodifier.loadModifiers(path, h)
+
+    if modelFile:
+        # Only modifier and generic properties can be loaded without the GUI
+        h.load(modelFile, True, strict=False)
+    else:
+        h.applyAllTargets(update=False)
+    return h
+
+
+def _exportMHM(human, path):
+    human.save(path)
+
+def _exportOBJ(human, path):
+    import importlib
+    plugin = importlib.import_module('9_export_obj')
+    mh2obj = importlib.import_module('9_export_obj.mh2obj')
+    cfg = plugin.ObjConfig()
+    cfg.feetOnGround = True
+    cfg.setHuman(human)
+    mh2obj.exportObj(path, cfg)
+
+def _exportDAE(human, path):
+    import importlib
+    plugin = importlib.import_module('9_export_collada')
+    mh2collada = importlib.import_module('9_export_collada.mh2collada')
+    cfg = plugin.DaeConfig()
+    cfg.feetOnGround = True
+    cfg.setHuman(human)
+    mh2collada.exportCollada(path, cfg)
+
+def _exportFBX(human, path):
+    import importlib
+    plugin = importlib.import_module('9_export_fbx')
+    mh2fbx = importlib.import_module('9_export_fbx.mh2fbx')
+    cfg = plugin.FbxConfig()
+    cfg.feetOnGround = True
+    cfg.scale *= 10
+    cfg.setHuman(human)
+    mh2fbx.exportFbx(path, cfg)
+
+# File format: (file extension, export function)
+EXPORTERS = {
+    "MHM": ("mhm", _exportMHM),
+    "OBJ": ("obj", _exportOBJ),
+    "DAE": ("dae", _exportDAE),
+    "FBX": ("fbx", _exportFBX),
+    }
+
+
+def getItemSeed(seed, index):
+    """
+    Seed for the random generator of the character with the specified index,
+    derived from the seed of the whole production. It only depends on seed and
+    index, so a character can be reproduced regardless of the order in which
+    (and the process by which) characters are produced.
+    """
+    digest = hashlib.sha256(("%d:%d" % (seed, index)).encode('ascii')).digest()
+    return int.from_bytes(digest[:8], 'little')
+
+
+class MassProducer(object):
+    """
+    Produces random characters from a human and randomization settings, and
+    exports them to outputPath.
+    """
+
+    def __init__(self, human, settings, outputPath, fileFormat="MHM", nameBase="mass"):
+        if fileFormat not in EXPORTERS:
+            raise ValueError("Unsupported file format %s (supported: %s)" % (fileFormat, ", ".join(sorted(EXPORTERS.keys()))))
+        self.human = human
+        self.settings = settings
+        self.outputPath = outputPath
+        self.fileFormat = fileFormat
+        self.nameBase = nameBase
+
+        self.api = HeadlessAPI(human)
+        eyes = getpath.getSysDataPath("eyes/high-poly/high-poly.mhclo")
+        if human.getEyesProxy() is None and os.path.isfile(eyes):
+            self.api.assets.equipEyes(eyes)
+            self.api.assets.fitProxies()
+
+        self.initialState = HumanState(human=human, api=self.api)
+
+    def getFilename(self, index):
+        extension, _ = EXPORTERS[self.fileFormat]
+        return "%s%s.%s" % (self.nameBase, str(index).rjust(4, "0"), extension)
+
+    def produceOne(self, index, seed=None):
+        """
+        Produce and export one character, randomized with a generator seeded
+        with seed (if given). Returns its manifest entry.
+        """
+        # Only restore the initial modifier values, the mesh is updated once
+        # when the new state is applied
+        self.initialState.restoreModifiers()
+
+        rng = random.Random(seed) if seed is not None else None
+        state = HumanState(self.settings, self.human, self.api, rng)
+        state.applyState(False)
+
+        filename = self.getFilename(index)
+        _, exportFunc = EXPORTERS[self.fileFormat]
+        exportFunc(self.human, os.path.join(self.outputPath, filename))
+
+        return {
+            "index": index,
+            "seed": seed,
+            "file": filename,
+            "modifiers": dict((m.fullName, m.getValue()) for m in self.human.modifiers if m.getValue() or m.isMacro()),
+            "skin": state.skin.filename,
+            "hair": state.hair,
+            "eyebrows": state.eyebrows,
+            "eyelashes": state.eyelashes,
+            "clothes": list(state.clothes),
+            }
+
+    def produce(self, indices, seed=None, manifest=None):
+        """
+        Produce the characters with the specified indices. With a seed, every
+        character gets its own generator (see getItemSeed). Every manifest
+        entry is written as a JSON line to the manifest file object (if given)
+        as soon as the character is exported.
+        Returns the number of characters produced.
+        """
+        if not os.path.isdir(self.outputPath):
+            os.makedirs(self.outputPath)
+
+        count = 0
+        for index in indices:
+            itemSeed = getItemSeed(seed, index) if seed is not None else None
+            entry = self.produceOne(index, itemSeed)
+            log.message("Produced %s", entry["file"])
+            if manifest is not None:
+                manifest.write(json.dumps(entry, sort_keys=True) + "\n")
+                manifest.flush()
+            count += 1
+        return count
+
+
+# Producer of a worker process of produceParallel
+_workerProducer = None
+_workerManifest = None
+
+def _initWorker(modelFile, settingsValues, outputPath, fileFormat, nameBase):
+    global _workerProducer, _workerManifest
+    human = createHuman(modelFile)
+    settings = HeadlessSettings(settingsValues, human)
+    _workerProducer = MassProducer(human, settings, outputPath, fileFormat, nameBase)
+    _workerManifest = open(getShardManifestPath(outputPath, nameBase, os.getpid()), 'a', encoding='utf-8')
+
+def _produceShard(args):
+    indices, seed = args
+    return _workerProducer.produce(indices, seed, _workerManifest)
+
+def getManifestPath(outputPath, nameBase):
+    return os.path.join(outputPath, nameBase + ".manifest.json")
+
+def getShardManifestPath(outputPath, nameBase, pid):
+    return os.path.join(outputPath, "%s.manifest.%d.json" % (nameBase, pid))
+
+def mergeManifests(outputPath, nameBase):
+    """
+    Merge the manifests written by the worker processes (and an existing
+    manifest) into one manifest, ordered by character index. Later entries for
+    the same index replace earlier ones.
+    """
+    manifestPath = getManifestPath(outputPath, nameBase)
+    shardPaths = glob.glob(glob.escape(os.path.join(outputPath, nameBase)) + ".manifest.*.json")
+    entries = dict()
+    for path in [manifestPath] + sorted(shardPaths):
+        if not os.path.isfile(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    entries[entry["index"]] = line.rstrip("\n")
+
+    tmpPath = manifestPath + ".tmp"
+    with open(tmpPath, 'w', encoding='utf-8') as f:
+        for index in sorted(entries.keys()):
+            f.write(entries[index] + "\n")
+    os.replace(tmpPath, manifestPath)
+    for path in shardPaths:
+        os.remove(path)
+    return len(entries)
+
+def produceParallel(count, outputPath, settingsValues=None, fileFormat="MHM", nameBase="mass",
+                    modelFile=None, seed=None, start=1, jobs=None, chunkSize=None):
+    """
+    Produce count characters, sharded over a pool of jobs worker processes
+    (default: number of CPUs) that each set up their own human. Target data is
+    shared between the processes when data/targets.mmap is available (see
+    compile_targets.py --mmap), as it is memory-mapped read-only.
+    Characters are randomized with per character seeds (see getItemSeed), so
+    the result does not depend on the number of workers. Every worker streams
+    its own manifest, which are merged into one manifest when done.
+    Returns the seed used.
+    """
+    if seed is None:
+        seed = random.SystemRandom().randrange(2**32)
+    if not os.path.isdir(outputPath):
+        os.makedirs(outputPath)
+
+    jobs = jobs or multiprocessing.cpu_count()
+    indices = list(range(start, start + count))
+    if chunkSize is None:
+        chunkSize = max(1, min(16, count // (4 * jobs)))
+    shards = [(indices[i:i+chunkSize], seed) for i in range(0, len(indices), chunkSize)]
+
+    produced = 0
+    with multiprocessing.Pool(jobs, _initWorker, (modelFile, settingsValues, outputPath, fileFormat, nameBase)) as pool:
+        for n in pool.imap_unordered(_produceShard, shards):
+            produced += n
+            log.message("Produced %d / %d", produced, count)
+    mergeManifests(outputPath, nameBase)
+    return seed
@@ -2,41 +2,48 @@
 # -*- coding: utf-8 -*-
 
 import random
-import gui3d
-import gui
 from core import G
 from .modifiergroups import ModifierInfo
 import re
 import material
+import log
 
-from .randomizeaction import RandomizeAction
 from .modifiergroups import MACROGROUPS
 
-mhapi = gui3d.app.mhapi
-
-from PyQt5.QtWidgets import *
-
 import pprint
 pp = pprint.PrettyPrinter(indent=4)
 
 class HumanState():
 
-    def __init__(self, settings = None):
+    def __init__(self, settings = None, human = None, api = None, rng = None):
+        """
+        Capture (and if settings are given, randomize) the state of a human.
+        human defaults to the selected human, api to mhapi. Headless mass
+        production passes its own human and an api providing the same assets
+        and modifiers calls (see headless.py).
+        rng is the random generator used for randomizing (a random.Random
+        instance), by default the global one of the random module.
+        """
 
         self.settings = settings
-        self.human = G.app.selectedHuman
+        self.rng = rng or random
+        self.human = human or G.app.selectedHuman
+        self.api = api or G.app.mhapi
         self.macroModifierValues = dict()
         self.appliedTargets = dict(self.human.targetsDetailStack)
+        # Macro modifiers outside of MACROGROUPS (such as breast size) store
+        # their value in the human rather than in the targets
+        self.otherMacroValues = dict((m.fullName, m.getValue()) for m in self.human.modifiers if m.isMacro())
 
         self.skin = material.Material().copyFrom(self.human.material)
-        self.hair = mhapi.assets.getEquippedHair()
-        self.eyebrows = mhapi.assets.getEquippedEyebrows()
-        self.eyelashes = mhapi.assets.getEquippedEyelashes()
-        self.clothes = mhapi.assets.getEquippedClothes()
+        self.hair = self.api.assets.getEquippedHair()
+        self.eyebrows = self.api.assets.getEquippedEyebrows()
+        self.eyelashes = self.api.assets.getEquippedEyelashes()
+        self.clothes = self.api.assets.getEquippedClothes()
 
         self._fillMacroModifierValues()
 
-        self.modifierInfo = ModifierInfo()
+        self.modifierInfo = ModifierInfo(self.human)
 
         if not settings is None:
             self._randomizeMacros()
@@ -71,18 +78,18 @@ class HumanState():
         for n in modifierList:
             valuesHash[n] = 0.0
         num = len(modifierList)
-        pickedVal = random.randrange(num)
+        pickedVal = self.rng.randrange(num)
         pickedName = modifierList[pickedVal]
         valuesHash[pickedName] = 1.0
 
     def _pickOneFromArray(self, values):
         num = len(values)
-        pickedVal = random.randrange(num)
+        pickedVal = self.rng.randrange(num)
         return values[pickedVal]
 
     def _dichotomous(self, valuesHash, modifierList):
         for n in modifierList:
-            valuesHash[n] = float(random.randrange(2))
+            valuesHash[n] = float(self.rng.randrange(2))
 
     def _randomizeModifierGroup(self, modifierGroup, debug=False):
         if debug:
@@ -90,7 +97,6 @@ class HumanState():
         mfi = self.modifierInfo.getModifierInfoForGroup(modifierGroup)
         maxdev = self.settings.getValue("modeling","maxdev")
         for mi in mfi:
-            print(mi)
             modifier = mi["modifier"]
             default = float(mi["defaultValue"])
             twosided = mi["twosided"]
@@ -172,9 +178,9 @@ class HumanState():
         if self.settings.getValue("macro", "gender"):
             key = MACROGROUPS["gender"][0]
             if self.settings.getValue("macro", "genderabsolute"):
-                self.macroModifierValues[key] = float(random.randrange(2))
+                self.macroModifierValues[key] = float(self.rng.randrange(2))
             else:
-                self.macroModifierValues[key] = random.random()
+                self.macroModifierValues[key] = self.rng.random()
 
     def _getCurrentEthnicity(self):
         for ethn in MACROGROUPS["ethnicity"]:
@@ -210,7 +216,7 @@ class HumanState():
             if skin[ethnicity]:
                 matchingSkins.append(skin["fullPath"])
 
-        pick = random.randrange(len(matchingSkins))
+        pick = self.rng.randrange(len(matchingSkins))
         self.skin = material.fromFile(matchingSkins[pick])
 
     def _randomizeSkin(self):
@@ -229,7 +235,7 @@ class HumanState():
             if allowed:
                 allowedHair.append(hairName)
 
-        pick = random.randrange(len(allowedHair))
+        pick = self.rng.randrange(len(allowedHair))
         return self.settings.getValue("allowedHair",allowedHair[pick],"fullPath")
 
     def _randomizeHair(self):
@@ -246,7 +252,7 @@ class HumanState():
             if allowed:
                 allowedEyebrows.append(eyebrowsName)
 
-        pick = random.randrange(len(allowedEyebrows))
+        pick = self.rng.randrange(len(allowedEyebrows))
         return self.settings.getValue("allowedEyebrows",allowedEyebrows[pick],"fullPath")
 
     def _randomizeEyebrows(self):
@@ -264,7 +270,7 @@ class HumanState():
             if allowed:
                 allowedEyelashes.append(eyelashesName)
 
-        pick = random.randrange(len(allowedEyelashes))
+        pick = self.rng.randrange(len(allowedEyelashes))
         return self.settings.getValue("allowedEyelashes",allowedEyelashes[pick],"fullPath")
 
     def _randomizeEyelashes(self):
@@ -334,25 +340,36 @@ class HumanState():
             self._randomizeShoes()
 
     def equipClothes(self):
-        print("equip cloth in humanstate.py")
-        mhapi.assets.unequipAllClothes()
+        log.debug("equip cloth in humanstate.py")
+        self.api.assets.unequipAllClothes()
         for c in self.clothes:
-            mhapi.assets.equipClothes(c)
+            self.api.assets.equipClothes(c)
 
     def applyState(self, assumeBodyReset=False):
 
-        self._applyMacroModifiers()
-        if assumeBodyReset:
-            self.human.targetsDetailStack = self.appliedTargets
+        self.restoreModifiers(assumeBodyReset)
         self.human.material = self.skin
-        mhapi.assets.equipHair(self.hair)
-        mhapi.assets.equipEyebrows(self.eyebrows)
-        mhapi.assets.equipEyelashes(self.eyelashes)
+        self.api.assets.equipHair(self.hair)
+        self.api.assets.equipEyebrows(self.eyebrows)
+        self.api.assets.equipEyelashes(self.eyelashes)
 
-        mhapi.modifiers._threadSafeApplyAllTargets()
+        self.api.modifiers._threadSafeApplyAllTargets()
 
         self.equipClothes()
 
+    def restoreModifiers(self, assumeBodyReset=True):
+        """
+        Set the modifier values of this state on the human, without updating
+        the mesh. With assumeBodyReset, all targets are restored to the ones
+        applied when this state was captured.
+        """
+        self._applyMacroModifiers()
+        if assumeBodyReset:
+            for name, value in self.otherMacroValues.items():
+                if name not in self.macroModifierValues:
+                    self.human.getModifier(name).setValue(value, skipDependencies=True)
+            self.human.targetsDetailStack = dict(self.appliedTargets)
+
     def _applyMacroModifiers(self):
         for group in MACROGROUPS.keys():
             for n in MACROGROUPS[group]:
@@ -362,13 +379,13 @@ class HumanState():
 
     def getRandomValue(self, minValue, maxValue):
         size = maxValue - minValue
-        val = random.random() * size
+        val = self.rng.random() * size
         return minValue + val
 
     def getNormalRandomValue(self, minValue, maxValue, middleValue, sigmaFactor=0.2):
         rangeWidth = float(abs(maxValue - minValue))
         sigma = sigmaFactor * rangeWidth
-        randomVal = random.gauss(middleValue, sigma)
+        randomVal = self.rng.gauss(middleValue, sigma)
         if randomVal < minValue:
             randomVal = minValue + abs(randomVal - minValue)
         elif randomVal > maxValue:
@@ -753,8 +753,29 @@ class MassProduceTaskView(gui3d.TaskView):
         def onClicked(event):
             self._onProduceClick()
 
+        self.producePanel.addWidget(mhapi.ui.createLabel(""))
+        self.saveSettingsButton = self.producePanel.addWidget(mhapi.ui.createButton("Save settings"))
+
+        @self.saveSettingsButton.mhEvent
+        def onClicked(event):
+            self._onSaveSettingsClick()
+
         return self.producePanel
 
+    def _onSaveSettingsClick(self):
+        # Settings file for producing characters without the GUI, see mass_produce.py
+        import json
+        path = mh.getPath("massproduce.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.randomizationSettings.getValues(), f, indent=4, sort_keys=True)
+
+        self.msg = QMessageBox()
+        self.msg.setIcon(QMessageBox.Information)
+        self.msg.setText("Settings saved to " + path)
+        self.msg.setWindowTitle("Save settings")
+        self.msg.setStandardButtons(QMessageBox.Ok)
+        self.msg.show()
+
     def _createModelingSettings(self, r):
         self.modelingPanel = mhapi.ui.createGroupBox("Modeling settings")
 
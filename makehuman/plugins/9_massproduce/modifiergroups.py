@@ -11,13 +11,12 @@ MACROGROUPS["proportion"] = ["macrodetails-proportions/BodyProportions"]
 MACROGROUPS["ethnicity"] = ["macrodetails/African", "macrodetails/Asian", "macrodetails/Caucasian"]
 
 from core import G
-mhapi = G.app.mhapi
 
 class _ModifierInfo():
 
-    def __init__(self):
+    def __init__(self, human):
 
-        self.human = mhapi.internals.getHuman()
+        self.human = human
         self.nonMacroModifierGroupNames = []
         self.modifierInfo = dict()
 
@@ -77,8 +76,10 @@ class _ModifierInfo():
 
 _mfinstance = None
 
-def ModifierInfo():
+def ModifierInfo(human=None):
     global _mfinstance
-    if _mfinstance is None:
-        _mfinstance = _ModifierInfo()
+    if human is None:
+        human = G.app.selectedHuman
+    if _mfinstance is None or _mfinstance.human is not human:
+        _mfinstance = _ModifierInfo(human)
     return _mfinstance
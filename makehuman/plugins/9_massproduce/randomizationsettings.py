@@ -97,6 +97,22 @@ class RandomizationSettings:
 
         return values
 
+    def getValues(self):
+        """
+        The values of all settings as nested dicts (category, name and
+        optionally subName), for example for saving them as settings for
+        headless mass production.
+        """
+        values = dict()
+        for category in self._ui:
+            values[category] = dict()
+            for name in self._ui[category]:
+                if isinstance(self._ui[category][name], dict):
+                    values[category][name] = self.getValueHash(category, name)
+                else:
+                    values[category][name] = self.getValue(category, name)
+        return values
+
     def getNames(self, category):
         return self._ui[category].keys()
 
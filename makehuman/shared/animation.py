@@ -50,6 +50,9 @@ INTERPOLATION = {
     'LOG':    2
 }
 
+BAKE_CHUNK_SIZE = 1000   # Maximum number of animation frames baked at once
+BLEND_CHUNK_SIZE = 1<<18  # Maximum number of quaternions slerped at once when blending poses
+
 # TODO allow saving AnimationTrack to binary file
 # TODO allow saving VertexBoneWeights to binary file
 
@@ -130,24 +133,22 @@ class AnimationTrack(object):
         from progress import Progress
 
         log.debug('Updating baked animation %s (%s frames)', self.name, self.nFrames)
-        progress = Progress(self.nFrames)
 
-        bones = skel.getBones()
-        if len(bones) != self.nBones:
+        if skel.getBoneCount() != self.nBones:
             raise RuntimeError("Error baking animation %s: number of bones in animation data differs from bone count of skeleton %s" % (self.name, skel.name))
 
-        old_pose = skel.getPose()
-        self._data_baked = np.zeros((self.dataLen, 3, 4))
+        # Bake a limited number of frames at once to bound memory use
+        chunks = list(range(0, self.nFrames, BAKE_CHUNK_SIZE))
+        progress = Progress(len(chunks))
 
-        for f_idx in range(self.nFrames):
-            i = f_idx * self.nBones
-            skel.setPose(self._data[i:i+self.nBones])
-            for b_idx in range(self.nBones):
-                idx = i + b_idx
-                self._data_baked[idx,:,:] = bones[b_idx].matPoseVerts[:3,:4]
-            progress.step("Baking animation frame %s", f_idx+1)
+        poseData = self._data.reshape(self.nFrames, self.nBones, 3, 4)
+        self._data_baked = np.zeros((self.dataLen, 3, 4))
+        baked = self._data_baked.reshape(self.nFrames, self.nBones, 3, 4)
 
-        skel.setPose(old_pose)
+        for start in chunks:
+            end = min(start + BAKE_CHUNK_SIZE, self.nFrames)
+            baked[start:end] = skel.getSkinningMatrices(poseData[start:end])[..., :3, :4]
+            progress.step("Baking animation frames %s to %s", start+1, end)
 
     def scale(self, scale):
         """
@@ -323,6 +324,7 @@ class PoseUnit(AnimationTrack):
         self._poseNames = poseNames
 
         self._affectedBones = None  # Stores for every frame which bones (index) are posed
+        self._quaternions = None    # Rotations of all unit poses as quaternions
 
     def sparsify(self, newFrameRate):
         raise NotImplementedError("sparsify() does not exist for poseunits")
@@ -366,10 +368,6 @@ class PoseUnit(AnimationTrack):
         poses is expected to be a list of poseunit (frame) names
         weights is expected to be a list of float values between 0 and 1
         """
-        import transformations as tm
-
-        REST_QUAT = np.asarray([1,0,0,0], dtype=np.float32)
-
         if isinstance(poses[0], str):
             f_idxs = [self.getPoseNames().index(pname) for pname in poses]
         else:
@@ -386,38 +384,50 @@ class PoseUnit(AnimationTrack):
                 f_idxs.append(0)
             weights /= t
 
-        #print (zip([self.getPoseNames()[_f] for _f in f_idxs],weights))
-
-        result = emptyPose(self.nBones)
-        m = np.identity(4, dtype=np.float32)
-        m1 = np.identity(4, dtype=np.float32)
-        m2 = np.identity(4, dtype=np.float32)
-
-        if len(f_idxs) == 1:
-            for b_idx in range(self.nBones):
-                m[:3, :4] = self.getAtFramePos(f_idxs[0], True)[b_idx]
-                q = tm.quaternion_slerp(REST_QUAT, tm.quaternion_from_matrix(m, True), float(weights[0]))
-                result[b_idx] = tm.quaternion_matrix( q )[:3,:4]
-        else:
-            for b_idx in range(self.nBones):
-                m1[:3, :4] = self.getAtFramePos(f_idxs[0], True)[b_idx]
-                m2[:3, :4] = self.getAtFramePos(f_idxs[1], True)[b_idx]
-                q1 = tm.quaternion_slerp(REST_QUAT, tm.quaternion_from_matrix(m1, True), float(weights[0]))
-                q2 = tm.quaternion_slerp(REST_QUAT, tm.quaternion_from_matrix(m2, True), float(weights[1]))
-                quat = tm.quaternion_multiply(q2, q1)
-
-                for i,f_idx in enumerate(f_idxs[2:]):
-                    i += 2
-                    m[:3, :4] = self.getAtFramePos(f_idx, True)[b_idx]
-                    q = tm.quaternion_slerp(REST_QUAT, tm.quaternion_from_matrix(m, True), float(weights[i]))
-                    quat = tm.quaternion_multiply(q, quat)
-
-                result[b_idx] = tm.quaternion_matrix( quat )[:3,:4]
+        result = self.getBlendedPoses(f_idxs, [weights])[0]
 
         if only_data:
             return result
         return Pose(self.name+'-blended', result)
 
+    def getUnitQuaternions(self):
+        """
+        The rotations of all unit poses as quaternions, in an array of shape
+        (nFrames, nBones, 4). Calculated once and cached.
+        """
+        if self._quaternions is None:
+            self._quaternions = quaternionsFromMatrices(self._data.reshape(self.nFrames, self.nBones, 3, 4))
+        return self._quaternions
+
+    def getBlendedPoses(self, poses, weights):
+        """Create the pose data of many blends of the same unit poses at once,
+        with additive blending as in getBlendedPose().
+        poses is expected to be a list of poseunit (frame) names or indices
+        weights is expected to be an array with one row of weights (one value
+        between 0 and 1 per pose) for every blended pose to create
+        Returns pose data in an array of shape (len(weights), nBones, 3, 4)
+        """
+        if len(poses) and isinstance(poses[0], str):
+            f_idxs = [self.getPoseNames().index(pname) for pname in poses]
+        else:
+            f_idxs = list(poses)
+        weights = np.asarray(weights, dtype=np.float64).reshape(-1, len(f_idxs))
+
+        # Unit poses with zero weight do not contribute to the blend
+        used = np.any(weights != 0, axis=0)
+        quats = self.getUnitQuaternions()[np.asarray(f_idxs, dtype=np.intp)[used]]
+        weights = weights[:, used]
+
+        # Blend a limited number of poses at once to bound memory use
+        result = np.zeros((len(weights), self.nBones, 3, 4), dtype=np.float32)
+        chunkSize = max(1, BLEND_CHUNK_SIZE // max(1, quats.shape[0] * self.nBones))
+        for start in range(0, len(weights), chunkSize):
+            w = weights[start:start+chunkSize]
+            # Rotate each unit pose from rest by its weight, then combine them
+            blended = quaternionsSlerpFromRest(quats[None,:], w[:,:,None])
+            result[start:start+chunkSize] = quaternionMatrices(quaternionsProduct(blended, axis=1))
+        return result
+
 def poseFromUnitPose(name, filename, poseUnit):
     """
     Parse a .mhupb file and construct a pose by blending the
@@ -619,18 +629,37 @@ class VertexBoneWeights(object):
         self._compiled = {}
 
     def _calculate_num_weights(self):
-        self._wCounts = np.zeros(self._vertexCount, dtype=np.uint32)
-        for bname, wghts in list(self._data.items()):
-            vs, _ = wghts
-            self._wCounts[vs] += 1
+        if len(self._data):
+            verts = np.concatenate([vs for vs, _ in self._data.values()])
+        else:
+            verts = np.zeros(0, dtype=np.uint32)
+        # Vertices are unique per bone, so this counts the bones per vertex
+        self._wCounts = np.bincount(verts, minlength=self._vertexCount).astype(np.uint32)
         self._nWeights = max(self._wCounts)
-            
+
+    @staticmethod
+    def _vertexGroupArrays(vgroup):
+        """
+        Vertex indices and weights of a vertex group given as a list of
+        (v_idx, v_weight) pairs, or as a (verts, weights) tuple of arrays.
+        The weights keep the type of the input values.
+        """
+        if isinstance(vgroup, tuple) and len(vgroup) == 2 and \
+           isinstance(vgroup[0], np.ndarray) and isinstance(vgroup[1], np.ndarray):
+            return vgroup
+        if len(vgroup) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        verts, weights = zip(*vgroup)
+        return np.asarray(verts), np.asarray(weights)
+
     def _build_vertex_weights_data(self, vertexWeightsDict, vertexCount=None, rootBone="root"):
         """
         Build a consistent set of per-bone vertex weights from a dictionary loaded
         from (json) data file.
         The format of vertexWeightsDict is expected to be: 
             { "bone_name": [(v_idx, v_weight), ...], ... }
+        or, for weights that are already in np format:
+            { "bone_name": ([v_idx, ...], [v_weight, ...]), ... }
 
         The output format is of the form:
             { "bone_name": ([v_idx, ...], [v_weight, ...]), ... }
@@ -639,75 +668,65 @@ class VertexBoneWeights(object):
         """
         WEIGHT_THRESHOLD = 1e-4  # Threshold for including bone weight
 
-        first_entry = list(vertexWeightsDict.keys())[0] if len(vertexWeightsDict) > 0 else None
-        if len(vertexWeightsDict) > 0 and \
-           len(vertexWeightsDict[first_entry]) == 2 and \
-           isinstance(vertexWeightsDict[first_entry], tuple) and \
-           isinstance(vertexWeightsDict[first_entry][1], np.ndarray) and \
-           isinstance(vertexWeightsDict[first_entry][2], np.ndarray):
-            # Input dict is already in the expected format, presume it does not
-            # need to be built again
-            if vertexCount is not None:
-                self._vertexCount = vertexCount
-            else:
-                self._vertexCount = max([vn for vg in list(vertexWeightsDict.values()) for vn in vg[0]])+1
-            return vertexWeightsDict
+        # All (bone, vertex, weight) triples, bones numbered in dict order
+        bnames = []
+        verts = []
+        weights = []
+        for bname, vgroup in list(vertexWeightsDict.items()):
+            if len(vgroup) == 0:
+                continue
+            vs, ws = self._vertexGroupArrays(vgroup)
+            bnames.append(bname)
+            verts.append(vs.astype(np.int64))
+            weights.append(ws)
+        if bnames:
+            counts = [len(vs) for vs in verts]
+            bones = np.repeat(np.arange(len(bnames)), counts)
+            verts = np.concatenate(verts)
+            weights = np.concatenate(weights)
+        else:
+            bones = verts = np.zeros(0, dtype=np.int64)
+            weights = np.zeros(0, dtype=np.float32)
 
         if vertexCount is not None:
             vcount = vertexCount
         else:
-            vcount = max([vn for vg in list(vertexWeightsDict.values()) for vn,_ in vg])+1
+            vcount = int(verts.max())+1 if len(verts) else 0
         self._vertexCount = vcount
 
-        # Normalize weights and put them in np format
+        # Normalize weights: total weight per vertex, accumulated in order
         wtot = np.zeros(vcount, np.float32)
-        for vgroup in list(vertexWeightsDict.values()):
-            for item in vgroup:
-                vn,w = item
-                # Calculate total weight per vertex
-                wtot[vn] += w
+        np.add.at(wtot, verts, weights)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weights = weights / wtot[verts]
+
+        # Merge doubles, accumulated in order, and sort by bone and vertex index
+        keys, inverse = np.unique(bones * max(vcount, 1) + verts, return_inverse=True)
+        merged = np.zeros(len(keys), dtype=weights.dtype)
+        np.add.at(merged, inverse, weights)
+        bones = keys // max(vcount, 1)
+        verts = (keys % max(vcount, 1)).astype(np.uint32)
+        merged = merged.astype(np.float32)
 
         from collections import OrderedDict
         boneWeights = OrderedDict()
-        for bname,vgroup in list(vertexWeightsDict.items()):
-            if len(vgroup) == 0:
-                continue
-            weights = []
-            verts = []
-            v_lookup = {}
-            n = 0
-            for vn,w in vgroup:
-                if vn in v_lookup:
-                    # Merge doubles
-                    v_idx = v_lookup[vn]
-                    weights[v_idx] += w/wtot[vn]
-                else:
-                    v_lookup[vn] = len(verts)
-                    verts.append(vn)
-                    weights.append(w/wtot[vn])
-            verts = np.asarray(verts, dtype=np.uint32)
-            weights = np.asarray(weights, np.float32)
-            # Sort by vertex index
-            i_s = np.argsort(verts)
-            verts = verts[i_s]
-            weights = weights[i_s]
+        bounds = np.searchsorted(bones, np.arange(len(bnames)+1))
+        for bIdx, bname in enumerate(bnames):
+            vs = verts[bounds[bIdx]:bounds[bIdx+1]]
+            ws = merged[bounds[bIdx]:bounds[bIdx+1]]
             # Filter out weights under the threshold
-            i_s = np.argwhere(weights > WEIGHT_THRESHOLD)[:,0]
-            verts = verts[i_s]
-            weights = weights[i_s]
-            boneWeights[bname] = (verts, weights)
+            i_s = np.argwhere(ws > WEIGHT_THRESHOLD)[:,0]
+            boneWeights[bname] = (vs[i_s], ws[i_s])
 
         # Assign unweighted vertices to root bone with weight 1
         if rootBone not in list(boneWeights.keys()):
-            vs = []
-            ws = []
+            vs = np.zeros(0, dtype=np.uint32)
+            ws = np.zeros(0, dtype=np.float32)
         else:
             vs,ws = boneWeights[rootBone]
-            vs = list(vs)
-            ws = list(ws)
         rw_i = np.argwhere(wtot == 0)[:,0]
-        vs.extend(rw_i)
-        ws.extend(np.ones(len(rw_i), dtype=np.float32))
+        vs = np.concatenate([vs, rw_i.astype(np.uint32)])
+        ws = np.concatenate([ws, np.ones(len(rw_i), dtype=np.float32)])
         if len(rw_i) > 0:
             if len(rw_i) < 100:
                 # To avoid spamming the log, only print vertex indices if there's less than 100
@@ -715,13 +734,17 @@ class VertexBoneWeights(object):
             else:
                 log.debug("Adding trivial bone weights to root bone %s for %s unweighted vertices.", rootBone, len(rw_i))
         if len(vs) > 0:
-            boneWeights[rootBone] = (np.asarray(vs, dtype=np.uint32), np.asarray(ws, dtype=np.float32))
+            boneWeights[rootBone] = (vs, ws)
 
         return boneWeights
 
     def _compileVertexWeights(self, vertBoneMapping, skel, nWeights, vertexCount=None):
         """
         Compile vertex weights data to a more performant per-vertex format.
+        Per vertex, the nWeights largest weights are kept (re-normalized if
+        weights were dropped), sorted by decreasing weight and bone index.
+        Returns a tuple of (vertexCount, nWeights) bone index and weight
+        arrays. Unused weight slots have weight 0 and refer to bone 0.
         """
         if vertexCount is None:
             vertexCount = 0
@@ -731,87 +754,48 @@ class VertexBoneWeights(object):
             if vertexCount:
                 vertexCount += 1
 
-        # TODO use simple array columns instead of structured arrays (they are array of structs, not struct of arrays)
-        if nWeights == 3:
-            dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), ('b_idx3', np.uint32), 
-                     ('wght1', np.float32), ('wght2', np.float32), ('wght3', np.float32)]
-        elif nWeights == 4:
-            dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), ('b_idx3', np.uint32), ('b_idx4', np.uint32),
-                     ('wght1', np.float32), ('wght2', np.float32), ('wght3', np.float32), ('wght4', np.float32)]
-        elif nWeights == 6:
-            dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), ('b_idx3', np.uint32), 
-                     ('b_idx4', np.uint32), ('b_idx5', np.uint32), ('b_idx6', np.uint32), 
-                     ('wght1', np.float32), ('wght2', np.float32), ('wght3', np.float32), 
-                     ('wght4', np.float32), ('wght5', np.float32), ('wght6', np.float32)]
-        elif nWeights == 5:
-            dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), ('b_idx3', np.uint32),
-                     ('b_idx4', np.uint32), ('b_idx5', np.uint32),
-                     ('wght1', np.float32), ('wght2', np.float32), ('wght3', np.float32),
-                     ('wght4', np.float32), ('wght5', np.float32)]
-        elif nWeights == 13:
-            dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), ('b_idx3', np.uint32), 
-                     ('b_idx4', np.uint32), ('b_idx5', np.uint32), ('b_idx6', np.uint32), 
-                     ('b_idx7', np.uint32), ('b_idx8', np.uint32), ('b_idx9', np.uint32), 
-                     ('b_idx10', np.uint32), ('b_idx11', np.uint32), ('b_idx12', np.uint32), 
-                     ('b_idx13', np.uint32),
-                     ('wght1', np.float32), ('wght2', np.float32), ('wght3', np.float32), 
-                     ('wght4', np.float32), ('wght5', np.float32), ('wght6', np.float32), 
-                     ('wght7', np.float32), ('wght8', np.float32), ('wght9', np.float32), 
-                     ('wght10', np.float32), ('wght11', np.float32), ('wght12', np.float32), 
-                     ('wght13', np.float32)]
-        elif nWeights == 2:
-            dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), 
-                     ('wght1', np.float32), ('wght2', np.float32)]
-        else:
-            dtype = [('b_idx1', np.uint32), ('wght1', np.float32)]
-        compiled_vertweights = np.zeros(vertexCount, dtype=dtype)
+        boneIdxs = np.zeros((vertexCount, nWeights), dtype=np.uint32)
+        wghts = np.zeros((vertexCount, nWeights), dtype=np.float32)
 
         # Convert weights from indexed by bone to indexed by vertex index
-        _ws = dict()
         b_lookup = dict([(b.name,b_idx) for b_idx,b in enumerate(skel.getBones())])
+        verts = []
+        weights = []
+        bones = []
         for bname, mapping in list(vertBoneMapping.items()):
-            try:
-                b_idx = b_lookup[bname]
-                verts,weights = mapping
-                for v_idx, wght in zip(verts, weights):
-                    if v_idx not in _ws:
-                        _ws[v_idx] = []
-
-                    # TODO not needed for now (no remapping yet), and perhaps doubles should be removed upon merge, not when compiling
-                    # also in case of proxy remapping doubles need to be prevented
-                    '''
-                    b_idxs = [bidx for (_,bidx) in _ws[v_idx]]
-                    if b_idx in b_idxs:
-                        # Merge doubles (this needs to happen even if the _build_vertex_weights_data()
-                        # step already performs double removal, in the case where
-                        # weights were remapped to another rig and bones merged)
-                        _i = b_idxs.index(b_idx)
-                        _ws[v_idx][_i] = (_ws[v_idx][_i][0] + wght, b_idx)
-                    else:
-                        _ws[v_idx].append( (wght, b_idx) )
-                    '''
-                    _ws[v_idx].append( (wght, b_idx) )  # For now, assume there are no doubles
-            except KeyError as e:
-                log.warning("Bone %s not found in skeleton: %s" % (bname, e))
-        for v_idx in _ws:
-            # Sort by weight and keep only nWeights most significant weights
-            if len(_ws[v_idx]) > nWeights:
-                #log.debug("Vertex %s has too many weights (%s): %s" % (v_idx, len(_ws[v_idx]), str(sorted(_ws[v_idx], reverse=True))))
-                _ws[v_idx] = sorted(_ws[v_idx], reverse=True)[:nWeights]
-                # Re-normalize weights
-                weightvals = np.asarray( [e[0] for e in _ws[v_idx]], dtype=np.float32)
-                weightvals /= np.sum(weightvals)
-                for i in range(nWeights):
-                    _ws[v_idx][i] = (weightvals[i], _ws[v_idx][i][1])
-            else:
-                _ws[v_idx] = sorted(_ws[v_idx], reverse=True)
-
-        for v_idx, wghts in list(_ws.items()):
-            for i, (w, bidx) in enumerate(wghts):
-                compiled_vertweights[v_idx]['wght%s' % (i+1)] = w
-                compiled_vertweights[v_idx]['b_idx%s' % (i+1)] = bidx
-
-        return compiled_vertweights
+            if bname not in b_lookup:
+                log.warning("Bone %s not found in skeleton", bname)
+                continue
+            vs,ws = mapping
+            verts.append(np.asarray(vs, dtype=np.int64))
+            weights.append(np.asarray(ws, dtype=np.float32))
+            bones.append(np.full(len(vs), b_lookup[bname], dtype=np.int64))
+            # TODO doubles are not merged here (no remapping yet), perhaps they should be removed upon merge, not when compiling
+        if not verts:
+            return boneIdxs, wghts
+        verts = np.concatenate(verts)
+        weights = np.concatenate(weights)
+        bones = np.concatenate(bones)
+
+        # Sort by vertex, then by decreasing weight and bone index
+        order = np.lexsort((-bones, -weights, verts))
+        verts = verts[order]
+        weights = weights[order]
+        bones = bones[order]
+
+        # Keep only nWeights most significant weights per vertex
+        counts = np.bincount(verts, minlength=vertexCount)
+        starts = np.cumsum(counts) - counts
+        rank = np.arange(len(verts)) - starts[verts]
+        keep = rank < nWeights
+        wghts[verts[keep], rank[keep]] = weights[keep]
+        boneIdxs[verts[keep], rank[keep]] = bones[keep]
+
+        # Re-normalize weights of vertices that had too many weights
+        truncated = counts > nWeights
+        wghts[truncated] /= np.sum(wghts[truncated], axis=1)[:,None]
+
+        return boneIdxs, wghts
 
 class AnimatedMesh(object):
     """
@@ -826,6 +810,7 @@ class AnimatedMesh(object):
         self.__meshes = []
         self.__vertexToBoneMaps = []
         self.__originalMeshCoords = []
+        self.__skinnedVertexMasks = []  # Cached (static face mask, vertex mask) per bound mesh
         self.addBoundMesh(mesh, vertexToBoneMapping)
 
         self._posed = True
@@ -835,6 +820,7 @@ class AnimatedMesh(object):
 
         self.__inPlace = False  # Animate in place (ignore translation component of animation)
         self.onlyAnimateVisible = False  # Only animate visible meshes (note: enabling this can have undesired consequences!)
+        self.onlyAnimateVisibleVertices = False  # Do not skin vertices hidden by the static face mask of a mesh (they keep their rest coordinates)
 
     def setBaseSkeleton(self, skel):
         self.__skeleton = skel
@@ -915,6 +901,7 @@ class AnimatedMesh(object):
         originalMeshCoords[:,:3] = mesh.coord[:,:3]
         originalMeshCoords[:,3] = 1.0
         self.__originalMeshCoords.append(originalMeshCoords)
+        self.__skinnedVertexMasks.append(None)
         self.__vertexToBoneMaps.append(vertexToBoneMapping)
         self.__meshes.append(mesh)
 
@@ -933,6 +920,7 @@ class AnimatedMesh(object):
                 pass    # Don't fail if the mesh was already detached/destroyed
             del self.__meshes[rIdx]
             del self.__originalMeshCoords[rIdx]
+            del self.__skinnedVertexMasks[rIdx]
             del self.__vertexToBoneMaps[rIdx]
         except:
             log.warning('Cannot remove bound mesh %s, no such mesh bound.', name)
@@ -1067,7 +1055,7 @@ class AnimatedMesh(object):
                             self.__vertexToBoneMaps[idx].compileData(self.getBaseSkeleton(), 6)
 
                         # New fast skinnig approach
-                        posedCoords = skinMesh(self.__originalMeshCoords[idx], self.__vertexToBoneMaps[idx].compiled(6), poseState)
+                        posedCoords = skinMesh(self.__originalMeshCoords[idx], self.__vertexToBoneMaps[idx].compiled(6), poseState, self._getSkinnedVertexMask(idx))
                 except Exception as e:
                     log.error("Error skinning mesh %s", mesh.name, exc_info=True)
                     raise e
@@ -1083,6 +1071,25 @@ class AnimatedMesh(object):
             for idx,mesh in enumerate(self.__meshes):
                 self._updateMeshVerts(mesh, self.__originalMeshCoords[idx])
 
+    def _getSkinnedVertexMask(self, idx):
+        """
+        Vertex mask of the vertices of the bound mesh with index idx that need
+        skinning, or None if all vertices are to be skinned.
+        The mask is cached, and only recalculated when the static face mask of
+        the mesh changed.
+        """
+        mesh = self.__meshes[idx]
+        if not self.onlyAnimateVisibleVertices or mesh.object is None:
+            return None
+        faceMask = mesh.object.staticFaceMask
+        if faceMask is None or faceMask.all():
+            return None
+        cached = self.__skinnedVertexMasks[idx]
+        if cached is None or not np.array_equal(cached[0], faceMask):
+            cached = (faceMask.copy(), mesh.getVertexMaskForFaceMask(faceMask))
+            self.__skinnedVertexMasks[idx] = cached
+        return cached[1]
+
     def _updateMeshVerts(self, mesh, verts):
         # TODO this is way too slow for realtime animation, but good for posing. For animation, update the r_ verts directly, as well as the r_vnorm members
         # TODO use this mapping to directly update the opengl data for animation
@@ -1118,7 +1125,7 @@ class AnimatedMesh(object):
             # pose state is restored to rest
             self.getBaseSkeleton().setToRestPose()
 
-def skinMesh(coords, compiledVertWeights, poseData):
+def skinMesh(coords, compiledVertWeights, poseData, vertexMask=None):
     """
     More efficient way of linear blend skinning or smooth skinning.
     As proposed in http://graphics.ucsd.edu/courses/cse169_w05/3-Skin.htm we use
@@ -1126,6 +1133,9 @@ def skinMesh(coords, compiledVertWeights, poseData):
     We also use a fixed number of weights per vertex.
     Uses accumulated matrix skinning (http://http.developer.nvidia.com/GPUGems/gpugems_ch04.html)
 
+    compiledVertWeights is a tuple of (nverts, nWeights) bone index and weight
+    arrays, as returned by VertexBoneWeights.compiled().
+
     Care should be taken to supply coords with the right dimensions. This method
     accepts both coords[nverts, 3] and coords[nverts, 4] dimensions. The fourth
     member being the homogenous coordinate, which should be 1 if translations
@@ -1133,8 +1143,17 @@ def skinMesh(coords, compiledVertWeights, poseData):
     rotations only (for directions such as normals, tangents and targets).
     If coords is nx3 size, this method will perform faster as only 3x3 matrix
     multiplies are performed, otherwise 3x4 matrices are multiplied.
+
+    If a vertexMask is specified (boolean array with True for vertices to
+    skin, eg. the vertices not hidden by the static face mask), only those
+    vertices are skinned, the others are returned unchanged.
     """
-    # TODO allow skinning only the visible (not statically hidden) vertices, for performance reasons (eg if an alt. topology is set, do we animate both basemesh and topology?)
+    boneIdxs, weights = compiledVertWeights
+
+    if vertexMask is not None:
+        result = np.array(coords[:,:3], dtype=np.result_type(coords, weights, poseData))
+        result[vertexMask] = skinMesh(coords[vertexMask], (boneIdxs[vertexMask], weights[vertexMask]), poseData)
+        return result
 
     if coords.shape[1] == 4:
         # Vertices contain homogenous coordinate (1 if translation affects position,
@@ -1144,65 +1163,15 @@ def skinMesh(coords, compiledVertWeights, poseData):
         # Translations do not affect vertices (faster as this requires only 3x3 matrix multiplies)
         c = 3
 
-    W = compiledVertWeights
-    P = poseData
-    if len(compiledVertWeights.dtype) == 4*2:
-        # nWeights = 4
-        accum = W['wght1'][:,None,None] * P[W['b_idx1']][:,:3,:c] + \
-                W['wght2'][:,None,None] * P[W['b_idx2']][:,:3,:c] + \
-                W['wght3'][:,None,None] * P[W['b_idx3']][:,:3,:c] + \
-                W['wght4'][:,None,None] * P[W['b_idx4']][:,:3,:c]
-    elif len(compiledVertWeights.dtype) == 2:
-        # nWeights = 1
-        accum = W['wght1'][:,None,None] * P[W['b_idx1']][:,:3,:c]
-    elif len(compiledVertWeights.dtype) == 6*2:
-        # nWeights = 13
-        accum = W['wght1'][:,None,None] * P[W['b_idx1']][:,:3,:c] + \
-                W['wght2'][:,None,None] * P[W['b_idx2']][:,:3,:c] + \
-                W['wght3'][:,None,None] * P[W['b_idx3']][:,:3,:c] + \
-                W['wght4'][:,None,None] * P[W['b_idx4']][:,:3,:c] + \
-                W['wght5'][:,None,None] * P[W['b_idx5']][:,:3,:c] + \
-                W['wght6'][:,None,None] * P[W['b_idx6']][:,:3,:c]
-    elif len(compiledVertWeights.dtype) == 5*2:
-        # nWeights = 5
-        accum = W['wght1'][:,None,None] * P[W['b_idx1']][:,:3,:c] + \
-                W['wght2'][:,None,None] * P[W['b_idx2']][:,:3,:c] + \
-                W['wght3'][:,None,None] * P[W['b_idx3']][:,:3,:c] + \
-                W['wght4'][:,None,None] * P[W['b_idx4']][:,:3,:c] + \
-                W['wght5'][:,None,None] * P[W['b_idx5']][:,:3,:c]
-    elif len(compiledVertWeights.dtype) == 13*2:
-        # nWeights = 13
-        accum = W['wght1'][:,None,None] * P[W['b_idx1']][:,:3,:c] + \
-                W['wght2'][:,None,None] * P[W['b_idx2']][:,:3,:c] + \
-                W['wght3'][:,None,None] * P[W['b_idx3']][:,:3,:c] + \
-                W['wght4'][:,None,None] * P[W['b_idx4']][:,:3,:c] + \
-                W['wght5'][:,None,None] * P[W['b_idx5']][:,:3,:c] + \
-                W['wght6'][:,None,None] * P[W['b_idx6']][:,:3,:c] + \
-                W['wght7'][:,None,None] * P[W['b_idx7']][:,:3,:c] + \
-                W['wght8'][:,None,None] * P[W['b_idx8']][:,:3,:c] + \
-                W['wght9'][:,None,None] * P[W['b_idx9']][:,:3,:c] + \
-                W['wght10'][:,None,None] * P[W['b_idx10']][:,:3,:c] + \
-                W['wght11'][:,None,None] * P[W['b_idx11']][:,:3,:c] + \
-                W['wght12'][:,None,None] * P[W['b_idx12']][:,:3,:c] + \
-                W['wght13'][:,None,None] * P[W['b_idx13']][:,:3,:c]
-    elif len(compiledVertWeights.dtype) == 2*2:
-        # nWeights = 2
-        accum = W['wght1'][:,None,None] * P[W['b_idx1']][:,:3,:c] + \
-                W['wght2'][:,None,None] * P[W['b_idx2']][:,:3,:c]
-    else:
-        # nWeights = 3
-        accum = W['wght1'][:,None,None] * P[W['b_idx1']][:,:3,:c] + \
-                W['wght2'][:,None,None] * P[W['b_idx2']][:,:3,:c] + \
-                W['wght3'][:,None,None] * P[W['b_idx3']][:,:3,:c]
+    # Accumulate the weighted skinning matrices of all influences of each
+    # vertex at once, gathering flattened matrices for every bone index
+    # (np.take is considerably faster than fancy indexing here)
+    P = np.ascontiguousarray(poseData[:,:3,:c]).reshape(-1, 3*c)
+    accum = np.matmul(weights[:,None,:], np.take(P, boneIdxs, axis=0)).reshape(-1, 3, c)
 
-    # Note: np.sum(M * vs, axis=-1) is a matrix multiplication of mat M with
-    # a series of vertices vs
+    # Using einstein summation for matrix * vertex multiply
     # Good resource: http://jameshensman.wordpress.com/2010/06/14/multiple-matrix-multiplication-in-numpy
-    #return np.sum(accum[:,:3,:4] * coords[:,None,:], axis=-1)
-
-    # Using einstein summation for matrix * vertex multiply, appears to be
-    # slightly faster
-    return np.einsum('ijk,ikl -> ij', accum[:,:3,:c], coords[:,:c,None])
+    return np.einsum('ijk,ik -> ij', accum, coords[:,:c])
 
 def emptyTrack(nFrames, nBones=1):
     """
@@ -1236,6 +1205,120 @@ def isRest(poseMat):
     else:
         return np.allclose(poseMat, IDENT_4[:3,:4], atol=delta)
 
+def quaternionsFromMatrices(mats):
+    """
+    Convert an array of rotation matrices (..., 3, 4) or (..., 4, 4) to
+    quaternions (..., 4). Vectorized version of
+    transformations.quaternion_from_matrix(m, isprecise=True).
+    """
+    M = np.zeros(mats.shape[:-2] + (4, 4), dtype=np.float64)
+    M[..., :3, :4] = mats[..., :3, :4]
+    M[..., 3, 3] = 1
+    q = np.empty(mats.shape[:-2] + (4,), dtype=np.float64)
+
+    t = M[..., 0, 0] + M[..., 1, 1] + M[..., 2, 2] + M[..., 3, 3]
+    mask = t > M[..., 3, 3]
+    q[mask, 0] = t[mask]
+    q[mask, 3] = M[mask, 1, 0] - M[mask, 0, 1]
+    q[mask, 2] = M[mask, 0, 2] - M[mask, 2, 0]
+    q[mask, 1] = M[mask, 2, 1] - M[mask, 1, 2]
+
+    # Otherwise start from the axis with the largest diagonal element (this
+    # case is not handled correctly by transformations.quaternion_from_matrix)
+    axes = np.zeros(t.shape, dtype=np.intp)
+    axes[M[..., 1, 1] > M[..., 0, 0]] = 1
+    diag = np.take_along_axis(M[..., [0, 1, 2], [0, 1, 2]], axes[..., None], -1)[..., 0]
+    axes[M[..., 2, 2] > diag] = 2
+    for i, j, k in [(0, 1, 2), (1, 2, 0), (2, 0, 1)]:
+        m = ~mask & (axes == i)
+        t[m] = M[m, i, i] - (M[m, j, j] + M[m, k, k]) + M[m, 3, 3]
+        q[m, i+1] = t[m]
+        q[m, j+1] = M[m, i, j] + M[m, j, i]
+        q[m, k+1] = M[m, k, i] + M[m, i, k]
+        q[m, 0] = M[m, k, j] - M[m, j, k]
+
+    q *= (0.5 / np.sqrt(t * M[..., 3, 3]))[..., None]
+    q[q[..., 0] < 0] *= -1
+    return q
+
+def quaternionsMultiply(q1, q0):
+    """
+    Multiply arrays of quaternions (..., 4). Vectorized version of
+    transformations.quaternion_multiply(q1, q0).
+    """
+    w0, x0, y0, z0 = np.moveaxis(q0, -1, 0)
+    w1, x1, y1, z1 = np.moveaxis(q1, -1, 0)
+    return np.stack([-x1*x0 - y1*y0 - z1*z0 + w1*w0,
+                      x1*w0 + y1*z0 - z1*y0 + w1*x0,
+                     -x1*z0 + y1*w0 + z1*x0 + w1*y0,
+                      x1*y0 - y1*x0 + z1*w0 + w1*z0], axis=-1)
+
+def quaternionsProduct(quats, axis=0):
+    """
+    Multiply all quaternions along the specified axis of an array of
+    quaternions, with later quaternions on the left, eg. q2 * q1 * q0.
+    """
+    quats = np.moveaxis(quats, axis, 0)
+    if len(quats) == 0:
+        result = np.zeros(quats.shape[1:], dtype=np.float64)
+        result[..., 0] = 1
+        return result
+    # Multiply adjacent pairs until one quaternion is left
+    while len(quats) > 1:
+        n = len(quats) - len(quats) % 2
+        pairs = quaternionsMultiply(quats[1:n:2], quats[0:n:2])
+        quats = np.concatenate([pairs, quats[n:]])
+    return quats[0]
+
+def quaternionsSlerpFromRest(quats, fractions):
+    """
+    Spherical linear interpolation from the rest (identity) quaternion to the
+    specified quaternions (..., 4) by fractions (broadcast against quats
+    without their last axis). Vectorized version of
+    transformations.quaternion_slerp([1,0,0,0], q, fraction).
+    """
+    import transformations as tm
+
+    fractions = np.asarray(fractions, dtype=np.float64)
+    q1 = quats / np.sqrt(np.sum(quats*quats, axis=-1))[..., None]
+    d = q1[..., 0]
+    flip = d < 0
+    d = np.abs(d)
+    angle = np.arccos(np.minimum(d, 1.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        isin = 1.0 / np.sin(angle)
+        result = np.where(flip[..., None], -q1, q1) * (np.sin(fractions * angle) * isin)[..., None]
+        result[..., 0] += np.sin((1.0 - fractions) * angle) * isin
+
+    rest = (fractions == 0) | (np.abs(d - 1.0) < tm._EPS) | (np.abs(angle) < tm._EPS)
+    result = np.where((fractions == 1)[..., None], q1, result)
+    result[rest & (fractions != 1)] = [1, 0, 0, 0]
+    return result
+
+def quaternionMatrices(quats):
+    """
+    Convert an array of quaternions (..., 4) to 3x4 rotation matrices
+    (..., 3, 4). Vectorized version of transformations.quaternion_matrix().
+    """
+    import transformations as tm
+
+    n = np.sum(quats*quats, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        q = quats * np.sqrt(2.0 / n)[..., None]
+    w, x, y, z = np.moveaxis(q, -1, 0)
+    result = np.zeros(quats.shape[:-1] + (3, 4), dtype=np.float64)
+    result[..., 0, 0] = 1.0 - y*y - z*z
+    result[..., 0, 1] = x*y - z*w
+    result[..., 0, 2] = x*z + y*w
+    result[..., 1, 0] = x*y + z*w
+    result[..., 1, 1] = 1.0 - x*x - z*z
+    result[..., 1, 2] = y*z - x*w
+    result[..., 2, 0] = x*z - y*w
+    result[..., 2, 1] = y*z + x*w
+    result[..., 2, 2] = 1.0 - x*x - y*y
+    result[n < tm._EPS] = np.identity(4)[:3]
+    return result
+
 def animationRelativeToPose(animation, restpose):
     # TODO create animation track copy that is relative to restpose
     pass
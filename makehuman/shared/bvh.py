@@ -317,12 +317,14 @@ class BVH():
             words = self.__expectKeyword('Frame', fp) # Time:
             self.frameTime = float(words[2])
 
-            for i in range(self.frameCount):
-                line = fp.readline()
-                words = line.split()
-                data = [float(word) for word in words]
-                for joint in self.getJointsBVHOrder():
-                    data = self.__processChannelData(joint, data)
+            motion = self.__readMotion(fp)
+
+        # Distribute the channel columns of the motion data among the joints
+        chanIdx = 0
+        for joint in self.getJointsBVHOrder():
+            nChannels = len(joint.channels)
+            joint.frames = motion[:, chanIdx:chanIdx+nChannels].ravel()
+            chanIdx += nChannels
 
         self.__cacheGetJoints()
 
@@ -566,16 +568,36 @@ class BVH():
             else:
                 raise RuntimeError('Expected %s found %s' % ('JOINT, End Site or }', words[0]))
 
-    def __processChannelData(self, joint, data):
+    def __readMotion(self, fp):
         """
-        Distribute animation channel data for one frame or motion sample, 
-        loaded from a BVH file, among the joints of the skeleton structure.
+        Read the animation channel data of all frames, one line per frame,
+        from a BVH file into a (frameCount, nChannels) array, with nChannels
+        the total number of channels of all joints in the BVH hierarchy.
+        Values beyond nChannels on a line are ignored.
         """
-        nChannels = len(joint.channels)
-        joint.frames.extend(data[:nChannels])
-        data = data[nChannels:]
+        nChannels = sum(len(joint.channels) for joint in self.getJointsBVHOrder())
+        lines = fp.read().split('\n', self.frameCount)[:self.frameCount]
+        if len(lines) < self.frameCount:
+            raise RuntimeError('Expected %s frames of motion data found %s' % (self.frameCount, len(lines)))
 
-        return data
+        data = None
+        if lines:
+            try:
+                data = np.loadtxt(lines, dtype=np.float64, comments=None, ndmin=2)
+            except ValueError:
+                # Lines with differing numbers of values
+                pass
+        if data is not None and data.shape[0] == self.frameCount and data.shape[1] >= nChannels:
+            # Fast path: all frames have the same number of values
+            return data[:, :nChannels].astype(np.float32)
+
+        motion = np.zeros((self.frameCount, nChannels), dtype=np.float32)
+        for frameIdx, line in enumerate(lines):
+            words = line.split()
+            if len(words) < nChannels:
+                raise RuntimeError('Expected %s channel values for frame %s found %s' % (nChannels, frameIdx, len(words)))
+            motion[frameIdx] = [float(word) for word in words[:nChannels]]
+        return motion
 
     def __calcPosition(self, joint, offset):
         """
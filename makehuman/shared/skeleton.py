@@ -217,8 +217,7 @@ class Skeleton(object):
                 add_count = 0
                 for rbname in bone.weight_reference_bones:
                     if rbname in referenceWeights.data:
-                        vrts,wghs = referenceWeights.data[rbname]
-                        b_weights.extend( list(zip(vrts,wghs)) )
+                        b_weights.append(referenceWeights.data[rbname])
                         add_count += 1
                     else:
                         if not makehuman.isRelease():
@@ -241,8 +240,7 @@ class Skeleton(object):
                 # Try to map by bone name
                 if bone.name in referenceWeights.data:
                     # Implicitly map bone by name to reference skeleton weights
-                    vrts,wghs = referenceWeights.data[bone.name]
-                    b_weights = list(zip(vrts,wghs))
+                    b_weights = [referenceWeights.data[bone.name]]
                 else:
                     if not makehuman.isRelease():
                         # This warning is emitted when no matching bones in the reference skeleton can be found, and
@@ -254,7 +252,8 @@ class Skeleton(object):
                         log.debug("No explicit weight reference bone mapping for bone %s, and cannot implicitly map by name. This bone will not have any weights. This might be normal if this is for example a proxy only weighted to a few bones.", bone.name)
 
             if len(b_weights) > 0:
-                weights[bone.name] = b_weights
+                weights[bone.name] = (np.concatenate([vrts for vrts,_ in b_weights]),
+                                      np.concatenate([wghs for _,wghs in b_weights]))
 
         vertWeights = referenceWeights.create(weights, vertexCount=referenceWeights.vertexCount, rootBone=self.roots[0].name)
         if self.vertexWeights is None:
@@ -509,6 +508,7 @@ class Skeleton(object):
             raise RuntimeError("The skeleton %s already contains a bone named %s." % (self.__repr__(), name))
         bone = Bone(self, name, parentName, headJoint, tailJoint, roll, reference_bones, weight_reference_bones)
         self.bones[name] = bone
+        self.boneslist = None
         if not parentName:
             self.roots.append(bone)
         return bone
@@ -526,8 +526,9 @@ class Skeleton(object):
         """
         Update skeleton pose matrices after setting a new pose.
         """
-        for bone in self.getBones():
-            bone.update()
+        self.getBones()
+        self._matPoseGlobal[:] = self._forwardKinematics(self._matPose)
+        self._matPoseVerts[:] = np.matmul(self._matPoseGlobal, self._matRestGlobalInv)
 
     def updateJoints(self, humanMesh, ref_skel=None):
         """
@@ -555,13 +556,8 @@ class Skeleton(object):
 
         returns     np.array((nBones, 4, 4), dtype=float32)
         """
-        nBones = self.getBoneCount()
-        poseMats = np.zeros((nBones,4,4),dtype=np.float32)
-
-        for bIdx, bone in enumerate(self.getBones()):    # TODO eliminate loop?
-            poseMats[bIdx] = bone.matPose
-
-        return poseMats
+        self.getBones()
+        return self._matPose.copy()
 
     def setPose(self, poseMats):
         """
@@ -572,25 +568,67 @@ class Skeleton(object):
 
         poseMats    np.array((nBones, 4, 4), dtype=float32)
         """
-        for bIdx, bone in enumerate(self.getBones()):
-            bone.matPose = np.identity(4, dtype=np.float32)
+        self.getBones()
+        self._matPose[:] = self._poseToLocal(poseMats)
+        self.update()
+
+    def getSkinningMatrices(self, poseMats):
+        """
+        Calculate the skinning matrices (matPoseVerts of each bone) that
+        result from setting the specified poses, for many frames at once and
+        without changing the pose of this skeleton.
+        Performs the same calculations as setPose() followed by update(), for
+        all frames with batched matrix multiplications.
+
+        poseMats    np.array((nFrames, nBones, 4, 4), dtype=float32)
+            or (nFrames, nBones, 3, 4), pose matrices per frame, with bones in
+            breadth-first order (same order as getBones())
+
+        returns     np.array((nFrames, nBones, 4, 4), dtype=float32)
+        """
+        self.getBones()
+        matPoseGlobal = self._forwardKinematics(self._poseToLocal(poseMats))
+        return np.matmul(matPoseGlobal, self._matRestGlobalInv)
 
-            # Calculate rotations
-            bone.matPose[:3,:3] = poseMats[bIdx,:3,:3]
-            invRest = la.inv(bone.matRestGlobal)
-            bone.matPose = np.dot(np.dot(invRest, bone.matPose), bone.matRestGlobal)
+    def _poseToLocal(self, poseMats):
+        """
+        Convert pose matrices (..., nBones, 4, 4) or (..., nBones, 3, 4) from
+        global coordinates to matPose matrices, relative to the local bone rest
+        axis.
+        """
+        invRest = self._matRestGlobalInv
+        matPose = np.zeros(poseMats.shape[:-2] + (4, 4), dtype=np.float32)
+
+        # Calculate rotations
+        matPose[..., :3, :3] = poseMats[..., :3, :3]
+        matPose[..., 3, 3] = 1
+        matPose = np.matmul(np.matmul(invRest, matPose), self._matRestGlobal)
+
+        # Add translations from original
+        if poseMats.shape[-1] == 4:
+            # Note: we generally only have translations on the root bone
+            # Describe translation in bone-local axis directions
+            trans = poseMats[..., :3, 3, None]
+            matPose[..., :3, 3] = np.matmul(invRest[:, :3, :3], trans)[..., 0]
+        else:
+            # No translation
+            matPose[..., :3, 3] = 0
+        return matPose
 
-            # Add translations from original
-            if poseMats.shape[2] == 4:
-                # Note: we generally only have translations on the root bone
-                trans = poseMats[bIdx,:3,3]
-                trans = np.dot(invRest[:3,:3], trans.T)  # Describe translation in bone-local axis directions
-                bone.matPose[:3,3] = trans.T
+    def _forwardKinematics(self, matPose):
+        """
+        Calculate the global pose matrices (..., nBones, 4, 4) for the
+        specified matPose matrices. Walks the bone hierarchy level by level,
+        processing all bones of one level at once.
+        """
+        matPoseGlobal = np.empty(matPose.shape, dtype=np.float32)
+        for bIdxs, pIdxs in self._levels:
+            local = np.matmul(self._matRestRelative[bIdxs], matPose[..., bIdxs, :, :])
+            if pIdxs is None:
+                matPoseGlobal[..., bIdxs, :, :] = local
             else:
-                # No translation
-                bone.matPose[:3,3] = [0, 0, 0]
-        # TODO avoid this loop, eg by storing a pre-allocated poseMats np array in skeleton and keeping a reference to a sub-array in each bone. It would allow batch processing of all pose matrices in one np call
-        self.update()
+                matPoseGlobal[..., bIdxs, :, :] = np.matmul(matPoseGlobal[..., pIdxs, :, :], local)
+        return matPoseGlobal
 
     def isInRestPose(self):
         for bone in self.getBones():
@@ -599,8 +637,9 @@ class Skeleton(object):
         return True
 
     def setToRestPose(self):
-        for bone in self.getBones():
-            bone.setToRestPose()
+        self.getBones()
+        self._matPose[:] = np.identity(4, dtype=np.float32)
+        self.update()
 
     def skinMesh(self, meshCoords, vertBoneMapping):
         """
@@ -646,6 +685,27 @@ class Skeleton(object):
             queue.extend(bone.children)
         self.boneslist = result
 
+        # Store the matrices of all bones in contiguous arrays, bones keep
+        # views on their own matrix
+        nBones = len(result)
+        for name in Bone.MATRICES:
+            mats = np.zeros((nBones, 4, 4), dtype=np.float32)
+            for bone in result:
+                mats[bone.index] = getattr(bone, '_' + name)
+                setattr(bone, '_' + name, mats[bone.index])
+            setattr(self, '_' + name, mats)
+
+        # Bone indices per hierarchy level, with the indices of their parents
+        self._levels = []
+        levels = np.asarray([bone.level for bone in result], dtype=np.int32)
+        for level in range(levels.max() + 1 if nBones else 0):
+            bIdxs = np.flatnonzero(levels == level)
+            if level == 0:
+                pIdxs = None
+            else:
+                pIdxs = np.asarray([result[bIdx].parent.index for bIdx in bIdxs], dtype=np.intp)
+            self._levels.append( (bIdxs, pIdxs) )
+
     def getJointNames(self):
         """
         Returns a list of all joints defining the bone positions (minus end
@@ -695,8 +755,30 @@ class Skeleton(object):
         # TODO compare two skeletons (structure only)
 
 
+def _boneMatrix(name):
+    """
+    Property giving access to a matrix of a bone. Assigning copies the value
+    into the bone's matrix, which is a view on the matrix array of its
+    skeleton once the bone list of the skeleton is built.
+    """
+    attr = '_' + name
+
+    def getter(self):
+        return getattr(self, attr)
+
+    def setter(self, value):
+        getattr(self, attr)[...] = value
+
+    return property(getter, setter)
+
+
 class Bone(object):
 
+    # Matrices of this bone, stored in contiguous (nBones, 4, 4) arrays in the
+    # skeleton
+    MATRICES = ['matRestGlobal', 'matRestGlobalInv', 'matRestRelative',
+                'matPose', 'matPoseGlobal', 'matPoseVerts']
+
     def __init__(self, skel, name, parentName, headJoint, tailJoint, roll=0, reference_bones=None, weight_reference_bones=None):
         """
         Construct a new bone for specified skeleton.
@@ -747,17 +829,35 @@ class Bone(object):
         # Matrices:
         # static
         #  matRestGlobal:     4x4 rest matrix, relative world (bind pose matrix)
+        #  matRestGlobalInv:  4x4 inverse of matRestGlobal, updated when it is set
         #  matRestRelative:   4x4 rest matrix, relative parent
         # posed
         #  matPose:           4x4 pose matrix, relative parent and own rest pose
         #  matPoseGlobal:     4x4 matrix, relative world
         #  matPoseVerts:      4x4 matrix, relative world and own rest pose
+        # All matrices are views on the arrays of the skeleton once it has
+        # built its bone list.
+        for name in Bone.MATRICES:
+            setattr(self, '_' + name, np.identity(4, np.float32))  # Pose matrix is in rest pose
+
+    @property
+    def matRestGlobal(self):
+        return self._matRestGlobal
+
+    @matRestGlobal.setter
+    def matRestGlobal(self, value):
+        self._matRestGlobal[...] = value
+        try:
+            self._matRestGlobalInv[...] = la.inv(self._matRestGlobal)
+        except la.LinAlgError:
+            log.debug("Cannot calculate inverse rest matrix for bone %s %s %s", self.name, self.getRestHeadPos(), self.getRestTailPos())
+            log.debug("Non-singular rest matrix %s", self._matRestGlobal)
 
-        self.matRestGlobal = None
-        self.matRestRelative = None
-        self.matPose = np.identity(4, np.float32)  # Set pose matrix to rest pose
-        self.matPoseGlobal = None
-        self.matPoseVerts = None
+    matRestGlobalInv = _boneMatrix('matRestGlobalInv')
+    matRestRelative = _boneMatrix('matRestRelative')
+    matPose = _boneMatrix('matPose')
+    matPoseGlobal = _boneMatrix('matPoseGlobal')
+    matPoseVerts = _boneMatrix('matPoseVerts')
 
     @property
     def planes(self):
@@ -848,7 +948,7 @@ class Bone(object):
         self.matRestGlobal = getMatrix(head3, tail3, normal)
         self.length = matrix.magnitude(tail3 - head3)
         if self.parent:
-            self.matRestRelative = np.dot(la.inv(self.parent.matRestGlobal), self.matRestGlobal)
+            self.matRestRelative = np.dot(self.parent.matRestGlobalInv, self.matRestGlobal)
         else:
             self.matRestRelative = self.matRestGlobal
 
@@ -905,11 +1005,7 @@ class Bone(object):
         else:
             self.matPoseGlobal = np.dot(self.matRestRelative, self.matPose)
 
-        try:
-            self.matPoseVerts = np.dot(self.matPoseGlobal, la.inv(self.matRestGlobal))
-        except:
-            log.debug("Cannot calculate pose verts matrix for bone %s %s %s", self.name, self.getRestHeadPos(), self.getRestTailPos())
-            log.debug("Non-singular rest matrix %s", self.matRestGlobal)
+        self.matPoseVerts = np.dot(self.matPoseGlobal, self.matRestGlobalInv)
 
     def getHead(self):
         """
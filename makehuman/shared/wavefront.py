@@ -39,102 +39,189 @@ Abstract
 
 import os
 import module3d
+from export import writeRows
 import codecs
+import re
+import warnings
 import math
 import numpy as np
 import io  # TODO should Wavefront OBJ files contain unicode characters, or would it be better to strip them?
 
+def _parseNumbers(text, dtype):
+    """
+    Convert all whitespace separated numbers in text to a flat array.
+    """
+    with warnings.catch_warnings():
+        # Malformed data is detected by the caller from the number of values
+        warnings.simplefilter('ignore', DeprecationWarning)
+        return np.fromstring(text, dtype=dtype, sep=' ')
+
+def _parseRows(lines, width, dtype):
+    """
+    Convert the whitespace separated numbers on each of the given lines to a
+    (len(lines), width) array, ignoring numbers beyond the first width ones.
+    Like an empty list, no lines give an empty 1D array.
+    """
+    if not lines:
+        return np.zeros(0, dtype=dtype)
+    values = _parseNumbers(" ".join(lines), dtype)
+    if len(values) == width * len(lines):
+        # Fast path: all lines have exactly width numbers
+        return values.reshape(-1, width)
+    return np.array([line.split()[:width] for line in lines], dtype=dtype)
+
+# Regular expressions finding the data of all lines of an OBJ command, in
+# OBJ data normalized to start with a newline and use single spaces
+_COMMAND_DATA = dict( (command, re.compile(r'\n%s ([^\n]*)' % command))
+    for command in ['v', 'vt', 'f', 'o'] )
+
+# Regular expression matching leading whitespace of lines
+_LEADING_SPACE = re.compile(r'^[ \t]+', re.MULTILINE)
+
+def _parseFaces(lines, path):
+    """
+    Convert the data of OBJ face lines (in v, v/vt, v/vt/vn or v//vn notation)
+    to arrays of 0-based vertex and UV indices with 4 entries per face,
+    triangles repeating their first vertex. Faces without UV indices get UV
+    indices 0. Returns (fverts, fuvs, has_uv).
+    """
+    nfaces = len(lines)
+    text = "\n".join(lines)
+
+    # Locate the vertex references (whitespace separated tokens) in the text
+    chars = np.frombuffer(text.encode('utf-8'), dtype=np.uint8)
+    isSpace = np.concatenate([[True], chars <= ord(' '), [True]])
+    edges = np.diff(isSpace.astype(np.int8))
+    starts = np.flatnonzero(edges == -1)
+    ends = np.flatnonzero(edges == 1)
+
+    faceIdx = np.searchsorted(np.flatnonzero(chars == ord('\n')), starts)
+    nPerFace = np.bincount(faceIdx, minlength=nfaces).astype(np.int32)
+    if not np.all((nPerFace == 3) | (nPerFace == 4)):
+        import log
+        msg = "Error loading OBJ file %s: Contains faces that are not triangles or quads"
+        log.error(msg, path)
+        raise RuntimeError(msg % path)
+
+    # Determine the notation from the slashes in the references
+    isSlash = chars == ord('/')
+    slashPos = np.flatnonzero(isSlash)
+    nSlashes = np.searchsorted(slashPos, ends) - np.searchsorted(slashPos, starts)
+    doublePos = slashPos[:-1][np.diff(slashPos) == 1]
+    nDoubles = np.searchsorted(doublePos, ends) - np.searchsorted(doublePos, starts)
+    emptyEdge = np.any(isSlash[starts]) or np.any(isSlash[ends - 1])
+
+    if np.all(nSlashes == 0):
+        step, hasUv = 1, False                      # v
+    elif emptyEdge:
+        step = None
+    elif np.all(nSlashes == 1):
+        step, hasUv = 2, True                       # v/vt
+    elif np.all(nSlashes == 2) and not np.any(nDoubles):
+        step, hasUv = 3, True                       # v/vt/vn
+    elif np.all(nSlashes == 2) and np.all(nDoubles == 1):
+        step, hasUv = 2, False                      # v//vn
+    else:
+        step = None
+
+    if step is not None:
+        idx = _parseNumbers(text.replace('/', ' '), np.int64)
+    if step is None or len(idx) != step * len(starts):
+        # Not all references use the same notation, or indices that are not integers
+        return _parseMixedFaces(text.split(), nPerFace)
+
+    fverts = _toQuads(idx[0::step] - 1, nPerFace)
+    if not hasUv:
+        return fverts, np.zeros((nfaces, 4), dtype=np.int64), False
+    return fverts, _toQuads(idx[1::step] - 1, nPerFace), True
+
+def _parseMixedFaces(refs, nPerFace):
+    """
+    Fallback of _parseFaces for files that mix vertex reference notations.
+    """
+    vIdx = np.empty(len(refs), dtype=np.int64)
+    uvIdx = np.full(len(refs), -1, dtype=np.int64)
+    for i, ref in enumerate(refs):
+        vInfo = ref.split('/')
+        vIdx[i] = int(vInfo[0])
+        if len(vInfo) > 1 and vInfo[1] != '':
+            uvIdx[i] = int(vInfo[1])
+
+    fverts = _toQuads(vIdx - 1, nPerFace)
+    fuvs = _toQuads(uvIdx - 1, nPerFace)
+    # Faces with incomplete UV references get UV indices 0
+    fuvs[np.any(fuvs < 0, axis=1)] = 0
+    return fverts, fuvs, bool(np.any(uvIdx >= 0))
+
+def _toQuads(indices, nPerFace):
+    """
+    Arrange the flat per face indices of faces with nPerFace (3 or 4) indices
+    in a (nfaces, 4) array, triangles repeating their first index.
+    """
+    starts = np.zeros(len(nPerFace), dtype=np.int64)
+    np.cumsum(nPerFace[:-1], out=starts[1:])
+    columns = np.arange(4)
+    columns = np.where(columns[None,:] < nPerFace[:,None], columns[None,:], 0)
+    return indices[starts[:,None] + columns]
+
 def loadObjFile(path, obj = None):
     """
     Parse and load a Wavefront OBJ file as mesh.
     Parser does not support normals, and assumes all objects should be smooth
     shaded. Use duplicate vertices for achieving hard edges.
+    Lines are only picked by command while reading, vertex, UV and face data
+    is converted with numpy in bulk.
     """
     if obj is None:
         name = os.path.splitext( os.path.basename(path) )[0]
         obj = module3d.Object3D(name)
 
     with open(path, 'r', encoding="utf-8") as objFile:
+        text = objFile.read()
+
+    # Normalize separators so that lines can be found by their command
+    text = '\n' + text.replace('\t', ' ')
+    if '\n ' in text:
+        text = _LEADING_SPACE.sub('', text)
+
+    # Vertex coordinates
+    verts = _COMMAND_DATA['v'].findall(text)
+
+    # Vertex texture (UV) coordinates
+    uvs = _COMMAND_DATA['vt'].findall(text)
+
+    for objName in _COMMAND_DATA['o'].findall(text):
+        obj.name = objName.split()[0]
+
+    # Face definitions (reference to vertex attributes), in runs of faces per
+    # group: the faces before the first group, then the faces of each group
+    # after the line with its name
+    faces = []
+    groupCounts = []    # (face group index, number of faces) for each run
+    faceGroups = {}
+    for runIdx, run in enumerate(text.split('\ng ')):
+        runFaces = _COMMAND_DATA['f'].findall(run)
+        if runIdx > 0:
+            fgName = run.split(None, 1)[0]
+            if fgName not in faceGroups:
+                faceGroups[fgName] = obj.createFaceGroup(fgName)
+            fg = faceGroups[fgName]
+        elif runFaces:
+            fg = obj.createFaceGroup('default-dummy-group')
+        else:
+            continue
+        faces.extend(runFaces)
+        groupCounts.append((fg.idx, len(runFaces)))
 
-        fg = None
-        mtl = None
-
-        verts = []
-        uvs = []
-        fverts = []
-        fuvs = []
-        groups = []
-        has_uv = False
-        materials = {}
-        faceGroups = {}
-
-        for objData in objFile:
-
-            lineData = objData.split()
-            if len(lineData) > 0:
-
-                command = lineData[0]
-
-                # Vertex coordinate
-                if command == 'v':
-                    verts.append((float(lineData[1]), float(lineData[2]), float(lineData[3])))
-
-                # Vertex texture (UV) coordinate
-                elif command == 'vt':
-                    uvs.append((float(lineData[1]), float(lineData[2])))
-
-                # Face definition (reference to vertex attributes)
-                elif command == 'f':
-                    if not fg:
-                        if 0 not in faceGroups:
-                            faceGroups[0] = obj.createFaceGroup('default-dummy-group')
-                        fg = faceGroups[0]
-
-                    uvIndices = []
-                    vIndices = []
-                    for faceData in lineData[1:]:
-                        vInfo = faceData.split('/')
-                        vIdx = int(vInfo[0]) - 1  # -1 because obj is 1 based list
-                        vIndices.append(vIdx)
-
-                        # If there are other data (uv, normals, etc)
-                        if len(vInfo) > 1 and vInfo[1] != '':
-                            uvIndex = int(vInfo[1]) - 1  # -1 because obj is 1 based list
-                            uvIndices.append(uvIndex)
-
-                    if len(vIndices) == 3:
-                        vIndices.append(vIndices[0])
-                    fverts.append(tuple(vIndices))
-
-                    if len(uvIndices) > 0:
-                        if len(uvIndices) == 3:
-                            uvIndices.append(uvIndices[0])
-                        has_uv = True
-                    if len(uvIndices) < 4:
-                        uvIndices = [0, 0, 0, 0]
-                    fuvs.append(tuple(uvIndices))
-
-                    groups.append(fg.idx)
-
-                elif command == 'g':
-                    fgName = lineData[1]
-                    if fgName not in faceGroups:
-                        faceGroups[fgName] = obj.createFaceGroup(fgName)
-                    fg =  faceGroups[fgName]
-
-                elif command == 'usemtl':
-                    pass # ignore materials
-
-                elif command == 'o':
+    verts = _parseRows(verts, 3, np.float64)
+    uvs = _parseRows(uvs, 2, np.float64)
+    fverts, fuvs, has_uv = _parseFaces(faces, path)
 
-                    obj.name = lineData[1]
+    groupIdxs, counts = np.array(groupCounts, dtype=np.int64).reshape(-1, 2).T
+    groups = np.repeat(groupIdxs, counts)
 
     # Sanity check for loose vertices
-    strayVerts = []
-    referencedVerts = set([ v for fvert in fverts for v in fvert ])
-    for vIdx in range(len(verts)):
-        if vIdx not in referencedVerts:
-            strayVerts.append(vIdx)
+    strayVerts = np.setdiff1d(np.arange(len(verts)), fverts).tolist()
     if len(strayVerts) > 0:
         import log
         msg = "Error loading OBJ file %s: Contains loose vertices, not connected to a face (%s)"
@@ -151,14 +238,30 @@ def loadObjFile(path, obj = None):
     return obj
 
 
-def writeObjFile(path, meshes, writeMTL=True, config=None, filterMaskedFaces=True):
+# Compression level of gzip compressed OBJ files (zlib's default trade-off
+# between size and speed, level 9 is several times slower on OBJ text)
+GZIP_LEVEL = 6
+
+def writeObjFile(path, meshes, writeMTL=True, config=None, filterMaskedFaces=True, compress=None):
+    """
+    Write meshes to a Wavefront OBJ file (and their materials to an MTL file
+    next to it if writeMTL is True).
+    The file is written gzip compressed if compress is True, or if compress
+    is None and path ends with .gz (the MTL file is not compressed).
+    """
     if not isinstance(meshes, list):
         meshes = [meshes]
 
+    if compress is None:
+        compress = not isinstance(path, io.IOBase) and path.endswith('.gz')
+
     if isinstance(path, io.IOBase):
         fp = path
+    elif compress:
+        import gzip
+        fp = io.TextIOWrapper(io.BufferedWriter(gzip.open(path, 'wb', compresslevel=GZIP_LEVEL), buffer_size=1 << 20), encoding="utf-8")
     else:
-        fp = open(path, 'w', encoding="utf-8")
+        fp = open(path, 'w', encoding="utf-8", buffering=1 << 20)
 
 
     fp.write(
@@ -166,74 +269,64 @@ def writeObjFile(path, meshes, writeMTL=True, config=None, filterMaskedFaces=Tru
         "# www.makehumancommunity.org\n\n")
 
     if writeMTL:
-        mtlfile = path.replace(".obj",".mtl")
+        if path.endswith('.gz'):
+            mtlfile = path[:-len('.gz')]
+        else:
+            mtlfile = path
+        mtlfile = mtlfile.replace(".obj",".mtl")
         fp.write("mtllib %s\n" % os.path.basename(mtlfile))
 
     scale = config.scale if config is not None else 1.0
 
-    # Scale and filter out masked faces and unused verts
-    if filterMaskedFaces:
-        meshes = [m.clone(scale=scale, filterMaskedVerts=True) for m in meshes]
-    else:
-        # Unfiltered
-        meshes = [m.clone(scale=scale, filterMaskedVerts=False) for m in meshes]
+    # Scale and filter out masked faces and unused verts, meshes that are 
+    # already a MeshView are written as they are
+    meshes = [m if isinstance(m, module3d.MeshView) else 
+              module3d.MeshView(m, scale, filterMaskedVerts=filterMaskedFaces) for m in meshes]
 
     if config and config.feetOnGround:
         offset = config.offset
     else:
         offset = [0,0,0]
 
+    useNormals = config is None or config.useNormals
+
     # Vertices
     for mesh in meshes:
-        fp.write("".join( ["v %.4f %.4f %.4f\n" % tuple(co + offset) for co in mesh.coord] ))
+        writeRows(fp, "v %.4f %.4f %.4f\n", mesh.coord + offset)
 
     # Vertex normals
-    if config is None or config.useNormals:
+    if useNormals:
         for mesh in meshes:
-            fp.write("".join( ["vn %.4f %.4f %.4f\n" % tuple(no) for no in mesh.vnorm] ))
+            writeRows(fp, "vn %.4f %.4f %.4f\n", mesh.vnorm)
 
     # UV vertices
     for mesh in meshes:
         if mesh.has_uv:
-            fp.write("".join( ["vt %.6f %.6f\n" % tuple(uv) for uv in mesh.texco] ))
+            writeRows(fp, "vt %.6f %.6f\n", mesh.texco)
 
     # Faces
     nVerts = 1
     nTexVerts = 1
     for mesh in meshes:
         nPerFace = mesh.vertsPerFaceForExport
-        # print ("Export " + str (nPerFace) + "-faced mesh")
         fp.write("usemtl %s\n" % mesh.material.name)
         fp.write("g %s\n" % mesh.name)
 
-        if config is None or config.useNormals:
+        face_mask = mesh.face_mask
+        fverts = mesh.fvert[face_mask][:,:nPerFace].astype(np.int64) + nVerts
+        if mesh.has_uv:
+            fuvs = mesh.fuvs[face_mask][:,:nPerFace].astype(np.int64) + nTexVerts
+
+        if useNormals:
             if mesh.has_uv:
-                for fn,fv in enumerate(mesh.fvert):
-                    if not mesh.face_mask[fn]:
-                        continue
-                    fuv = mesh.fuvs[fn]
-                    line = [" %d/%d/%d" % (fv[n]+nVerts, fuv[n]+nTexVerts, fv[n]+nVerts) for n in range(nPerFace)]
-                    fp.write("f" + "".join(line) + "\n")
+                writeRows(fp, "f" + " %d/%d/%d" * nPerFace + "\n", np.dstack([fverts, fuvs, fverts]))
             else:
-                for fn,fv in enumerate(mesh.fvert):
-                    if not mesh.face_mask[fn]:
-                        continue
-                    line = [" %d//%d" % (fv[n]+nVerts, fv[n]+nVerts) for n in range(nPerFace)]
-                    fp.write("f" + "".join(line) + "\n")
+                writeRows(fp, "f" + " %d//%d" * nPerFace + "\n", np.dstack([fverts, fverts]))
         else:
             if mesh.has_uv:
-                for fn,fv in enumerate(mesh.fvert):
-                    if not mesh.face_mask[fn]:
-                        continue
-                    fuv = mesh.fuvs[fn]
-                    line = [" %d/%d" % (fv[n]+nVerts, fuv[n]+nTexVerts) for n in range(nPerFace)]
-                    fp.write("f" + "".join(line) + "\n")
+                writeRows(fp, "f" + " %d/%d" * nPerFace + "\n", np.dstack([fverts, fuvs]))
             else:
-                for fn,fv in enumerate(mesh.fvert):
-                    if not mesh.face_mask[fn]:
-                        continue
-                    line = [" %d" % (fv[n]+nVerts) for n in range(nPerFace)]
-                    fp.write("f" + "".join(line) + "\n")
+                writeRows(fp, "f" + " %d" * nPerFace + "\n", fverts)
 
         nVerts += len(mesh.coord)
         nTexVerts += len(mesh.texco)
@@ -0,0 +1,1186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Performance benchmarks
+
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehumancommunity.org/
+
+**Github Code Home Page:**    https://github.com/makehumancommunity/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2020
+
+**Licensing:**         AGPL3
+
+    This file is part of MakeHuman Community (www.makehumancommunity.org).
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+Abstract
+--------
+
+Standalone benchmarks comparing optimized code paths with the reference
+implementations they replaced, and verifying that both produce the same
+result. Run from the makehuman directory:
+
+    python testsuite/benchmark.py [benchmark ...]
+"""
+
+import sys
+sys.path = [".", "./core", "./lib", "./shared", "./apps"] + sys.path
+import os
+import time
+import numpy as np
+
+
+def timeit(func, repeat=3):
+    """
+    Best wall clock time of repeat calls of func.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        duration = time.perf_counter() - start
+        if best is None or duration < best:
+            best = duration
+    return best
+
+def report(name, reference, optimized):
+    print("%-40s reference %8.2f ms   optimized %8.2f ms   speedup %5.1fx" % (name, 1000*reference, 1000*optimized, reference/optimized))
+
+
+def _loadTargetTextReference(target, path):
+    """
+    Line by line .target parser, as used before the bulk parser.
+    """
+    import algos3d
+    license = algos3d.defaultTargetLicense()
+    lines = []
+    with open(path, 'r', encoding='utf-8') as fd:
+        for line in fd:
+            line = line.strip()
+            if line.startswith('#'):
+                license.updateFromComment(line)
+                continue
+            lines.append(line)
+    raw = target._parse_text_lines('\n'.join(lines))
+    return raw['index'], raw['vector'], license
+
+def benchTargets():
+    """
+    Parsing of ascii .target files.
+    """
+    import algos3d
+    import getpath
+
+    paths = []
+    for root, dirs, files in os.walk(getpath.getSysDataPath('targets')):
+        paths.extend([os.path.join(root, f) for f in files if f.endswith('.target')])
+    paths.sort(key=os.path.getsize)
+    if not paths:
+        print("No .target files found")
+        return
+
+    target = algos3d.Target(None, None)
+    for path in [paths[0], paths[len(paths)//2], paths[-1]]:
+        index, vector, _ = _loadTargetTextReference(target, path)
+        target._load_text(path)
+        assert np.array_equal(index, target.verts) and np.array_equal(vector, target.data)
+        name = "%s (%d verts)" % (os.path.basename(path), len(index))
+        report(name, timeit(lambda: _loadTargetTextReference(target, path)), timeit(lambda: target._load_text(path)))
+
+    sample = paths[::max(1, len(paths)//100)]
+    report("%d targets" % len(sample),
+           timeit(lambda: [_loadTargetTextReference(target, p) for p in sample], 1),
+           timeit(lambda: [target._load_text(p) for p in sample], 1))
+
+def _updateFacesReference(obj, resize = False):
+    """
+    Per face and vertex loop implementation of Object3D._update_faces, as used
+    before the vectorized one.
+    """
+    nverts = len(obj.coord)
+    obj.nfaces = np.zeros(nverts, dtype=np.uint8)
+
+    for idx, vert in enumerate(obj.fvert):
+        for i in range (0, min(len(vert), obj.vertsPerFaceForExport)):
+            vn = vert[i]
+            if obj.nfaces[vn] >= obj.MAX_FACES:
+                raise RuntimeError('Incompatible mesh topology.')
+            obj.vface[vn,obj.nfaces[vn]] = idx
+            obj.nfaces[vn] +=1
+
+    imax = i+1
+
+    if resize is True:
+        newmax = np.max(obj.nfaces)
+        maxpole = 0
+        for vn, row in enumerate(obj.vface):
+            noticed = np.zeros(obj.MAX_FACES * 4, dtype = int)
+            m = 0
+            for j in range (0, obj.nfaces[vn]):
+                face = row[j]
+                for ix,v2 in enumerate(obj.fvert[face]):
+                    if (v2 == vn):
+                        ln = obj.fvert[face][(ix-1) %imax]
+                        rn = obj.fvert[face][(ix+1) %imax]
+                        if ln not in noticed:
+                            noticed[m] = ln
+                            m += 1
+                        if rn not in noticed:
+                            noticed[m] = rn
+                            m += 1
+                        break
+            if m > maxpole:
+                maxpole = m
+
+        if newmax < maxpole:
+            newmax = maxpole
+        if newmax < 4:
+            newmax = 4
+        if newmax != obj.MAX_FACES:
+            obj.vface = np.delete (obj.vface, np.s_[newmax::], 1)
+            obj.MAX_FACES = newmax
+
+def _runWithSkeleton(func):
+    """
+    Call func with the default skeleton, fitted to the unmodified basemesh.
+    """
+    import types
+    import files3d
+    import getpath
+    import skeleton
+    from core import G
+
+    path = getpath.getSysDataPath('rigs/default.mhskel')
+    if not os.path.isfile(path):
+        print("No default rig found")
+        return
+    mesh = files3d.loadMesh(getpath.getSysDataPath('3dobjs/base.obj'))
+
+    # Skeleton joint positions are looked up on the selected human, here the
+    # basemesh
+    app = G.app
+    G.app = types.SimpleNamespace(progress=None, selectedHuman=types.SimpleNamespace(meshData=mesh, getRestposeCoordinates=lambda: mesh.coord))
+    try:
+        func(skeleton.load(path))
+    finally:
+        G.app = app
+
+def _randomPoses(nFrames, nBones, rng):
+    """
+    Random rotations of all bones, and a moving root bone.
+    """
+    import transformations as tm
+
+    poseData = np.zeros((nFrames*nBones, 3, 4), dtype=np.float32)
+    for idx, angles in enumerate(rng.uniform(-0.5, 0.5, (nFrames*nBones, 3))):
+        poseData[idx] = tm.euler_matrix(*angles)[:3,:4]
+    poseData[::nBones,:,3] = rng.uniform(-1, 1, (nFrames, 3))
+    return poseData
+
+def _setPoseReference(skel, poseMats):
+    """
+    Per bone implementation of Skeleton.setPose, as used before the skeleton
+    stored its matrices in arrays.
+    """
+    import numpy.linalg as la
+
+    for bIdx, bone in enumerate(skel.getBones()):
+        matPose = np.identity(4, dtype=np.float32)
+        matPose[:3,:3] = poseMats[bIdx,:3,:3]
+        invRest = la.inv(bone.matRestGlobal)
+        matPose = np.dot(np.dot(invRest, matPose), bone.matRestGlobal)
+        trans = poseMats[bIdx,:3,3]
+        matPose[:3,3] = np.dot(invRest[:3,:3], trans.T).T
+        bone.matPose = matPose
+    for bone in skel.getBones():
+        if bone.parent:
+            bone.matPoseGlobal = np.dot(bone.parent.matPoseGlobal, np.dot(bone.matRestRelative, bone.matPose))
+        else:
+            bone.matPoseGlobal = np.dot(bone.matRestRelative, bone.matPose)
+        bone.matPoseVerts = np.dot(bone.matPoseGlobal, la.inv(bone.matRestGlobal))
+
+def _bakeReference(anim, skel):
+    """
+    Frame by frame implementation of AnimationTrack.bake, as used before the
+    batched one. Returns the baked data.
+    """
+    bones = skel.getBones()
+    old_pose = skel.getPose()
+    baked = np.zeros((anim.dataLen, 3, 4))
+
+    for f_idx in range(anim.nFrames):
+        i = f_idx * anim.nBones
+        _setPoseReference(skel, anim._data[i:i+anim.nBones])
+        for b_idx in range(anim.nBones):
+            idx = i + b_idx
+            baked[idx,:,:] = bones[b_idx].matPoseVerts[:3,:4]
+
+    skel.setPose(old_pose)
+    return baked
+
+def benchBake():
+    """
+    Baking animations to skinning matrices.
+    """
+    import animation
+
+    def run(skel):
+        nBones = skel.getBoneCount()
+        rng = np.random.RandomState(0)
+        for nFrames in [10, 500]:
+            anim = animation.AnimationTrack('benchmark', _randomPoses(nFrames, nBones, rng), nFrames, 24)
+            reference = _bakeReference(anim, skel)
+            anim.bake(skel)
+            assert np.allclose(reference, anim.data, atol=1e-5)
+            report("%d bones, %d frames" % (nBones, nFrames),
+                   timeit(lambda: _bakeReference(anim, skel), 1),
+                   timeit(lambda: anim.bake(skel)))
+
+    _runWithSkeleton(run)
+
+def benchPose():
+    """
+    Setting the pose of a skeleton.
+    """
+    def run(skel):
+        nBones = skel.getBoneCount()
+        poseMats = _randomPoses(1, nBones, np.random.RandomState(0))
+        _setPoseReference(skel, poseMats)
+        reference = np.array([bone.matPoseVerts for bone in skel.getBones()])
+        skel.setPose(poseMats)
+        assert np.allclose(reference, [bone.matPoseVerts for bone in skel.getBones()], atol=1e-5)
+        report("%d bones, setPose" % nBones,
+               timeit(lambda: _setPoseReference(skel, poseMats), 10),
+               timeit(lambda: skel.setPose(poseMats), 10))
+
+    _runWithSkeleton(run)
+
+def _getBlendedPoseReference(poseUnit, poses, weights):
+    """
+    Per bone and unit pose implementation of PoseUnit.getBlendedPose (with
+    additive blending), as used before the vectorized one. Returns pose data.
+    """
+    import animation
+    import transformations as tm
+
+    REST_QUAT = np.asarray([1,0,0,0], dtype=np.float32)
+
+    f_idxs = [poseUnit.getPoseNames().index(pname) for pname in poses]
+    result = animation.emptyPose(poseUnit.nBones)
+    m = np.identity(4, dtype=np.float32)
+    m1 = np.identity(4, dtype=np.float32)
+    m2 = np.identity(4, dtype=np.float32)
+
+    if len(f_idxs) == 1:
+        for b_idx in range(poseUnit.nBones):
+            m[:3, :4] = poseUnit.getAtFramePos(f_idxs[0], True)[b_idx]
+            q = tm.quaternion_slerp(REST_QUAT, tm.quaternion_from_matrix(m, True), float(weights[0]))
+            result[b_idx] = tm.quaternion_matrix( q )[:3,:4]
+    else:
+        for b_idx in range(poseUnit.nBones):
+            m1[:3, :4] = poseUnit.getAtFramePos(f_idxs[0], True)[b_idx]
+            m2[:3, :4] = poseUnit.getAtFramePos(f_idxs[1], True)[b_idx]
+            q1 = tm.quaternion_slerp(REST_QUAT, tm.quaternion_from_matrix(m1, True), float(weights[0]))
+            q2 = tm.quaternion_slerp(REST_QUAT, tm.quaternion_from_matrix(m2, True), float(weights[1]))
+            quat = tm.quaternion_multiply(q2, q1)
+
+            for i,f_idx in enumerate(f_idxs[2:]):
+                i += 2
+                m[:3, :4] = poseUnit.getAtFramePos(f_idx, True)[b_idx]
+                q = tm.quaternion_slerp(REST_QUAT, tm.quaternion_from_matrix(m, True), float(weights[i]))
+                quat = tm.quaternion_multiply(q, quat)
+
+            result[b_idx] = tm.quaternion_matrix( quat )[:3,:4]
+
+    return result
+
+def benchBlendPoses():
+    """
+    Blending face unit poses into expressions.
+    """
+    import json
+    import getpath
+    import animation
+    import bvh
+
+    bvhPath = getpath.getSysDataPath('poseunits/face-poseunits.bvh')
+    jsonPath = getpath.getSysDataPath('poseunits/face-poseunits.json')
+    if not os.path.isfile(bvhPath) or not os.path.isfile(jsonPath):
+        print("No face unit poses found")
+        return
+    with open(jsonPath, 'r', encoding='utf-8') as f:
+        poseNames = json.load(f)['framemapping']
+
+    def run(skel):
+        anim = bvh.load(bvhPath, allowTranslation="none").createAnimationTrack(skel)
+        poseUnit = animation.PoseUnit(anim.name, anim._data, poseNames)
+
+        # Random expressions, each combining a few unit poses
+        rng = np.random.RandomState(0)
+        weights = rng.uniform(0, 1, (100, len(poseNames)))
+        weights[rng.uniform(0, 1, weights.shape) < 0.85] = 0
+        for w in weights[:10]:
+            poses = [name for name, v in zip(poseNames, w) if v]
+            values = [v for v in w if v]
+            if poses:
+                reference = _getBlendedPoseReference(poseUnit, poses, values)
+                assert np.allclose(reference, poseUnit.getBlendedPose(poses, values, only_data=True), atol=1e-6)
+        report("%d unit poses, single" % len(poses),
+               timeit(lambda: _getBlendedPoseReference(poseUnit, poses, values)),
+               timeit(lambda: poseUnit.getBlendedPose(poses, values)))
+
+        reference = np.array([_getBlendedPoseReference(poseUnit, [name for name, v in zip(poseNames, w) if v], [v for v in w if v]) for w in weights])
+        assert np.allclose(reference, poseUnit.getBlendedPoses(poseNames, weights), atol=1e-6)
+        report("batch of %d" % len(weights),
+               timeit(lambda: [_getBlendedPoseReference(poseUnit, [name for name, v in zip(poseNames, w) if v], [v for v in w if v]) for w in weights], 1),
+               timeit(lambda: poseUnit.getBlendedPoses(poseNames, weights)))
+
+    _runWithSkeleton(run)
+
+
+def _openBVHMotion(path):
+    """
+    Open a BVH file, positioned at the first frame of its motion data.
+    """
+    fp = open(path, 'r', encoding='utf-8')
+    for line in fp:
+        if line.startswith('Frame Time:'):
+            break
+    return fp
+
+def _readBVHMotionReference(joints, frameCount, fp):
+    """
+    Per line and per joint implementation of reading BVH motion data, as used
+    before the single array one. Returns the channel data per joint.
+    """
+    frames = [[] for joint in joints]
+    for i in range(frameCount):
+        line = fp.readline()
+        words = line.split()
+        data = [float(word) for word in words]
+        for jointFrames, joint in zip(frames, joints):
+            nChannels = len(joint.channels)
+            jointFrames.extend(data[:nChannels])
+            data = data[nChannels:]
+    return frames
+
+def benchBVH():
+    """
+    Reading the motion data of long BVH mocap clips.
+    """
+    import tempfile
+    import getpath
+    import bvh
+
+    srcPath = getpath.getSysDataPath('animations/walks/walk1.bvh')
+    if not os.path.isfile(srcPath):
+        print("No BVH animation found")
+        return
+    with open(srcPath, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    motionStart = [line.startswith('Frame Time:') for line in lines].index(True) + 1
+    header = lines[:motionStart-2]
+    frameTime = lines[motionStart-1]
+    motion = [line for line in lines[motionStart:] if line.strip()]
+
+    # Long clips made by looping the walk cycle
+    tmpdir = tempfile.mkdtemp()
+    for nFrames in [2000, 10000]:
+        path = os.path.join(tmpdir, 'clip%d.bvh' % nFrames)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(header + ['Frames: %d' % nFrames, frameTime]))
+            f.write('\n')
+            f.write('\n'.join(motion[i % len(motion)] for i in range(nFrames)))
+            f.write('\n')
+
+        bvhData = bvh.load(path, convertFromZUp=False)
+        joints = bvhData.getJointsBVHOrder()
+        with _openBVHMotion(path) as fp:
+            reference = _readBVHMotionReference(joints, nFrames, fp)
+        for jointFrames, joint in zip(reference, joints):
+            assert np.array_equal(np.asarray(jointFrames, dtype=np.float32), joint.frames)
+
+        def runReference():
+            with _openBVHMotion(path) as fp:
+                _readBVHMotionReference(joints, nFrames, fp)
+        def runOptimized():
+            with _openBVHMotion(path) as fp:
+                bvhData._BVH__readMotion(fp)
+        report("%d joints, %d frames" % (len(joints), nFrames),
+               timeit(runReference), timeit(runOptimized))
+
+    for filename in os.listdir(tmpdir):
+        os.remove(os.path.join(tmpdir, filename))
+    os.rmdir(tmpdir)
+
+
+def _loadMeshes():
+    """
+    The meshes used for the mesh benchmarks: the basemesh, a high-poly proxy
+    and the subdivided basemesh, as (name, mesh) tuples.
+    """
+    import files3d
+    import getpath
+    import guicommon
+    from catmull_clark_subdivision import createSubdivisionObject
+
+    meshes = []
+    for path in ['3dobjs/base.obj', 'eyes/high-poly/high-poly.obj']:
+        path = getpath.getSysDataPath(path)
+        if os.path.isfile(path):
+            meshes.append( (os.path.basename(path), files3d.loadMesh(path)) )
+    if meshes and meshes[0][0] == 'base.obj':
+        # Highest poly mesh at hand: the subdivided basemesh
+        obj = guicommon.Object(meshes[0][1])
+        subdivided = createSubdivisionObject(obj.mesh)
+        meshes.append( ('subdivided base.obj', subdivided) )
+    return meshes
+
+def benchFaces():
+    """
+    Building the vertex to face adjacency of meshes loaded from .obj files.
+    """
+    meshes = _loadMeshes()
+
+    def run(obj, func, maxFaces):
+        obj.MAX_FACES = maxFaces
+        obj.vface = np.zeros((len(obj.coord), maxFaces), dtype=np.uint32)
+        func(obj, resize=True)
+        return obj.vface.copy(), obj.nfaces.copy(), obj.MAX_FACES
+
+    for name, obj in meshes:
+        reference = run(obj, _updateFacesReference, 8)
+        optimized = run(obj, lambda o, resize: o._update_faces(resize), 8)
+        assert np.array_equal(reference[0], optimized[0]) and np.array_equal(reference[1], optimized[1]) and reference[2] == optimized[2]
+        report("%s (%d faces)" % (name, len(obj.fvert)),
+               timeit(lambda: run(obj, _updateFacesReference, 8), 1),
+               timeit(lambda: run(obj, lambda o, resize: o._update_faces(resize), 8)))
+
+def _calcVertexNormalsReference(obj, ix = None):
+    """
+    Dense implementation of Object3D.calcVertexNormals, gathering the normals
+    of MAX_FACES faces per vertex, as used before the incidence matrix.
+    """
+    if ix is None:
+        ix = np.s_[:]
+    vface = obj.vface[ix]
+    norms = obj.fnorm[vface]
+    norms *= np.arange(obj.MAX_FACES)[None,:,None] < obj.nfaces[ix][:,None,None]
+    norms = np.sum(norms, axis=1)
+    norms /= np.sqrt(np.sum(norms ** 2, axis=-1))[:,None]
+    obj.vnorm[ix] = norms
+
+def benchNormals():
+    """
+    Calculation of vertex normals, for all vertices and for the vertices of a
+    modifier.
+    """
+    import algos3d
+    import getpath
+
+    target = algos3d.Target(None, None)
+    target._load_text(getpath.getSysDataPath('targets/nose/nose-scale-vert-incr.target'))
+
+    for name, obj in _loadMeshes():
+        obj.calcFaceNormals()
+        if name == 'base.obj':
+            subsets = [("all", None), ("nose", target.verts)]
+        else:
+            subsets = [("all", None)]
+        for subset, ix in subsets:
+            _calcVertexNormalsReference(obj, ix)
+            reference = obj.vnorm.copy()
+            obj.calcVertexNormals(ix)
+            assert np.array_equal(reference, obj.vnorm)
+            report("%s, %s (%d verts)" % (name, subset, len(obj.coord) if ix is None else len(ix)),
+                   timeit(lambda: _calcVertexNormalsReference(obj, ix), 10),
+                   timeit(lambda: obj.calcVertexNormals(ix), 10))
+def _updateSubdivisionCoordsReference(obj):
+    """
+    Implementation of SubdivisionObject.update_coords evaluating the 
+    Catmull-Clark rules on every update, as used before the cached stencil.
+    """
+    parent = obj.parent
+    coord = np.zeros(obj.coord.shape, dtype=np.float32)
+
+    bvert = coord[:obj.cbase]            # Base verts
+    cvert = coord[obj.cbase:obj.ebase]  # Poly center verts
+    evert = coord[obj.ebase:]            # Edge verts
+
+    cvert[...] = np.sum(parent.coord[parent.fvert[obj.face_map]], axis=1) / 4
+
+    pcoord = parent.coord[obj.vtx_map]
+
+    iva = obj.evert[:,0,0]  # References to base verts
+    ivb = obj.evert[:,0,1]
+    ic1 = obj.evert[:,1,0]  # References to center verts
+    ic2 = obj.evert[:,1,1]
+
+    va = pcoord[iva]
+    vb = pcoord[ivb]
+    mvert = va + vb
+
+    vc1 = cvert[ic1]
+    vc2 = cvert[ic2]
+    vc = vc1 + vc2
+
+    inedge = (ic1 == ic2)
+
+    evert[...] = np.where(inedge[:,None], mvert / 2, (mvert + vc) / 4)
+
+    nvface = parent.nfaces[obj.vtx_map]
+
+    edgewt = np.arange(obj.MAX_FACES)[None,:,None] < obj.nedges[:,None,None]
+    edgewt2 = edgewt * inedge[obj.vedge][:,:,None]
+    edgewt = edgewt / obj.nedges.astype(np.float32)[:,None,None]
+    nvedge = np.sum(edgewt2, axis=1)
+    oevert = np.sum(mvert[obj.vedge] * edgewt / 2, axis=1)
+    oevert2 = np.sum(mvert[obj.vedge] * edgewt2 / 2, axis=1)
+    facewt = np.arange(obj.MAX_FACES)[None,:,None] < nvface[:,None,None]
+    facewt = facewt / nvface.astype(np.float32)[:,None,None]
+    ofvert = np.sum(cvert[obj.face_rmap[parent.vface[obj.vtx_map]]] * facewt, axis=1)
+    opvert = pcoord
+
+    valid = nvface >= 3
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bvert[...] = np.where(valid[:,None],
+                              np.where((obj.nedges == nvface)[:,None],
+                                       (ofvert + 2 * oevert + (nvface[:,None] - 3) * opvert) / nvface[:,None],
+                                       (oevert2 + opvert) / (nvedge + 1)),
+                              (3 * oevert - ofvert) / 2)
+    return coord
+
+def benchSubdivision():
+    """
+    Updating the coordinates of subdivided meshes after a shape change.
+    """
+    import files3d
+    import getpath
+    import guicommon
+    from catmull_clark_subdivision import createSubdivisionObject
+
+    mesh = files3d.loadMesh(getpath.getSysDataPath('3dobjs/base.obj'), maxFaces=5)
+    obj = guicommon.Object(mesh)
+    rng = np.random.RandomState(0)
+    mesh.coord += rng.uniform(-0.1, 0.1, mesh.coord.shape).astype(np.float32)
+    helpers = mesh.getFaceMaskForGroups([fg.name for fg in mesh.faceGroups if fg.name.startswith('helper')])
+
+    for name, mask in [("base.obj", None), ("base.obj without helpers", ~helpers)]:
+        subdivided = createSubdivisionObject(mesh, mask)
+        reference = _updateSubdivisionCoordsReference(subdivided)
+        subdivided.update_coords()
+        assert np.allclose(reference, subdivided.coord, atol=1e-5)
+        report("%s (%d verts)" % (name, len(subdivided.coord)),
+               timeit(lambda: _updateSubdivisionCoordsReference(subdivided), 10),
+               timeit(lambda: subdivided.update_coords(), 10))
+
+    # Two levels: updating each level in turn, or the composed stencil at once
+    subdivided = createSubdivisionObject(mesh, None, 2)
+    def updateLevels():
+        subdivided.parent.coord[...] = _updateSubdivisionCoordsReference(subdivided.parent)
+        return _updateSubdivisionCoordsReference(subdivided)
+    reference = updateLevels()
+    subdivided.update_coords()
+    assert np.allclose(reference, subdivided.coord, atol=1e-5)
+    report("base.obj, 2 levels (%d verts)" % len(subdivided.coord),
+           timeit(updateLevels, 3),
+           timeit(lambda: subdivided.update_coords(), 3))
+def _loadObjFileReference(path, obj = None):
+    """
+    Line by line implementation of wavefront.loadObjFile, as used before the
+    bulk parser.
+    """
+    import module3d
+
+    if obj is None:
+        name = os.path.splitext( os.path.basename(path) )[0]
+        obj = module3d.Object3D(name)
+
+    with open(path, 'r', encoding="utf-8") as objFile:
+
+        fg = None
+        mtl = None
+
+        verts = []
+        uvs = []
+        fverts = []
+        fuvs = []
+        groups = []
+        has_uv = False
+        materials = {}
+        faceGroups = {}
+
+        for objData in objFile:
+
+            lineData = objData.split()
+            if len(lineData) > 0:
+
+                command = lineData[0]
+
+                # Vertex coordinate
+                if command == 'v':
+                    verts.append((float(lineData[1]), float(lineData[2]), float(lineData[3])))
+
+                # Vertex texture (UV) coordinate
+                elif command == 'vt':
+                    uvs.append((float(lineData[1]), float(lineData[2])))
+
+                # Face definition (reference to vertex attributes)
+                elif command == 'f':
+                    if not fg:
+                        if 0 not in faceGroups:
+                            faceGroups[0] = obj.createFaceGroup('default-dummy-group')
+                        fg = faceGroups[0]
+
+                    uvIndices = []
+                    vIndices = []
+                    for faceData in lineData[1:]:
+                        vInfo = faceData.split('/')
+                        vIdx = int(vInfo[0]) - 1  # -1 because obj is 1 based list
+                        vIndices.append(vIdx)
+
+                        # If there are other data (uv, normals, etc)
+                        if len(vInfo) > 1 and vInfo[1] != '':
+                            uvIndex = int(vInfo[1]) - 1  # -1 because obj is 1 based list
+                            uvIndices.append(uvIndex)
+
+                    if len(vIndices) == 3:
+                        vIndices.append(vIndices[0])
+                    fverts.append(tuple(vIndices))
+
+                    if len(uvIndices) > 0:
+                        if len(uvIndices) == 3:
+                            uvIndices.append(uvIndices[0])
+                        has_uv = True
+                    if len(uvIndices) < 4:
+                        uvIndices = [0, 0, 0, 0]
+                    fuvs.append(tuple(uvIndices))
+
+                    groups.append(fg.idx)
+
+                elif command == 'g':
+                    fgName = lineData[1]
+                    if fgName not in faceGroups:
+                        faceGroups[fgName] = obj.createFaceGroup(fgName)
+                    fg =  faceGroups[fgName]
+
+                elif command == 'usemtl':
+                    pass # ignore materials
+
+                elif command == 'o':
+
+                    obj.name = lineData[1]
+
+    # Sanity check for loose vertices
+    strayVerts = []
+    referencedVerts = set([ v for fvert in fverts for v in fvert ])
+    for vIdx in range(len(verts)):
+        if vIdx not in referencedVerts:
+            strayVerts.append(vIdx)
+    if len(strayVerts) > 0:
+        import log
+        msg = "Error loading OBJ file %s: Contains loose vertices, not connected to a face (%s)"
+        log.error(msg, path, strayVerts)
+        raise RuntimeError(msg % (path, strayVerts))
+
+    obj.setCoords(verts)
+    obj.setUVs(uvs)
+    obj.setFaces(fverts, fuvs if has_uv else None, groups)
+
+    obj.calcNormals()
+    obj.updateIndexBuffer()
+
+    return obj
+
+def benchObjLoader():
+    """
+    Loading meshes from Wavefront .obj files.
+    """
+    import tempfile
+    import getpath
+    import guicommon
+    import wavefront
+
+    paths = []
+    for path in ['3dobjs/base.obj', 'eyes/high-poly/high-poly.obj']:
+        path = getpath.getSysDataPath(path)
+        if os.path.isfile(path):
+            paths.append(path)
+
+    # Stand-in for a dense clothing asset: the subdivided basemesh
+    tmpdir = tempfile.mkdtemp()
+    meshes = _loadMeshes()
+    objects = [guicommon.Object(mesh) for name, mesh in meshes if mesh.object is None]
+    if meshes and meshes[-1][0] == 'subdivided base.obj':
+        path = os.path.join(tmpdir, 'subdivided.obj')
+        wavefront.writeObjFile(path, meshes[-1][1], False)
+        paths.append(path)
+
+    for path in paths:
+        reference = lambda: _loadObjFileReference(path)
+        optimized = lambda: wavefront.loadObjFile(path)
+        ref = reference()
+        opt = optimized()
+        for attr in ['coord', 'texco', 'fvert', 'fuvs', 'group']:
+            assert np.array_equal(getattr(ref, attr), getattr(opt, attr))
+        assert ref.has_uv == opt.has_uv
+        assert [fg.name for fg in ref.faceGroups] == [fg.name for fg in opt.faceGroups]
+        report(os.path.basename(path), timeit(reference), timeit(optimized))
+
+    for filename in os.listdir(tmpdir):
+        os.remove(os.path.join(tmpdir, filename))
+    os.rmdir(tmpdir)
+
+def _writeObjReference(path, meshes):
+    """
+    Per face implementation of wavefront.writeObjFile (without MTL file,
+    with normals), as used before the chunked writer.
+    """
+    with open(path, 'w', encoding="utf-8") as fp:
+        fp.write(
+            "# MakeHuman exported OBJ\n" +
+            "# www.makehumancommunity.org\n\n")
+        for mesh in meshes:
+            fp.write("".join( ["v %.4f %.4f %.4f\n" % tuple(co) for co in mesh.coord] ))
+        for mesh in meshes:
+            fp.write("".join( ["vn %.4f %.4f %.4f\n" % tuple(no) for no in mesh.vnorm] ))
+        for mesh in meshes:
+            if mesh.has_uv:
+                fp.write("".join( ["vt %.6f %.6f\n" % tuple(uv) for uv in mesh.texco] ))
+
+        nVerts = 1
+        nTexVerts = 1
+        for mesh in meshes:
+            nPerFace = mesh.vertsPerFaceForExport
+            fp.write("usemtl %s\n" % mesh.material.name)
+            fp.write("g %s\n" % mesh.name)
+            for fn,fv in enumerate(mesh.fvert):
+                if not mesh.face_mask[fn]:
+                    continue
+                fuv = mesh.fuvs[fn]
+                line = [" %d/%d/%d" % (fv[n]+nVerts, fuv[n]+nTexVerts, fv[n]+nVerts) for n in range(nPerFace)]
+                fp.write("f" + "".join(line) + "\n")
+            nVerts += len(mesh.coord)
+            nTexVerts += len(mesh.texco)
+
+def benchObjWriter():
+    """
+    Writing meshes to Wavefront .obj files.
+    """
+    import tempfile
+    import guicommon
+    import wavefront
+
+    tmpdir = tempfile.mkdtemp()
+    refPath = os.path.join(tmpdir, 'reference.obj')
+    optPath = os.path.join(tmpdir, 'optimized.obj')
+    objects = []
+    for name, mesh in _loadMeshes():
+        if mesh.object is None:
+            objects.append(guicommon.Object(mesh))
+
+        reference = lambda: _writeObjReference(refPath, [mesh])
+        optimized = lambda: wavefront.writeObjFile(optPath, [mesh], False)
+        timeRef = timeit(reference, 1)
+        timeOpt = timeit(optimized, 1)
+        with open(refPath, 'rb') as f1, open(optPath, 'rb') as f2:
+            assert f1.read() == f2.read()
+        report(name, timeRef, timeOpt)
+
+        compressed = lambda: wavefront.writeObjFile(optPath + '.gz', [mesh], False)
+        report(name + " (gzip)", timeRef, timeit(compressed, 1))
+
+    for filename in os.listdir(tmpdir):
+        os.remove(os.path.join(tmpdir, filename))
+    os.rmdir(tmpdir)
+
+def benchMacroWeights():
+    """
+    Evaluation of macro target weights.
+    """
+    import humanmodifier
+
+    targets = humanmodifier.ManagedTargetModifier.findTargets('macrodetails-height')
+    if not targets:
+        print("No macro targets found")
+        return
+    table = humanmodifier.TargetWeightTable(targets)
+
+    rng = np.random.RandomState(0)
+    samples = [dict(zip(table.factorNames, row)) for row in rng.rand(1000, len(table.factorNames))]
+    for factors in samples[:10]:
+        reference = humanmodifier.getTargetWeights(targets, factors)
+        assert np.array_equal([reference[tpath] for (tpath, _) in targets], table.getWeights(factors))
+
+    report("%d targets, single" % len(targets),
+           timeit(lambda: humanmodifier.getTargetWeights(targets, samples[0])),
+           timeit(lambda: table.getWeights(samples[0])))
+    matrix = np.array([[factors[name] for name in table.factorNames] for factors in samples])
+    report("%d targets, batch of %d" % (len(targets), len(samples)),
+           timeit(lambda: [humanmodifier.getTargetWeights(targets, factors) for factors in samples]),
+           timeit(lambda: table.getBatchWeights(matrix)))
+
+
+def _buildVertexWeightsReference(vertexWeightsDict, vertexCount=None, rootBone="root"):
+    """
+    Per entry implementation of VertexBoneWeights._build_vertex_weights_data,
+    as used before the vectorized one. Returns the weights and vertex count.
+    The format of vertexWeightsDict is expected to be: 
+        { "bone_name": [(v_idx, v_weight), ...], ... }
+
+    The output format is of the form:
+        { "bone_name": ([v_idx, ...], [v_weight, ...]), ... }
+    With weights normalized, doubles merged, and unweighted vertices
+    assigned to the root bone.
+    """
+    import log
+    WEIGHT_THRESHOLD = 1e-4  # Threshold for including bone weight
+
+    if vertexCount is not None:
+        vcount = vertexCount
+    else:
+        vcount = max([vn for vg in list(vertexWeightsDict.values()) for vn,_ in vg])+1
+
+    # Normalize weights and put them in np format
+    wtot = np.zeros(vcount, np.float32)
+    for vgroup in list(vertexWeightsDict.values()):
+        for item in vgroup:
+            vn,w = item
+            # Calculate total weight per vertex
+            wtot[vn] += w
+
+    from collections import OrderedDict
+    boneWeights = OrderedDict()
+    for bname,vgroup in list(vertexWeightsDict.items()):
+        if len(vgroup) == 0:
+            continue
+        weights = []
+        verts = []
+        v_lookup = {}
+        n = 0
+        for vn,w in vgroup:
+            if vn in v_lookup:
+                # Merge doubles
+                v_idx = v_lookup[vn]
+                weights[v_idx] += w/wtot[vn]
+            else:
+                v_lookup[vn] = len(verts)
+                verts.append(vn)
+                weights.append(w/wtot[vn])
+        verts = np.asarray(verts, dtype=np.uint32)
+        weights = np.asarray(weights, np.float32)
+        # Sort by vertex index
+        i_s = np.argsort(verts)
+        verts = verts[i_s]
+        weights = weights[i_s]
+        # Filter out weights under the threshold
+        i_s = np.argwhere(weights > WEIGHT_THRESHOLD)[:,0]
+        verts = verts[i_s]
+        weights = weights[i_s]
+        boneWeights[bname] = (verts, weights)
+
+    # Assign unweighted vertices to root bone with weight 1
+    if rootBone not in list(boneWeights.keys()):
+        vs = []
+        ws = []
+    else:
+        vs,ws = boneWeights[rootBone]
+        vs = list(vs)
+        ws = list(ws)
+    rw_i = np.argwhere(wtot == 0)[:,0]
+    vs.extend(rw_i)
+    ws.extend(np.ones(len(rw_i), dtype=np.float32))
+    if len(rw_i) > 0:
+        if len(rw_i) < 100:
+            # To avoid spamming the log, only print vertex indices if there's less than 100
+            log.debug("Adding trivial bone weights to root bone %s for %s unweighted vertices. [%s]", rootBone, len(rw_i), ', '.join([str(s) for s in rw_i]))
+        else:
+            log.debug("Adding trivial bone weights to root bone %s for %s unweighted vertices.", rootBone, len(rw_i))
+    if len(vs) > 0:
+        boneWeights[rootBone] = (np.asarray(vs, dtype=np.uint32), np.asarray(ws, dtype=np.float32))
+
+    return boneWeights, vcount
+
+def _compileVertexWeightsReference(vertBoneMapping, skel, nWeights, vertexCount=None):
+    """
+    Per vertex implementation of VertexBoneWeights._compileVertexWeights, as
+    used before the vectorized one.
+    """
+    import log
+    if vertexCount is None:
+        vertexCount = 0
+        for bname, mapping in list(vertBoneMapping.items()):
+            verts,weights = mapping
+            vertexCount = max(max(verts), vertexCount)
+        if vertexCount:
+            vertexCount += 1
+
+    # TODO use simple array columns instead of structured arrays (they are array of structs, not struct of arrays)
+    if nWeights == 3:
+        dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), ('b_idx3', np.uint32), 
+                 ('wght1', np.float32), ('wght2', np.float32), ('wght3', np.float32)]
+    elif nWeights == 4:
+        dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), ('b_idx3', np.uint32), ('b_idx4', np.uint32),
+                 ('wght1', np.float32), ('wght2', np.float32), ('wght3', np.float32), ('wght4', np.float32)]
+    elif nWeights == 6:
+        dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), ('b_idx3', np.uint32), 
+                 ('b_idx4', np.uint32), ('b_idx5', np.uint32), ('b_idx6', np.uint32), 
+                 ('wght1', np.float32), ('wght2', np.float32), ('wght3', np.float32), 
+                 ('wght4', np.float32), ('wght5', np.float32), ('wght6', np.float32)]
+    elif nWeights == 5:
+        dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), ('b_idx3', np.uint32),
+                 ('b_idx4', np.uint32), ('b_idx5', np.uint32),
+                 ('wght1', np.float32), ('wght2', np.float32), ('wght3', np.float32),
+                 ('wght4', np.float32), ('wght5', np.float32)]
+    elif nWeights == 13:
+        dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), ('b_idx3', np.uint32), 
+                 ('b_idx4', np.uint32), ('b_idx5', np.uint32), ('b_idx6', np.uint32), 
+                 ('b_idx7', np.uint32), ('b_idx8', np.uint32), ('b_idx9', np.uint32), 
+                 ('b_idx10', np.uint32), ('b_idx11', np.uint32), ('b_idx12', np.uint32), 
+                 ('b_idx13', np.uint32),
+                 ('wght1', np.float32), ('wght2', np.float32), ('wght3', np.float32), 
+                 ('wght4', np.float32), ('wght5', np.float32), ('wght6', np.float32), 
+                 ('wght7', np.float32), ('wght8', np.float32), ('wght9', np.float32), 
+                 ('wght10', np.float32), ('wght11', np.float32), ('wght12', np.float32), 
+                 ('wght13', np.float32)]
+    elif nWeights == 2:
+        dtype = [('b_idx1', np.uint32), ('b_idx2', np.uint32), 
+                 ('wght1', np.float32), ('wght2', np.float32)]
+    else:
+        dtype = [('b_idx1', np.uint32), ('wght1', np.float32)]
+    compiled_vertweights = np.zeros(vertexCount, dtype=dtype)
+
+    # Convert weights from indexed by bone to indexed by vertex index
+    _ws = dict()
+    b_lookup = dict([(b.name,b_idx) for b_idx,b in enumerate(skel.getBones())])
+    for bname, mapping in list(vertBoneMapping.items()):
+        try:
+            b_idx = b_lookup[bname]
+            verts,weights = mapping
+            for v_idx, wght in zip(verts, weights):
+                if v_idx not in _ws:
+                    _ws[v_idx] = []
+
+                # TODO not needed for now (no remapping yet), and perhaps doubles should be removed upon merge, not when compiling
+                # also in case of proxy remapping doubles need to be prevented
+                '''
+                b_idxs = [bidx for (_,bidx) in _ws[v_idx]]
+                if b_idx in b_idxs:
+                    # Merge doubles (this needs to happen even if the _build_vertex_weights_data()
+                    # step already performs double removal, in the case where
+                    # weights were remapped to another rig and bones merged)
+                    _i = b_idxs.index(b_idx)
+                    _ws[v_idx][_i] = (_ws[v_idx][_i][0] + wght, b_idx)
+                else:
+                    _ws[v_idx].append( (wght, b_idx) )
+                '''
+                _ws[v_idx].append( (wght, b_idx) )  # For now, assume there are no doubles
+        except KeyError as e:
+            log.warning("Bone %s not found in skeleton: %s" % (bname, e))
+    for v_idx in _ws:
+        # Sort by weight and keep only nWeights most significant weights
+        if len(_ws[v_idx]) > nWeights:
+            #log.debug("Vertex %s has too many weights (%s): %s" % (v_idx, len(_ws[v_idx]), str(sorted(_ws[v_idx], reverse=True))))
+            _ws[v_idx] = sorted(_ws[v_idx], reverse=True)[:nWeights]
+            # Re-normalize weights
+            weightvals = np.asarray( [e[0] for e in _ws[v_idx]], dtype=np.float32)
+            weightvals /= np.sum(weightvals)
+            for i in range(nWeights):
+                _ws[v_idx][i] = (weightvals[i], _ws[v_idx][i][1])
+        else:
+            _ws[v_idx] = sorted(_ws[v_idx], reverse=True)
+
+    for v_idx, wghts in list(_ws.items()):
+        for i, (w, bidx) in enumerate(wghts):
+            compiled_vertweights[v_idx]['wght%s' % (i+1)] = w
+            compiled_vertweights[v_idx]['b_idx%s' % (i+1)] = bidx
+
+    return compiled_vertweights
+
+def benchVertexWeights():
+    """
+    Building and compiling per-vertex bone weights.
+    """
+    import json
+    import types
+    from collections import OrderedDict
+    import getpath
+    import guicommon
+    import animation
+
+    path = getpath.getSysDataPath('rigs/default_weights.mhw')
+    skelPath = getpath.getSysDataPath('rigs/default.mhskel')
+    if not os.path.isfile(path) or not os.path.isfile(skelPath):
+        print("No default rig found")
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f, object_pairs_hook=OrderedDict)['weights']
+    # Only the bone names of the skeleton are needed for compiling
+    with open(skelPath, 'r', encoding='utf-8') as f:
+        boneNames = list(json.load(f, object_pairs_hook=OrderedDict)['bones'].keys())
+    bones = [types.SimpleNamespace(name=name) for name in boneNames]
+    skel = types.SimpleNamespace(getBones=lambda: bones)
+
+    meshes = _loadMeshes()
+    weights = animation.VertexBoneWeights(data, meshes[0][1].getVertexCount())
+    cases = [('default rig', data, data, weights.vertexCount)]
+    if meshes[-1][0] == 'subdivided base.obj':
+        # Weights remapped to the subdivided basemesh, passed as arrays
+        # instead of (vertex, weight) pairs since the vectorized build
+        subdivided = meshes[-1][1]
+        obj = guicommon.Object(meshes[0][1])
+        subWeights = subdivided.getVertexWeights(weights)
+        subArrays = subWeights.data
+        subPairs = OrderedDict((bname, list(zip(verts, wghts))) for bname, (verts, wghts) in subArrays.items())
+        cases.append(('default rig, subdivided', subPairs, subArrays, subdivided.getVertexCount()))
+
+    for name, refData, data, vertexCount in cases:
+        boneWeights, vcount = _buildVertexWeightsReference(refData, vertexCount)
+        optimized = animation.VertexBoneWeights(data, vertexCount)
+        assert vcount == optimized.vertexCount
+        assert list(boneWeights.keys()) == list(optimized.data.keys())
+        for bname, (verts, wghts) in boneWeights.items():
+            assert np.array_equal(verts, optimized.data[bname][0])
+            assert np.array_equal(wghts, optimized.data[bname][1])
+        report("%s, build" % name,
+               timeit(lambda: _buildVertexWeightsReference(refData, vertexCount), 1),
+               timeit(lambda: optimized._build_vertex_weights_data(data, vertexCount), 1))
+
+        nWeights = min(4, optimized.getMaxNumberVertexWeights())
+        compiled = _compileVertexWeightsReference(optimized.data, skel, nWeights, vcount)
+        boneIdxs, wghts = optimized._compileVertexWeights(optimized.data, skel, nWeights, vcount)
+        for i in range(nWeights):
+            assert np.array_equal(compiled['b_idx%s' % (i+1)], boneIdxs[:,i])
+            assert np.array_equal(compiled['wght%s' % (i+1)], wghts[:,i])
+        report("%s, compile %d weights" % (name, nWeights),
+               timeit(lambda: _compileVertexWeightsReference(optimized.data, skel, nWeights, vcount), 1),
+               timeit(lambda: optimized._compileVertexWeights(optimized.data, skel, nWeights, vcount), 1))
+
+def _skinMeshReference(coords, compiledVertWeights, poseData):
+    """
+    Reference implementation of animation.skinMesh, as used before the
+    column-oriented compiled weights, taking the structured array returned
+    by _compileVertexWeightsReference.
+    """
+    if coords.shape[1] == 4:
+        c = 4
+    else:
+        c = 3
+
+    W = compiledVertWeights
+    P = poseData
+    if len(compiledVertWeights.dtype) == 4*2:
+        accum = W['wght1'][:,None,None] * P[W['b_idx1']][:,:3,:c] + \
+                W['wght2'][:,None,None] * P[W['b_idx2']][:,:3,:c] + \
+                W['wght3'][:,None,None] * P[W['b_idx3']][:,:3,:c] + \
+                W['wght4'][:,None,None] * P[W['b_idx4']][:,:3,:c]
+    elif len(compiledVertWeights.dtype) == 6*2:
+        accum = W['wght1'][:,None,None] * P[W['b_idx1']][:,:3,:c] + \
+                W['wght2'][:,None,None] * P[W['b_idx2']][:,:3,:c] + \
+                W['wght3'][:,None,None] * P[W['b_idx3']][:,:3,:c] + \
+                W['wght4'][:,None,None] * P[W['b_idx4']][:,:3,:c] + \
+                W['wght5'][:,None,None] * P[W['b_idx5']][:,:3,:c] + \
+                W['wght6'][:,None,None] * P[W['b_idx6']][:,:3,:c]
+    else:
+        raise NotImplementedError("Reference only covers 4 and 6 weights")
+
+    return np.einsum('ijk,ikl -> ij', accum[:,:3,:c], coords[:,:c,None])
+
+def benchSkinning():
+    """
+    Linear blend skinning of meshes with compiled vertex weights.
+    """
+    import json
+    import types
+    from collections import OrderedDict
+    import getpath
+    import guicommon
+    import animation
+
+    path = getpath.getSysDataPath('rigs/default_weights.mhw')
+    skelPath = getpath.getSysDataPath('rigs/default.mhskel')
+    if not os.path.isfile(path) or not os.path.isfile(skelPath):
+        print("No default rig found")
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f, object_pairs_hook=OrderedDict)['weights']
+    with open(skelPath, 'r', encoding='utf-8') as f:
+        boneNames = list(json.load(f, object_pairs_hook=OrderedDict)['bones'].keys())
+    bones = [types.SimpleNamespace(name=name) for name in boneNames]
+    skel = types.SimpleNamespace(getBones=lambda: bones)
+
+    meshes = _loadMeshes()
+    objects = [guicommon.Object(mesh) for _, mesh in meshes[:1]]
+    weights = animation.VertexBoneWeights(data, meshes[0][1].getVertexCount())
+    cases = [(meshes[0][0], meshes[0][1], weights)]
+    if meshes[-1][0] == 'subdivided base.obj':
+        cases.append((meshes[-1][0], meshes[-1][1], meshes[-1][1].getVertexWeights(weights)))
+
+    # Random skinning matrices, one per bone
+    rng = np.random.RandomState(0)
+    poseData = rng.uniform(-1, 1, (len(bones), 3, 4)).astype(np.float32)
+
+    for name, mesh, vertWeights in cases:
+        coords = np.ones((mesh.getVertexCount(), 4), dtype=np.float32)
+        coords[:,:3] = mesh.coord
+        for nWeights in [4, 6]:
+            compiled = _compileVertexWeightsReference(vertWeights.data, skel, nWeights, vertWeights.vertexCount)
+            optimized = vertWeights._compileVertexWeights(vertWeights.data, skel, nWeights, vertWeights.vertexCount)
+            for c in [4, 3]:
+                crds = np.ascontiguousarray(coords[:,:c])
+                assert np.allclose(_skinMeshReference(crds, compiled, poseData),
+                                   animation.skinMesh(crds, optimized, poseData), atol=1e-4)
+                report("%s, %d weights, 3x%d" % (name, nWeights, c),
+                       timeit(lambda: _skinMeshReference(crds, compiled, poseData), 10),
+                       timeit(lambda: animation.skinMesh(crds, optimized, poseData), 10))
+    del objects
+
+
+benchmarks = {
+    'bake': benchBake,
+    'blend': benchBlendPoses,
+    'bvh': benchBVH,
+    'faces': benchFaces,
+    'macros': benchMacroWeights,
+    'normals': benchNormals,
+    'obj': benchObjWriter,
+    'objload': benchObjLoader,
+    'pose': benchPose,
+    'skinning': benchSkinning,
+    'subdivision': benchSubdivision,
+    'targets': benchTargets,
+    'weights': benchVertexWeights,
+    }
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Run performance benchmarks.")
+    parser.add_argument("benchmarks", nargs='*', help="Benchmarks to run (default: all): %s" % ", ".join(sorted(benchmarks.keys())))
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in benchmarks:
+            parser.error("unknown benchmark %s" % name)
+
+    for name in (args.benchmarks or sorted(benchmarks.keys())):
+        print("== %s: %s" % (name, benchmarks[name].__doc__.strip()))
+        benchmarks[name]()